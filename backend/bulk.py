@@ -0,0 +1,56 @@
+"""Row sources for bulk ingestion endpoints.
+
+Rows can arrive as one JSON array or as an NDJSON stream. Both are turned
+into an async iterator of ``(row, payload)`` pairs with 1-based row numbers.
+NDJSON is parsed line by line as the body streams in, so large uploads never
+sit in memory whole. A row that is not valid JSON yields its exception as
+the payload, so the caller can report it per row.
+"""
+from typing import Any, AsyncIterator, Tuple
+
+import orjson
+from fastapi import HTTPException, Request
+
+BULK_CHUNK_SIZE = 1000
+
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonlines")
+
+
+async def _json_array_rows(request: Request) -> AsyncIterator[Tuple[int, Any]]:
+    try:
+        rows = orjson.loads(await request.body())
+    except orjson.JSONDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON: {e}")
+    if not isinstance(rows, list):
+        raise HTTPException(status_code=400, detail="Expected a JSON array of rows")
+    for row, payload in enumerate(rows, start=1):
+        yield row, payload
+
+
+async def _ndjson_rows(request: Request) -> AsyncIterator[Tuple[int, Any]]:
+    pending = b""
+    row = 0
+
+    def parse(line: bytes):
+        try:
+            return orjson.loads(line)
+        except orjson.JSONDecodeError as e:
+            return e
+
+    async for chunk in request.stream():
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            if line.strip():
+                row += 1
+                yield row, parse(line)
+    if pending.strip():
+        yield row + 1, parse(pending)
+
+
+def request_rows(request: Request) -> AsyncIterator[Tuple[int, Any]]:
+    """Rows from a JSON array body, or from NDJSON when the content type says so."""
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type in NDJSON_TYPES:
+        return _ndjson_rows(request)
+    return _json_array_rows(request)
@@ -0,0 +1,189 @@
+"""Mongo change streams that keep per-worker state in step with other workers.
+
+Every worker keeps state in memory: the placement grid, the columnar
+forest, cached donations, ETag versions and its live-feed subscribers.
+A write made by one worker is invisible to the others. ``ChangeFeed`` watches
+the ``donations`` and ``trees`` collections and hands every insert, update
+or replace to a handler, in every worker, including the one that made the
+write. Handlers must therefore be idempotent.
+
+The resume token is saved to the ``change_stream_tokens`` collection under
+the feed's id at most every ``save_interval`` seconds. A restarted worker
+resumes where it stopped instead of missing changes. Give each worker its
+own id (``CHANGE_FEED_ID``).
+
+A worker loads its state from Mongo at startup, while other workers keep
+writing. Call :meth:`ChangeFeed.prepare` before loading it. Without a saved
+token, the stream then starts at the cluster time of that call rather than
+when it is opened. Writes made while the snapshot loads are replayed
+(harmlessly, since handlers are idempotent) instead of missed. If the resume
+point has fallen out of the oplog, changes were lost. The feed then notes
+the current time, calls ``on_history_lost`` to reload the state, and
+resumes from that time.
+
+Change streams need a replica set. A single node is enough::
+
+    mongod --replSet rs0 ...
+    mongosh --eval 'rs.initiate()'
+
+Against a standalone server the feed logs a warning and stays inactive.
+Workers would then serve diverging state, so serve.py runs a single worker
+unless ``change_streams_supported`` says the deployment has change streams.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Sequence
+
+from pymongo import MongoClient
+from pymongo.errors import OperationFailure, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+TOKENS_COLLECTION = "change_stream_tokens"
+WATCHED_OPERATIONS = ("insert", "update", "replace")
+# Server error codes: not a replica set, and resume point no longer in the oplog
+NOT_REPLICA_SET = (40573, 40324)
+HISTORY_LOST = 286
+
+ChangeHandler = Callable[[str, Dict[str, Any]], Awaitable[None]]
+Reload = Callable[[], Awaitable[None]]
+
+
+def change_streams_supported(mongo_url: str, timeout: float = 10.0) -> bool:
+    """Whether the deployment at ``mongo_url`` is a replica set or sharded cluster."""
+    client = MongoClient(mongo_url, serverSelectionTimeoutMS=int(timeout * 1000))
+    try:
+        hello = client.admin.command("hello")
+    except PyMongoError as e:
+        logger.warning("Could not ask %s whether it supports change streams: %s", mongo_url, e)
+        return False
+    finally:
+        client.close()
+    return "setName" in hello or hello.get("msg") == "isdbgrid"
+
+
+class ChangeFeed:
+    def __init__(self, db, handler: ChangeHandler, feed_id: str,
+                 collections: Sequence[str] = ("donations", "trees"),
+                 save_interval: float = 1.0, retry_delay: float = 2.0,
+                 on_history_lost: Optional[Reload] = None):
+        self._db = db
+        self._handler = handler
+        self.feed_id = feed_id
+        self.collections = tuple(collections)
+        self.save_interval = save_interval
+        self.retry_delay = retry_delay
+        self._on_history_lost = on_history_lost
+        self._prepared = False
+        self._start_at = None
+        self._task: Optional[asyncio.Task] = None
+        self._token: Optional[Dict[str, Any]] = None
+        self._saved_token: Optional[Dict[str, Any]] = None
+        self._saved_at = 0.0
+        self.active = False
+        self.changes = 0
+
+    def _pipeline(self):
+        return [{"$match": {
+            "ns.coll": {"$in": list(self.collections)},
+            "operationType": {"$in": list(WATCHED_OPERATIONS)},
+        }}]
+
+    async def _load_token(self):
+        doc = await self._db[TOKENS_COLLECTION].find_one({"_id": self.feed_id})
+        return doc["token"] if doc else None
+
+    async def _now(self):
+        # The operation time of a no-op: a point in the oplog to start watching from
+        async with await self._db.client.start_session() as session:
+            await self._db.command("ping", session=session)
+            return session.operation_time
+
+    async def prepare(self):
+        """Fix where the stream starts; call before loading the state it keeps in step."""
+        try:
+            self._token = await self._load_token()
+            self._start_at = None if self._token is not None else await self._now()
+        except PyMongoError as e:
+            logger.warning("Could not prepare change stream %s: %s", self.feed_id, e)
+            return
+        self._prepared = True
+
+    async def _save_token(self, force: bool = False):
+        if self._token is None or self._token == self._saved_token:
+            return
+        if not force and time.monotonic() - self._saved_at < self.save_interval:
+            return
+        await self._db[TOKENS_COLLECTION].update_one(
+            {"_id": self.feed_id}, {"$set": {"token": self._token}}, upsert=True
+        )
+        self._saved_token = self._token
+        self._saved_at = time.monotonic()
+
+    async def _watch(self):
+        # try_next waits up to max_await_time_ms on the server, then returns None so
+        # the token still advances (and is saved) while nothing changes
+        options = {"full_document": "updateLookup", "max_await_time_ms": 1000}
+        if self._token is not None:
+            options["resume_after"] = self._token
+        elif self._start_at is not None:
+            options["start_at_operation_time"] = self._start_at
+        async with self._db.watch(self._pipeline(), **options) as stream:
+            self.active = True
+            while stream.alive:
+                change = await stream.try_next()
+                if change is not None:
+                    await self._handler(change["ns"]["coll"], change)
+                    self.changes += 1
+                self._token = stream.resume_token
+                await self._save_token()
+
+    async def _run(self):
+        reload = False
+        while True:
+            try:
+                if reload:
+                    # Start from before the reload, so writes made during it are not missed
+                    self._token, self._start_at = None, await self._now()
+                    if self._on_history_lost is not None:
+                        await self._on_history_lost()
+                    reload = False
+                elif not self._prepared:
+                    await self.prepare()
+                await self._watch()
+            except OperationFailure as e:
+                if e.code in NOT_REPLICA_SET:
+                    logger.warning("Change streams unavailable (%s); running without cross-worker sync", e)
+                    self.active = False
+                    return
+                if e.code == HISTORY_LOST:
+                    logger.warning("Change stream %s lost its resume point; reloading state", self.feed_id)
+                    reload = True
+                else:
+                    logger.warning("Change stream %s failed: %s", self.feed_id, e)
+            except PyMongoError as e:
+                logger.warning("Change stream %s interrupted: %s", self.feed_id, e)
+            except Exception:
+                logger.exception("Change handler failed; resuming after the last applied change")
+            self.active = False
+            await asyncio.sleep(self.retry_delay)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        self.active = False
+        try:
+            await self._save_token(force=True)
+        except PyMongoError as e:
+            logger.warning("Could not save change stream token: %s", e)
+
+    def stats(self):
+        return {"id": self.feed_id, "active": self.active, "changes": self.changes}
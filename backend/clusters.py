@@ -0,0 +1,122 @@
+"""Incrementally maintained grid clusters of trees for zoomed-out map views.
+
+For every zoom level the map is cut into square cells of
+``CLUSTER_BASE_CELL / 2**zoom`` units. Each cell document in ``tree_clusters``
+keeps a tree count, coordinate sums (for the centroid) and per-type counts.
+``create_tree()`` updates one cell per zoom level in a single bulk write, so
+reading clusters never touches the ``trees`` collection.
+"""
+import math
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+CLUSTERS_COLLECTION = "tree_clusters"
+META_ID = "meta"
+
+CLUSTER_BASE_CELL = 400.0
+MAX_CLUSTER_ZOOM = 4
+
+
+def cell_size(zoom: int) -> float:
+    return CLUSTER_BASE_CELL / (2 ** zoom)
+
+
+def cell_of(x: float, y: float, zoom: int) -> Tuple[int, int]:
+    size = cell_size(zoom)
+    return math.floor(x / size), math.floor(y / size)
+
+
+def _cell_id(zoom: int, cx: int, cy: int) -> str:
+    return f"{zoom}:{cx}:{cy}"
+
+
+def _type_key(tree_type: Any) -> str:
+    return str(tree_type or "unknown").replace(".", "_").replace("$", "_")
+
+
+def cluster_updates(trees: List[Dict[str, Any]]) -> List[UpdateOne]:
+    """Bulk-write operations adding ``trees`` to their cells at every zoom level."""
+    increments: Dict[Tuple[int, int, int], Dict[str, float]] = {}
+    for tree in trees:
+        x, y = tree["x"], tree["y"]
+        for zoom in range(MAX_CLUSTER_ZOOM + 1):
+            cx, cy = cell_of(x, y, zoom)
+            inc = increments.setdefault((zoom, cx, cy), {"count": 0, "sum_x": 0.0, "sum_y": 0.0})
+            inc["count"] += 1
+            inc["sum_x"] += x
+            inc["sum_y"] += y
+            type_field = f"types.{_type_key(tree.get('type'))}"
+            inc[type_field] = inc.get(type_field, 0) + 1
+    return [
+        UpdateOne(
+            {"_id": _cell_id(zoom, cx, cy)},
+            {"$inc": inc, "$setOnInsert": {"zoom": zoom, "cx": cx, "cy": cy}},
+            upsert=True,
+        )
+        for (zoom, cx, cy), inc in increments.items()
+    ]
+
+
+async def record_trees(db, trees: List[Dict[str, Any]]):
+    if trees:
+        await db[CLUSTERS_COLLECTION].bulk_write(cluster_updates(trees), ordered=False)
+
+
+async def rebuild_clusters(db) -> int:
+    """Recompute every cell from the ``trees`` collection; returns the cell count."""
+    collection = db[CLUSTERS_COLLECTION]
+    await collection.delete_many({})
+    batch: List[Dict[str, Any]] = []
+    async for tree in db.trees.find(
+        {"x": {"$type": "number"}, "y": {"$type": "number"}}, {"_id": 0, "x": 1, "y": 1, "type": 1}
+    ):
+        batch.append(tree)
+        if len(batch) == 1000:
+            await record_trees(db, batch)
+            batch = []
+    await record_trees(db, batch)
+    cells = await collection.count_documents({"zoom": {"$exists": True}})
+    await collection.update_one(
+        {"_id": META_ID}, {"$set": {"rebuilt_at": datetime.now().isoformat()}}, upsert=True
+    )
+    return cells
+
+
+async def ensure_clusters(db) -> bool:
+    """Build the cell table once for databases that predate clustering."""
+    if await db[CLUSTERS_COLLECTION].find_one({"_id": META_ID}) is None:
+        await rebuild_clusters(db)
+        return True
+    return False
+
+
+def _to_cluster(cell: Dict[str, Any], zoom: int) -> Dict[str, Any]:
+    count = cell["count"]
+    types = cell.get("types") or {}
+    size = cell_size(zoom)
+    return {
+        "cell": [cell["cx"], cell["cy"]],
+        "bounds": [cell["cx"] * size, cell["cy"] * size, (cell["cx"] + 1) * size, (cell["cy"] + 1) * size],
+        "count": count,
+        "x": cell["sum_x"] / count,
+        "y": cell["sum_y"] / count,
+        "type": max(types, key=types.get) if types else None,
+        "types": types,
+    }
+
+
+async def read_clusters(
+    db, zoom: int, viewport: Optional[Tuple[float, float, float, float]] = None
+) -> List[Dict[str, Any]]:
+    """Non-empty cells at ``zoom``, optionally limited to a viewport."""
+    query: Dict[str, Any] = {"zoom": zoom, "count": {"$gt": 0}}
+    if viewport:
+        xmin, xmax, ymin, ymax = viewport
+        min_cx, min_cy = cell_of(xmin, ymin, zoom)
+        max_cx, max_cy = cell_of(xmax, ymax, zoom)
+        query["cx"] = {"$gte": min_cx, "$lte": max_cx}
+        query["cy"] = {"$gte": min_cy, "$lte": max_cy}
+    cells = await db[CLUSTERS_COLLECTION].find(query).to_list(length=None)
+    return [_to_cluster(cell, zoom) for cell in cells]
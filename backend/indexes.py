@@ -0,0 +1,129 @@
+"""Index definitions for every query path, and a COLLSCAN diagnostic.
+
+``ensure_indexes`` runs at startup and is idempotent. ``explain_queries``
+runs ``explain()`` on a representative of each query the API issues and
+reports any plan that falls back to a collection scan.
+"""
+import logging
+from typing import Any, Dict, List, Tuple
+
+from pymongo import ASCENDING, GEO2D, IndexModel
+from pymongo.errors import OperationFailure
+
+from clusters import CLUSTERS_COLLECTION
+from pagination import SORT_KEY, after_filter, encode_cursor
+from webhooks import EVENT_INDEXES, EVENTS_COLLECTION
+
+logger = logging.getLogger(__name__)
+
+# Bounds of the 2d index on tree locations; far larger than the visible map so it can grow
+MAP_INDEX_BOUNDS = (-1_000_000, 1_000_000)
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    "donations": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        # Only real session ids: donations without a session store null, which a
+        # sparse unique index would still treat as duplicates
+        IndexModel(
+            [("session_id", ASCENDING)], name="session_id_unique", unique=True,
+            partialFilterExpression={"session_id": {"$type": "string"}},
+        ),
+        # Subscription renewals, one donation per Stripe invoice
+        IndexModel(
+            [("invoice_id", ASCENDING)], name="invoice_id_unique", unique=True,
+            partialFilterExpression={"invoice_id": {"$type": "string"}},
+        ),
+        IndexModel([("timestamp", ASCENDING)], name="timestamp"),
+    ],
+    "trees": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("donation_id", ASCENDING)], name="donation_id"),
+        # Keyset pagination sort key; also serves timestamp-only queries
+        IndexModel(SORT_KEY, name="timestamp_id"),
+        IndexModel([("seq", ASCENDING)], name="seq_unique", unique=True, sparse=True),
+        IndexModel(
+            [("loc", GEO2D)], name="loc_2d", min=MAP_INDEX_BOUNDS[0], max=MAP_INDEX_BOUNDS[1]
+        ),
+    ],
+    CLUSTERS_COLLECTION: [
+        IndexModel([("zoom", ASCENDING), ("cx", ASCENDING), ("cy", ASCENDING)], name="zoom_cell"),
+    ],
+    EVENTS_COLLECTION: EVENT_INDEXES,
+}
+
+
+async def ensure_indexes(db) -> List[str]:
+    """Create any missing index; returns the names of indexes that could not be built."""
+    failed = []
+    for collection, models in INDEXES.items():
+        for model in models:
+            try:
+                await db[collection].create_indexes([model])
+            except OperationFailure as e:
+                # e.g. legacy duplicate session ids; serve without the index rather than not at all
+                name = model.document["name"]
+                logger.warning("Could not create index %s.%s: %s", collection, name, e)
+                failed.append(f"{collection}.{name}")
+    return failed
+
+
+async def missing_indexes(db) -> List[str]:
+    """Names of declared indexes that do not exist yet."""
+    missing = []
+    for collection, models in INDEXES.items():
+        existing = await db[collection].index_information()
+        for model in models:
+            if model.document["name"] not in existing:
+                missing.append(f"{collection}.{model.document['name']}")
+    return missing
+
+
+def _sample_queries() -> List[Tuple[str, str, Dict[str, Any]]]:
+    """(label, collection, find spec) for each query path in server.py."""
+    cursor = encode_cursor({"timestamp": "2024-01-01T00:00:00", "id": "0"})
+    return [
+        ("get_donation", "donations", {"filter": {"id": "sample"}}),
+        ("donation by session_id", "donations", {"filter": {"session_id": "sample"}}),
+        ("trees of a donation", "trees", {"filter": {"donation_id": "sample"}}),
+        ("tree by id", "trees", {"filter": {"id": "sample"}}),
+        ("get_tree_by_seq", "trees", {"filter": {"seq": 1}}),
+        ("get_trees", "trees", {"filter": {}, "sort": SORT_KEY, "limit": 100}),
+        ("get_trees_since", "trees", {"filter": {"seq": {"$gt": 0}}, "sort": [("seq", ASCENDING)], "limit": 1000}),
+        ("get_trees_page", "trees", {"filter": after_filter(cursor), "sort": SORT_KEY, "limit": 501}),
+        ("get_trees_in_view", "trees", {
+            "filter": {"loc": {"$geoWithin": {"$box": [[0, 0], [1000, 600]]}}}, "limit": 1001,
+        }),
+        ("read_clusters", CLUSTERS_COLLECTION, {"filter": {"zoom": 0, "count": {"$gt": 0}}}),
+        ("read_totals", "donation_totals", {"filter": {"_id": {"$regex": "^shard-"}}}),
+    ]
+
+
+def _stages(plan: Any):
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from _stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from _stages(item)
+
+
+async def explain_queries(db) -> List[Dict[str, Any]]:
+    """Explain every sample query; each result has ``label``, ``stages`` and ``collscan``."""
+    results = []
+    for label, collection, spec in _sample_queries():
+        cursor = db[collection].find(spec["filter"])
+        if "sort" in spec:
+            cursor = cursor.sort(spec["sort"])
+        if "limit" in spec:
+            cursor = cursor.limit(spec["limit"])
+        plan = await cursor.explain()
+        stages = list(_stages(plan.get("queryPlanner", {}).get("winningPlan", {})))
+        results.append({
+            "label": label,
+            "collection": collection,
+            "stages": stages,
+            "collscan": "COLLSCAN" in stages,
+        })
+    return results
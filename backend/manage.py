@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+"""Maintenance commands for the Magic Forest backend.
+
+Usage (from the backend directory):
+    python manage.py totals rebuild
+    python manage.py totals verify
+    python manage.py clusters rebuild
+    python manage.py indexes ensure
+    python manage.py indexes explain
+    python manage.py donations export [--format ndjson|json] > donations.ndjson
+    python manage.py webhooks failed
+    python manage.py webhooks retry
+"""
+import argparse
+import asyncio
+import json
+import sys
+
+import clusters
+import indexes
+import totals
+import webhooks
+from serialization import DONATION_PROJECTION
+from streaming import STREAM_BATCH_SIZE, encode_cursor_chunks
+
+
+def _database():
+    from server import connect_database
+
+    _, db = connect_database()
+    return db
+
+
+async def _totals(args) -> int:
+    db = _database()
+
+    if args.action == "rebuild":
+        result = await totals.rebuild_totals(db)
+        print(json.dumps(result, indent=2, default=str))
+        return 0
+
+    drift = await totals.verify_totals(db, tolerance=args.tolerance)
+    if drift is None:
+        print("Donation totals are consistent")
+        return 0
+    print("Donation totals drifted:")
+    print(json.dumps(drift, indent=2, default=str))
+    return 1
+
+
+async def _clusters(args) -> int:
+    db = _database()
+
+    cells = await clusters.rebuild_clusters(db)
+    print(f"Rebuilt {cells} tree cluster cells")
+    return 0
+
+
+async def _indexes(args) -> int:
+    db = _database()
+
+    if args.action == "ensure":
+        failed = await indexes.ensure_indexes(db)
+        for name in failed:
+            print(f"Could not create index {name}")
+        return 1 if failed else 0
+
+    missing = await indexes.missing_indexes(db)
+    for name in missing:
+        print(f"Missing index {name}")
+    results = await indexes.explain_queries(db)
+    for result in results:
+        status = "COLLSCAN" if result["collscan"] else "ok"
+        print(f"{status:<9} {result['collection']:<16} {result['label']:<24} {' > '.join(result['stages'])}")
+    return 1 if missing or any(result["collscan"] for result in results) else 0
+
+
+async def _donations(args) -> int:
+    db = _database()
+
+    # Streamed batch by batch, so exports of any size run in constant memory
+    cursor = db.donations.find({}, DONATION_PROJECTION).sort("timestamp", 1).batch_size(STREAM_BATCH_SIZE)
+    out = sys.stdout.buffer
+    async for chunk in encode_cursor_chunks(cursor, args.format):
+        out.write(chunk)
+    out.flush()
+    return 0
+
+
+async def _webhooks(args) -> int:
+    db = _database()
+
+    failed = await webhooks.failed_events(db)
+    if args.action == "failed":
+        for doc in failed:
+            print(f"{doc['received_at']:%Y-%m-%d %H:%M:%S} {doc['_id']} {doc['type']}: {doc['error']}")
+        return 1 if failed else 0
+
+    import server
+
+    server.db = db
+    still_failing = 0
+    for doc in failed:
+        # Forget the failure so the event is claimed and applied like a new one
+        await db[webhooks.EVENTS_COLLECTION].delete_one({"_id": doc["_id"]})
+        try:
+            await server.apply_stripe_events([doc["event"]])
+            print(f"Applied {doc['_id']}")
+        except Exception as e:
+            await webhooks.record_failed_event(db, doc["event"], e)
+            print(f"Still failing {doc['_id']}: {type(e).__name__}: {e}")
+            still_failing += 1
+    return 1 if still_failing else 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Magic Forest maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    totals_parser = commands.add_parser("totals", help="Materialized donation totals")
+    totals_parser.add_argument("action", choices=["rebuild", "verify"])
+    totals_parser.add_argument("--tolerance", type=float, default=0.01,
+                               help="Allowed difference for amount sums (verify only)")
+    totals_parser.set_defaults(handler=_totals)
+
+    clusters_parser = commands.add_parser("clusters", help="Tree clusters for zoomed-out map views")
+    clusters_parser.add_argument("action", choices=["rebuild"])
+    clusters_parser.set_defaults(handler=_clusters)
+
+    indexes_parser = commands.add_parser("indexes", help="Index bootstrap and query plan diagnostics")
+    indexes_parser.add_argument("action", choices=["ensure", "explain"])
+    indexes_parser.set_defaults(handler=_indexes)
+
+    donations_parser = commands.add_parser("donations", help="Donation exports")
+    donations_parser.add_argument("action", choices=["export"])
+    donations_parser.add_argument("--format", choices=["ndjson", "json"], default="ndjson")
+    donations_parser.set_defaults(handler=_donations)
+
+    webhooks_parser = commands.add_parser("webhooks", help="Stripe events that could not be applied")
+    webhooks_parser.add_argument("action", choices=["failed", "retry"])
+    webhooks_parser.set_defaults(handler=_webhooks)
+
+    args = parser.parse_args(argv)
+    return asyncio.run(args.handler(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,195 @@
+"""Prometheus metrics, served in text format at ``/api/metrics``.
+
+What is measured:
+
+- every HTTP request, by method, route template and status (``MetricsMiddleware``)
+- requests in flight
+- every Mongo command, by command, collection and outcome, through pymongo
+  command monitoring (``MongoCommandMetrics``, passed to the Motor client)
+- every Stripe API call, by operation, and its errors by type (stripe_gateway.py)
+- cache and coalescer hits and misses, and gauges such as the webhook
+  backlog. These are read from the objects' own stats by ``StatsSampler``.
+
+With several worker processes, serve.py points ``PROMETHEUS_MULTIPROC_DIR``
+at a fresh directory before starting them. Each worker writes its samples
+there, so whichever worker answers the scrape reports all of them. Without
+it (plain uvicorn, tests), metrics live in the process.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest,
+)
+from prometheus_client import multiprocess
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+# Most responses take milliseconds; the top buckets catch Stripe round trips and bulk ingest
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "HTTP request latency",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS,
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "HTTP requests being handled", multiprocess_mode="livesum",
+)
+MONGO_COMMAND_DURATION = Histogram(
+    "mongo_command_duration_seconds", "Mongo command latency",
+    ["command", "collection", "outcome"], buckets=LATENCY_BUCKETS,
+)
+STRIPE_REQUEST_DURATION = Histogram(
+    "stripe_request_duration_seconds", "Stripe API call latency",
+    ["operation"], buckets=LATENCY_BUCKETS,
+)
+STRIPE_ERRORS = Counter(
+    "stripe_request_errors_total", "Failed Stripe API calls", ["operation", "error"],
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total", "Cache and coalescer lookups", ["cache", "result"],
+)
+CACHE_HIT_RATIO = Gauge(
+    "cache_hit_ratio", "Hits over lookups since the worker started", ["cache"], multiprocess_mode="liveall",
+)
+QUEUE_DEPTH = Gauge(
+    "queue_depth", "Items waiting in background queues", ["queue"], multiprocess_mode="livesum",
+)
+
+
+def render() -> bytes:
+    """The current metrics in Prometheus text format."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+def route_label(scope) -> str:
+    # The route template, not the path, so ids do not each get their own series
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """Time every HTTP request and count those in flight."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            REQUEST_DURATION.labels(scope["method"], route_label(scope), str(status)).observe(
+                time.perf_counter() - started
+            )
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Time every command a Motor client sends. Called from Motor's threads."""
+
+    def __init__(self):
+        self._collections: Dict[Tuple[Any, int], str] = {}
+
+    def started(self, event):
+        command = event.command
+        if event.command_name == "getMore":
+            collection = command.get("collection")
+        else:
+            collection = command.get(event.command_name)
+        self._collections[(event.connection_id, event.request_id)] = (
+            collection if isinstance(collection, str) else ""
+        )
+
+    def _observe(self, event, outcome: str):
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        MONGO_COMMAND_DURATION.labels(event.command_name, collection, outcome).observe(
+            event.duration_micros / 1_000_000
+        )
+
+    def succeeded(self, event):
+        self._observe(event, "ok")
+
+    def failed(self, event):
+        self._observe(event, "error")
+
+
+def observe_stripe_call(operation: str, seconds: float, error: Optional[BaseException] = None):
+    STRIPE_REQUEST_DURATION.labels(operation).observe(seconds)
+    if error is not None:
+        STRIPE_ERRORS.labels(operation, type(error).__name__).inc()
+
+
+class StatsSampler:
+    """Copy stats kept by caches and queues into metrics.
+
+    Caches count hits and misses themselves; each sample adds what changed since
+    the last one. Samples are taken on every scrape and every ``interval`` seconds,
+    so workers that are not scraped still publish theirs.
+    """
+
+    def __init__(self, interval: float = 5.0):
+        self.interval = interval
+        self._caches: Dict[str, Callable[[], Tuple[int, int]]] = {}
+        self._queues: Dict[str, Callable[[], int]] = {}
+        self._last: Dict[str, Tuple[int, int]] = {}
+        self._task = None
+
+    def track_cache(self, name: str, counts: Callable[[], Tuple[int, int]]):
+        """``counts()`` returns the cache's running (hits, misses)."""
+        self._caches[name] = counts
+
+    def track_queue(self, name: str, depth: Callable[[], int]):
+        self._queues[name] = depth
+
+    def sample(self):
+        for name, counts in self._caches.items():
+            hits, misses = counts()
+            last_hits, last_misses = self._last.get(name, (0, 0))
+            # Counts that went down were reset (e.g. by a benchmark); count from zero
+            CACHE_REQUESTS.labels(name, "hit").inc(hits - last_hits if hits >= last_hits else hits)
+            CACHE_REQUESTS.labels(name, "miss").inc(misses - last_misses if misses >= last_misses else misses)
+            self._last[name] = (hits, misses)
+            CACHE_HIT_RATIO.labels(name).set(hits / (hits + misses) if hits + misses else 0.0)
+        for name, depth in self._queues.items():
+            QUEUE_DEPTH.labels(name).set(depth())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.sample()
+            except Exception:
+                logger.exception("Sampling stats failed")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        self.sample()
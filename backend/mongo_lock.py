@@ -0,0 +1,61 @@
+"""A lock held in Mongo, so only one process at a time runs a section.
+
+Used for one-time backfills that every worker would otherwise start at once
+on first boot. The lock is a document in the ``locks`` collection with an
+expiring lease. The holder renews the lease while it works. If the holder
+dies, its lease runs out and the next process takes the lock over.
+Waiters poll until the lock is free, or give up after ``wait`` seconds.
+"""
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+LOCKS_COLLECTION = "locks"
+
+
+async def _renew(db, name: str, owner: str, lease: float):
+    while True:
+        await asyncio.sleep(lease / 3)
+        await db[LOCKS_COLLECTION].update_one(
+            {"_id": name, "owner": owner},
+            {"$set": {"expires_at": datetime.now(timezone.utc) + timedelta(seconds=lease)}},
+        )
+
+
+@asynccontextmanager
+async def mongo_lock(db, name: str, lease: float = 30.0, wait: float = 600.0, poll: float = 0.2):
+    owner = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+    deadline = time.monotonic() + wait
+    waited = False
+    while True:
+        now = datetime.now(timezone.utc)
+        try:
+            await db[LOCKS_COLLECTION].insert_one(
+                {"_id": name, "owner": owner, "expires_at": now + timedelta(seconds=lease)}
+            )
+            break
+        except DuplicateKeyError:
+            # Take over a lease its holder stopped renewing
+            await db[LOCKS_COLLECTION].delete_one({"_id": name, "expires_at": {"$lt": now}})
+        if not waited:
+            logger.info("Waiting for lock %s", name)
+            waited = True
+        if time.monotonic() >= deadline:
+            raise TimeoutError(f"Lock {name} still held after {wait:.0f}s")
+        await asyncio.sleep(poll)
+    renewer = asyncio.create_task(_renew(db, name, owner, lease))
+    try:
+        yield
+    finally:
+        renewer.cancel()
+        await asyncio.gather(renewer, return_exceptions=True)
+        await db[LOCKS_COLLECTION].delete_one({"_id": name, "owner": owner})
@@ -0,0 +1,38 @@
+"""Keyset (seek) pagination over a ``(timestamp, id)`` sort key.
+
+Pages are addressed by an opaque cursor holding the sort key of the last
+document served, so fetching page N costs the same as fetching page 1.
+"""
+import base64
+import json
+from typing import Any, Dict, Optional, Tuple
+
+SORT_KEY = [("timestamp", 1), ("id", 1)]
+
+
+def encode_cursor(doc: Dict[str, Any]) -> str:
+    raw = json.dumps([doc["timestamp"], doc["id"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """Return ``(timestamp, id)``; raises ``ValueError`` on a malformed cursor."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, doc_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception as e:
+        raise ValueError("Invalid pagination cursor") from e
+    if not isinstance(timestamp, str) or not isinstance(doc_id, str):
+        raise ValueError("Invalid pagination cursor")
+    return timestamp, doc_id
+
+
+def after_filter(cursor: Optional[str]) -> Dict[str, Any]:
+    """Mongo filter matching documents that sort strictly after ``cursor``."""
+    if not cursor:
+        return {}
+    timestamp, doc_id = decode_cursor(cursor)
+    return {"$or": [
+        {"timestamp": {"$gt": timestamp}},
+        {"timestamp": timestamp, "id": {"$gt": doc_id}},
+    ]}
@@ -0,0 +1,126 @@
+"""Collision-free tree placement on an in-memory occupancy grid.
+
+The map is tiled with slots big enough for the largest tree, and each slot
+holds at most one tree, jittered inside the slot so the forest does not look
+like a chessboard. Slots are opened one region (a map-sized block) at a time
+in shuffled order, so a placement pops a free slot in O(1) amortized time
+instead of scanning existing trees. When a region is full the next one is
+opened, growing the map outward in rings from the original map.
+
+The grid lives in process memory. It is rebuilt from Mongo on first use, and
+trees planted elsewhere can be marked with :meth:`PlacementEngine.occupy`.
+"""
+import asyncio
+import math
+import random
+from typing import Iterator, List, Optional, Set, Tuple
+
+Cell = Tuple[int, int]
+
+# Unscaled tree drawing footprint relative to its (x, y) anchor, as drawn by the map
+TREE_FOOTPRINT = (30.0, 55.0)
+MAX_TREE_SCALE = 1.2
+
+
+def _region_rings() -> Iterator[Cell]:
+    """(0, 0), then each square ring around it: (1, 0), (0, 1), (1, 1), (2, 0), ..."""
+    ring = 0
+    while True:
+        if ring == 0:
+            yield 0, 0
+        else:
+            for j in range(ring):
+                yield ring, j
+            for i in range(ring + 1):
+                yield i, ring
+        ring += 1
+
+
+class PlacementEngine:
+    def __init__(
+        self,
+        origin: Tuple[float, float] = (50.0, 50.0),
+        region_size: Tuple[float, float] = (900.0, 500.0),
+        slot_size: Tuple[float, float] = (48.0, 72.0),
+        seed: Optional[int] = None,
+    ):
+        self.origin = origin
+        self.slot_w, self.slot_h = slot_size
+        self.footprint_w = TREE_FOOTPRINT[0] * MAX_TREE_SCALE
+        self.footprint_h = TREE_FOOTPRINT[1] * MAX_TREE_SCALE
+        if self.footprint_w > self.slot_w or self.footprint_h > self.slot_h:
+            raise ValueError("Placement slots must be larger than the largest tree")
+        self.region_cols = max(1, int(region_size[0] // self.slot_w))
+        self.region_rows = max(1, int(region_size[1] // self.slot_h))
+        self._random = random.Random(seed)
+        self._lock = asyncio.Lock()
+        self.reset()
+
+    def reset(self):
+        self._occupied: Set[Cell] = set()
+        self._free: List[Cell] = []
+        self._regions = _region_rings()
+        self.regions_opened = 0
+        self.loaded = False
+
+    @property
+    def occupied_count(self) -> int:
+        return len(self._occupied)
+
+    def _open_region(self):
+        i, j = next(self._regions)
+        self.regions_opened += 1
+        first_col, first_row = i * self.region_cols, j * self.region_rows
+        free = [
+            (col, row)
+            for col in range(first_col, first_col + self.region_cols)
+            for row in range(first_row, first_row + self.region_rows)
+            if (col, row) not in self._occupied
+        ]
+        self._random.shuffle(free)
+        self._free = free
+
+    def _anchor(self, cell: Cell) -> Tuple[float, float]:
+        left = self.origin[0] + cell[0] * self.slot_w
+        top = self.origin[1] + cell[1] * self.slot_h
+        x = left + self._random.uniform(0, self.slot_w - self.footprint_w)
+        y = top + self._random.uniform(0, self.slot_h - self.footprint_h)
+        return x, y
+
+    def place(self) -> Tuple[float, float]:
+        """Reserve a free slot and return the tree's (x, y) anchor inside it."""
+        while True:
+            while self._free:
+                cell = self._free.pop()
+                # Slots can be taken after their region opened (see occupy)
+                if cell not in self._occupied:
+                    self._occupied.add(cell)
+                    return self._anchor(cell)
+            self._open_region()
+
+    def occupy(self, x: float, y: float, size: float = 1.0):
+        """Mark every slot overlapped by a tree drawn at (x, y) as taken."""
+        right = x + TREE_FOOTPRINT[0] * size
+        bottom = y + TREE_FOOTPRINT[1] * size
+        first_col = math.floor((x - self.origin[0]) / self.slot_w)
+        last_col = math.floor((right - self.origin[0]) / self.slot_w)
+        first_row = math.floor((y - self.origin[1]) / self.slot_h)
+        last_row = math.floor((bottom - self.origin[1]) / self.slot_h)
+        for col in range(first_col, last_col + 1):
+            for row in range(first_row, last_row + 1):
+                self._occupied.add((col, row))
+
+    async def ensure_loaded(self, db):
+        """Rebuild the grid from the ``trees`` collection once per process."""
+        if self.loaded:
+            return
+        async with self._lock:
+            if self.loaded:
+                return
+            self.reset()
+            async for tree in db.trees.find(
+                {"x": {"$type": "number"}, "y": {"$type": "number"}},
+                {"_id": 0, "x": 1, "y": 1, "size": 1},
+            ):
+                self.occupy(tree["x"], tree["y"], tree.get("size") or 1.0)
+            self.loaded = True
@@ -0,0 +1,115 @@
+"""Per-worker resource ownership and graceful draining.
+
+``ResourceManager`` owns everything a worker opens: the Motor pool, the
+Stripe HTTP client and background workers. Resources are registered in
+start order with a close function and are closed in reverse order on
+shutdown.
+
+Shutdown has a single deadline, counted from the moment draining starts,
+and runs in three steps:
+
+1. Drain. New requests are refused with 503 and ``Connection: close``,
+   ``/api/ready`` fails, and ``on_drain`` callbacks run (e.g. ending live
+   streams). The process supervisor starts this the moment SIGTERM arrives
+   (see serve.py). Otherwise it starts when the lifespan shuts down.
+2. Wait for in-flight requests, so donation writes are not cut off.
+3. Close every resource, passing each the time left. Buffered writes are
+   flushed before the pools they need are closed.
+"""
+import asyncio
+import logging
+import time
+import weakref
+from typing import Awaitable, Callable, List, Tuple
+
+from starlette.responses import JSONResponse
+
+logger = logging.getLogger(__name__)
+
+Closer = Callable[[float], Awaitable[None]]
+
+_managers: "weakref.WeakSet[ResourceManager]" = weakref.WeakSet()
+
+
+def begin_drain_all():
+    """Start draining in every manager of this process (called on SIGTERM)."""
+    for manager in list(_managers):
+        manager.begin_drain()
+
+
+class ResourceManager:
+    def __init__(self, shutdown_deadline: float = 25.0):
+        self.shutdown_deadline = shutdown_deadline
+        self._resources: List[Tuple[str, Closer]] = []
+        self._drain_callbacks: List[Callable[[], None]] = []
+        self.in_flight = 0
+        self.draining = False
+        self._drain_started = 0.0
+        _managers.add(self)
+
+    def add(self, name: str, close: Closer):
+        """Register a resource; ``close(seconds_left)`` is awaited on shutdown."""
+        self._resources.append((name, close))
+
+    def on_drain(self, callback: Callable[[], None]):
+        self._drain_callbacks.append(callback)
+
+    def begin_drain(self):
+        if self.draining:
+            return
+        self.draining = True
+        self._drain_started = time.monotonic()
+        logger.info("Draining: refusing new requests, %d in flight", self.in_flight)
+        for callback in self._drain_callbacks:
+            try:
+                callback()
+            except Exception:
+                logger.exception("Drain callback failed")
+
+    def reset(self):
+        """Forget resources and drain state, for a fresh lifespan."""
+        self._resources = []
+        self.draining = False
+
+    async def shutdown(self):
+        self.begin_drain()
+        # uvicorn's wait for open connections since SIGTERM comes out of the same budget
+        deadline = self._drain_started + self.shutdown_deadline
+        while self.in_flight and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        if self.in_flight:
+            logger.warning("Shutting down with %d requests still in flight", self.in_flight)
+        for name, close in reversed(self._resources):
+            remaining = max(deadline - time.monotonic(), 0.1)
+            try:
+                await asyncio.wait_for(close(remaining), remaining)
+            except asyncio.TimeoutError:
+                logger.warning("Closing %s did not finish before the shutdown deadline", name)
+            except Exception:
+                logger.exception("Closing %s failed", name)
+        self._resources = []
+
+
+class DrainMiddleware:
+    """Count in-flight HTTP requests and refuse new ones while draining."""
+
+    def __init__(self, app, manager: ResourceManager):
+        self.app = app
+        self.manager = manager
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        if self.manager.draining:
+            response = JSONResponse(
+                {"detail": "Server is shutting down"}, status_code=503,
+                headers={"Connection": "close", "Retry-After": "5"},
+            )
+            await response(scope, receive, send)
+            return
+        self.manager.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.manager.in_flight -= 1
@@ -0,0 +1,66 @@
+"""Monotonic per-collection sequence numbers used as change cursors."""
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Tuple
+
+from pymongo import ASCENDING, ReturnDocument
+
+COUNTERS_COLLECTION = "counters"
+
+# A sequence gap older than this is treated as a failed insert, not a write
+# that is still in flight
+SEQ_GAP_GRACE = timedelta(seconds=5)
+
+
+async def next_sequence(db, name: str, count: int = 1) -> int:
+    """Reserve ``count`` consecutive numbers and return the first one."""
+    counter = await db[COUNTERS_COLLECTION].find_one_and_update(
+        {"_id": name},
+        {"$inc": {"seq": count}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return counter["seq"] - count + 1
+
+
+async def ensure_tree_sequence(db) -> int:
+    """Number any trees that predate sequences.
+
+    Legacy trees are numbered in timestamp order. Returns how many were
+    backfilled.
+    """
+    missing = await db.trees.find(
+        {"seq": {"$exists": False}}, {"_id": 1}
+    ).sort("timestamp", ASCENDING).to_list(length=None)
+    if not missing:
+        return 0
+    first = await next_sequence(db, "trees", len(missing))
+    for offset, doc in enumerate(missing):
+        await db.trees.update_one(
+            {"_id": doc["_id"], "seq": {"$exists": False}},
+            {"$set": {"seq": first + offset}},
+        )
+    return len(missing)
+
+
+def contiguous_prefix(
+    docs: List[Dict[str, Any]], since: int, now: datetime = None
+) -> Tuple[List[Dict[str, Any]], int]:
+    """Trim ``docs`` (sorted by ``seq``) so the returned cursor never skips a write.
+
+    Sequence numbers are reserved before the insert lands, so a reader can
+    see seq 11 while seq 10 is still in flight. Returning cursor 11 then would
+    lose tree 10 for good. Stop at the first gap unless the document after it
+    is older than ``SEQ_GAP_GRACE``.
+    """
+    now = now or datetime.now()
+    cursor = since
+    for index, doc in enumerate(docs):
+        if doc["seq"] != cursor + 1:
+            try:
+                written = datetime.fromisoformat(doc["timestamp"])
+            except (KeyError, TypeError, ValueError):
+                written = now
+            if now - written < SEQ_GAP_GRACE:
+                return docs[:index], cursor
+        cursor = doc["seq"]
+    return docs, cursor
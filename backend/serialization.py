@@ -0,0 +1,39 @@
+"""Single-pass JSON encoding for Mongo documents.
+
+Documents are read with projections that leave out ``_id`` (and other
+internal fields), then encoded straight to bytes by orjson. orjson handles
+datetimes natively and ``_default`` covers ObjectId, so documents are no
+longer copied by a recursive walk and then encoded a second time.
+"""
+from typing import Any, Dict
+
+import orjson
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+
+# Projections for documents returned to clients
+TREE_PROJECTION = {"_id": 0, "loc": 0}
+# trees_planted and counted are bookkeeping for tree reservations and the totals
+DONATION_PROJECTION = {"_id": 0, "trees_planted": 0, "counted": 0}
+
+
+def _default(obj: Any):
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default)
+
+
+def public_doc(doc: Dict[str, Any], projection: Dict[str, int]) -> Dict[str, Any]:
+    """Apply an exclusion projection to a document already in memory."""
+    return {k: v for k, v in doc.items() if k not in projection}
+
+
+class MongoJSONResponse(JSONResponse):
+    """JSON response that encodes Mongo documents with orjson in one pass."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
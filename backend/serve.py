@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+"""Production server: N uvicorn worker processes sharing one listening socket.
+
+The supervisor binds the socket once and starts each worker as a fresh
+(spawned, not forked) process. Each worker imports ``server``; its lifespan
+opens that worker's own Mongo client, Stripe client and caches. A worker
+that dies is restarted. SIGTERM/SIGINT are passed on to the workers, which
+stop taking new requests at once, finish in-flight ones and run their
+shutdown before exiting (see resources.py).
+
+All of that shares one budget, ``SHUTDOWN_DEADLINE`` seconds from SIGTERM
+(``--shutdown-deadline``). uvicorn's wait for open connections and the
+lifespan's close of Mongo, Stripe and the buffers both count against it.
+The supervisor kills a worker only ``KILL_MARGIN`` seconds after that. A
+container must be given longer than deadline plus margin to stop (see the
+Dockerfile).
+
+Each worker gets ``WORKER_INDEX`` (0..N-1) and ``WORKER_COUNT`` in its
+environment. The index keys its change-stream resume token.
+
+Workers keep in-memory state that only the change feed keeps in step (see
+change_feed.py). If Mongo has no change streams (a standalone mongod) or
+CHANGE_FEED is off, a single worker is started whatever was asked for. Workers share a ``PROMETHEUS_MULTIPROC_DIR``
+(a temporary directory unless set), so /api/metrics covers all of them.
+
+Usage (from the backend directory):
+    python serve.py --host 0.0.0.0 --port 8001 [--workers N]
+
+The worker count defaults to WEB_CONCURRENCY, or else the number of CPUs.
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import time
+
+import uvicorn
+from prometheus_client import multiprocess
+
+from change_feed import change_streams_supported
+from resources import begin_drain_all
+
+logger = logging.getLogger("serve")
+
+# Workers restarted faster than this are crash-looping; back off before the next start
+MIN_WORKER_UPTIME = 5.0
+RESTART_BACKOFF = 2.0
+# Time past the shutdown deadline before a worker is killed; covers process exit
+KILL_MARGIN = 5.0
+
+
+class DrainingServer(uvicorn.Server):
+    def handle_exit(self, sig, frame):
+        # Refuse new requests right away; uvicorn then waits for in-flight ones
+        begin_drain_all()
+        super().handle_exit(sig, frame)
+
+
+def _worker(index: int, count: int, config_kwargs, sockets):
+    os.environ["WORKER_INDEX"] = str(index)
+    os.environ["WORKER_COUNT"] = str(count)
+    config = uvicorn.Config(**config_kwargs)
+    DrainingServer(config).run(sockets=sockets)
+
+
+class Supervisor:
+    def __init__(self, config_kwargs, workers: int, shutdown_deadline: float):
+        self.config_kwargs = config_kwargs
+        self.workers = workers
+        self.kill_timeout = shutdown_deadline + KILL_MARGIN
+        self._context = multiprocessing.get_context("spawn")
+        self._processes = {}
+        self._started_at = {}
+        self._stopping = False
+
+    def _start(self, index: int, sockets):
+        process = self._context.Process(
+            target=_worker, args=(index, self.workers, self.config_kwargs, sockets), name=f"worker-{index}"
+        )
+        process.start()
+        self._processes[index] = process
+        self._started_at[index] = time.monotonic()
+        logger.info("Started worker %d (pid %d)", index, process.pid)
+
+    def _stop(self, *_):
+        self._stopping = True
+
+    def run(self):
+        config = uvicorn.Config(**self.config_kwargs)
+        sockets = [config.bind_socket()]
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        for index in range(self.workers):
+            self._start(index, sockets)
+
+        while not self._stopping:
+            time.sleep(0.5)
+            for index, process in list(self._processes.items()):
+                if process.is_alive() or self._stopping:
+                    continue
+                logger.warning("Worker %d (pid %d) exited with %s; restarting", index, process.pid, process.exitcode)
+                multiprocess.mark_process_dead(process.pid)
+                if time.monotonic() - self._started_at[index] < MIN_WORKER_UPTIME:
+                    time.sleep(RESTART_BACKOFF)
+                self._start(index, sockets)
+
+        logger.info("Stopping %d workers", len(self._processes))
+        for process in self._processes.values():
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGTERM)
+        deadline = time.monotonic() + self.kill_timeout
+        for process in self._processes.values():
+            process.join(max(deadline - time.monotonic(), 0))
+            if process.is_alive():
+                logger.warning("Worker pid %d did not stop in time; killing it", process.pid)
+                process.kill()
+                process.join()
+        for sock in sockets:
+            sock.close()
+
+
+def metrics_dir() -> str:
+    """An empty directory for the workers' metric files, exported to them."""
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if path:
+        # Files from a previous run would be reported as current
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+    else:
+        path = tempfile.mkdtemp(prefix="magic-forest-metrics-")
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = path
+    return path
+
+
+def worker_count(requested: int) -> int:
+    """``requested`` workers if they can share state through the change feed, else one."""
+    if requested <= 1:
+        return 1
+    if os.environ.get("CHANGE_FEED", "1").lower() in ("0", "false", "no"):
+        logger.warning("CHANGE_FEED is off; serving with 1 worker instead of %d", requested)
+        return 1
+    if not change_streams_supported(os.environ.get("MONGO_URL", "mongodb://localhost:27017")):
+        logger.warning("Mongo has no change streams (not a replica set); serving with 1 worker instead of %d",
+                       requested)
+        return 1
+    return requested
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app", default="server:app")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument(
+        "--workers", type=int,
+        default=int(os.environ.get("WEB_CONCURRENCY") or multiprocessing.cpu_count()),
+    )
+    parser.add_argument(
+        "--shutdown-deadline", type=float, default=float(os.environ.get("SHUTDOWN_DEADLINE") or 25.0),
+    )
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    config_kwargs = {
+        "app": args.app,
+        "host": args.host,
+        "port": args.port,
+        "log_level": args.log_level,
+        # Workers wait for connections within the deadline, and their lifespan reads it too
+        "timeout_graceful_shutdown": args.shutdown_deadline,
+    }
+    os.environ["SHUTDOWN_DEADLINE"] = str(args.shutdown_deadline)
+    workers = worker_count(args.workers)
+    logger.info("Serving %s on %s:%d with %d workers", args.app, args.host, args.port, workers)
+    owns_metrics_dir = not os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    logger.info("Worker metrics in %s", metrics_dir())
+    try:
+        Supervisor(config_kwargs, workers, args.shutdown_deadline).run()
+    finally:
+        if owns_metrics_dir:
+            shutil.rmtree(os.environ["PROMETHEUS_MULTIPROC_DIR"], ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
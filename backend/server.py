@@ -1,40 +1,92 @@
-from fastapi import FastAPI, HTTPException, Depends, Body
+from fastapi import FastAPI, HTTPException, Depends, Body, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
 from datetime import datetime
 from typing import Optional, List, Dict, Any
+from contextlib import asynccontextmanager
 import os
+import asyncio
+import logging
+import time
+import socket
 import uuid
 import stripe
-import json
-from bson import ObjectId
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, PyMongoError
 
-# JSON encoder to handle MongoDB ObjectId and datetime
-class MongoJSONEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, ObjectId):
-            return str(obj)
-        if isinstance(obj, datetime):
-            return obj.isoformat()
-        return super().default(obj)
-
-# Helper function to convert MongoDB documents to JSON-serializable format
-def mongo_to_json(doc):
-    if doc is None:
-        return None
-    if isinstance(doc, list):
-        return [mongo_to_json(item) for item in doc]
-    if isinstance(doc, dict):
-        return {k: mongo_to_json(v) for k, v in doc.items()}
-    if isinstance(doc, ObjectId):
-        return str(doc)
-    if isinstance(doc, datetime):
-        return doc.isoformat()
-    return doc
+from totals import ensure_totals, read_totals, record_donation, record_donations
+from tree_feed import TreeHub
+from sequences import contiguous_prefix, ensure_tree_sequence, next_sequence
+from versioning import VERSIONS_COLLECTION, ResourceVersions, etag_matches
+from pagination import SORT_KEY, after_filter, encode_cursor
+from clusters import MAX_CLUSTER_ZOOM, ensure_clusters, read_clusters, record_trees
+from placement import PlacementEngine
+from indexes import ensure_indexes, missing_indexes
+from stripe_gateway import StripeGateway
+from tree_codec import ColumnarForest
+from streaming import MEDIA_TYPES, STREAM_BATCH_SIZE, encode_cursor_chunks
+from bulk import BULK_CHUNK_SIZE, request_rows
+from write_buffer import GroupCommitBuffer
+from ttl_cache import TTLCache
+from single_flight import SingleFlight
+from webhooks import WebhookPipeline, claim_events, record_failed_event, release_events
+from change_feed import ChangeFeed
+from resources import DrainMiddleware, ResourceManager
+from mongo_lock import mongo_lock
+from metrics import CONTENT_TYPE_LATEST, MetricsMiddleware, MongoCommandMetrics, StatsSampler, render as render_metrics
+from serialization import DONATION_PROJECTION, TREE_PROJECTION, MongoJSONResponse, dumps, public_doc
+
+logger = logging.getLogger(__name__)
+
+# Cold-start clock: from import of this module until the worker is warm
+IMPORTED_AT = time.monotonic()
+ready_at: Optional[float] = None
+warmup_status: Dict[str, Dict[str, Any]] = {
+    name: {"done": False} for name in ("versions", "tree_snapshot", "totals", "plan_catalog")
+}
+
+# Startup and shutdown, once per worker process. Connections are opened here rather
+# than at import, so nothing with sockets or an event loop is shared across a fork.
+# Everything opened is registered with the resource manager, which drains and closes
+# it in reverse order on shutdown (see resources.py).
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global client, db, stripe_gateway, change_feed, ready_at
+    reset_worker_state()
+    ready_at = None
+    resources.reset()
+    # Tests and benchmarks may have injected their own database and gateway
+    if db is None:
+        client, db = connect_database()
+        resources.add("mongo", close_database)
+    if stripe_gateway is None:
+        stripe_gateway = StripeGateway(stripe.api_key, api_base=STRIPE_API_BASE)
+        resources.add("stripe", close_stripe_gateway)
+    await bootstrap_database()
+    change_feed = None
+    if CHANGE_FEED_ENABLED:
+        change_feed = ChangeFeed(db, apply_change, CHANGE_FEED_ID,
+                                 collections=("donations", "trees", VERSIONS_COLLECTION),
+                                 on_history_lost=reload_worker_state)
+        # Before the snapshot loads, so trees other workers plant meanwhile are replayed into it
+        await change_feed.prepare()
+    await warm_up()
+    stats_sampler.start()
+    resources.add("stats sampler", lambda _: stats_sampler.close())
+    webhook_pipeline.start()
+    resources.add("webhooks", lambda remaining: webhook_pipeline.close(timeout=remaining))
+    for name, buffer in write_buffers.items():
+        resources.add(f"{name} write buffer", lambda _, buffer=buffer: buffer.close())
+    if change_feed is not None:
+        change_feed.start()
+        resources.add("change feed", lambda _: change_feed.close())
+    yield
+    await resources.shutdown()
 
 # Initialize FastAPI app
-app = FastAPI(title="The Magic Forest API")
+app = FastAPI(title="The Magic Forest API", lifespan=lifespan, default_response_class=MongoJSONResponse)
 
 # Configure CORS
 app.add_middleware(
@@ -45,25 +97,195 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Owns this worker's pools and background workers; drains them on shutdown
+resources = ResourceManager(shutdown_deadline=float(os.environ.get("SHUTDOWN_DEADLINE", "25")))
+app.add_middleware(DrainMiddleware, manager=resources)
+# Outermost, so requests refused while draining are counted too (see metrics.py)
+app.add_middleware(MetricsMiddleware)
+
 # Get MongoDB connection string from environment variable
 MONGO_URL = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
 
-# Connect to MongoDB
-client = AsyncIOMotorClient(MONGO_URL)
-db = client.magic_forest_db
+# MongoDB client and database of this worker; set by the lifespan
+client: Optional[AsyncIOMotorClient] = None
+db = None
+
+# Connection pool of each Motor client
+MONGO_POOL_OPTIONS = {
+    "maxPoolSize": int(os.environ.get("MONGO_MAX_POOL_SIZE", "100")),
+    "minPoolSize": int(os.environ.get("MONGO_MIN_POOL_SIZE", "0")),
+    # Fail a request after this long waiting for a free connection, rather than hang
+    "waitQueueTimeoutMS": int(os.environ.get("MONGO_WAIT_QUEUE_TIMEOUT_MS", "10000")),
+}
+
+# Create a Motor client (one per worker process, or per maintenance command)
+def connect_database(mongo_url: str = MONGO_URL):
+    client = AsyncIOMotorClient(mongo_url, event_listeners=[MongoCommandMetrics()], **MONGO_POOL_OPTIONS)
+    return client, client.magic_forest_db
+
+async def close_database(_remaining: float):
+    global client, db
+    client.close()
+    client, db = None, None
 
 # Initialize Stripe
 # In a production environment, store the key in .env file
 # Initialize Stripe with the secret key from environment variables
 stripe.api_key = os.environ.get("STRIPE_SECRET_KEY", "sk_test_51RQ8jg014qVof0nw4sj0ljKhWGTnWxhp5IDRLPyigurUVFwNClyfOOhywR5uUpXx7SVbH4QKwVItlufHXDw9h1ee00h04qF2S5")
 STRIPE_MODE = os.environ.get("STRIPE_MODE", "test")
+# Optional override of the Stripe API host, e.g. a local stripe-mock
+STRIPE_API_BASE = os.environ.get("STRIPE_API_BASE")
+
+# All Stripe calls go through the async gateway so they never block the event loop;
+# created per worker in the lifespan
+stripe_gateway: Optional[StripeGateway] = None
 FRONTEND_URL = "https://d7a030ab-2fb9-45b2-8295-6340f97fdca2.preview.emergentagent.com"
 
 # Create a test mode note for users
 TEST_MODE_NOTE = "Test mode is active. In test mode, use the test card number 4242 4242 4242 4242, any future expiration date, any 3-digit CVC, and any 5-digit ZIP code."
 
+# Monthly subscription plans and their price in dollars
+SUBSCRIPTION_PLANS = {"seedling": 5, "guardian": 15, "ranger": 30}
+
 # Tree threshold - minimum donation amount to create a tree
 TREE_THRESHOLD = 10
+# Bulk planting: trees per request, per insert batch, and the time budget for one request
+BULK_TREE_LIMIT = int(os.environ.get("BULK_TREE_LIMIT", "10000"))
+BULK_TREE_BATCH = 500
+BULK_PLANT_BUDGET_SECONDS = float(os.environ.get("BULK_PLANT_BUDGET_SECONDS", "10"))
+
+# Fan-out hub feeding every /api/trees/stream subscriber
+tree_hub = TreeHub()
+# Live streams end when the worker starts draining; browsers reconnect to another worker
+resources.on_drain(tree_hub.close_all)
+
+# Occupancy grid that hands out non-overlapping tree positions
+placement = PlacementEngine()
+
+# In-memory columnar copy of the forest behind /api/trees/columnar
+forest = ColumnarForest()
+
+# Seconds between keep-alive comments on idle event streams
+STREAM_HEARTBEAT_SECONDS = 15
+
+# Maximum number of trees returned by one /api/trees?since= or ?after= call
+TREE_DELTA_LIMIT = 1000
+
+# Default page size for /api/trees?after= pagination
+TREE_PAGE_SIZE = 500
+
+# Write versions behind the ETags of the read endpoints, shared by all workers (see versioning.py)
+versions = ResourceVersions()
+
+# Donations never change once written, so lookups are cached in-process (see ttl_cache.py)
+donation_cache = TTLCache(
+    "donations",
+    maxsize=int(os.environ.get("DONATION_CACHE_SIZE", "10000")),
+    ttl=float(os.environ.get("DONATION_CACHE_TTL", "300")),
+    negative_ttl=float(os.environ.get("DONATION_CACHE_NEGATIVE_TTL", "5")),
+)
+
+# Checkout sessions in these states never change again, so Stripe is not asked twice
+TERMINAL_CHECKOUT_STATUSES = ("complete", "expired")
+PAID_STATUSES = ("paid", "no_payment_required", "succeeded")
+checkout_lookups = SingleFlight("checkout")
+
+# Identical concurrent reads of the hot polling endpoints share one query, and with a
+# micro-TTL reuse its result briefly. Keys carry the resource version, so a local write
+# is never answered with an older result.
+def make_read_coalescer(name: str, default_ttl_ms: str = "250"):
+    prefix = f"COALESCE_{name.upper()}"
+    return SingleFlight(
+        name,
+        ttl=float(os.environ.get(f"{prefix}_TTL_MS", default_ttl_ms)) / 1000,
+        enabled=os.environ.get(prefix, "1").lower() not in ("0", "false", "no"),
+    )
+
+trees_reads = make_read_coalescer("trees")
+totals_reads = make_read_coalescer("totals")
+
+# Stripe webhooks are acknowledged at once and applied in batches by a worker pool (see webhooks.py)
+STRIPE_WEBHOOK_SECRET = os.environ.get("STRIPE_WEBHOOK_SECRET")
+# Checkout sessions and subscriptions created here carry this in their metadata; other
+# apps on the same Stripe account receive webhooks for theirs too
+STRIPE_APPLICATION = "magic_forest"
+CHECKOUT_EVENTS = (
+    "checkout.session.completed",
+    "checkout.session.async_payment_succeeded",
+    "checkout.session.async_payment_failed",
+    "checkout.session.expired",
+)
+# Sessions that will never be paid update an existing donation but never create one
+UNPAID_CHECKOUT_EVENTS = ("checkout.session.async_payment_failed", "checkout.session.expired")
+webhook_pipeline = WebhookPipeline(
+    lambda events: apply_stripe_events(events),
+    workers=int(os.environ.get("WEBHOOK_WORKERS", "4")),
+    queue_size=int(os.environ.get("WEBHOOK_QUEUE_SIZE", "10000")),
+    batch_size=int(os.environ.get("WEBHOOK_BATCH_SIZE", "100")),
+    # Events about one checkout session (or invoice) are applied in order by one worker
+    partition_key=lambda event: event["data"]["object"].get("id") or event["id"],
+    max_attempts=int(os.environ.get("WEBHOOK_MAX_ATTEMPTS", "5")),
+    # Events that keep failing on their own are kept for `manage.py webhooks retry`
+    dead_letter=lambda event, error: record_failed_event(db, event, error),
+)
+
+# Change streams keep this worker's in-memory state in step with writes made by other
+# workers (see change_feed.py). Started in the lifespan; inactive on a standalone mongod.
+CHANGE_FEED_ENABLED = os.environ.get("CHANGE_FEED", "1").lower() not in ("0", "false", "no")
+CHANGE_FEED_ID = os.environ.get("CHANGE_FEED_ID") or f"{socket.gethostname()}-{os.environ.get('WORKER_INDEX', '0')}"
+change_feed: Optional[ChangeFeed] = None
+# Worker processes serving this app (set by serve.py); above one they depend on the feed
+WORKER_COUNT = int(os.environ.get("WORKER_COUNT", "1"))
+
+# Drop anything a parent process put in the in-memory state before forking this worker
+def reset_worker_state():
+    donation_cache.clear()
+    for coalescer in (trees_reads, totals_reads):
+        coalescer.clear()
+    placement.reset()
+    forest.reset()
+
+# Rebuild the in-memory state from Mongo, after the change feed missed changes
+async def reload_worker_state():
+    reset_worker_state()
+    await versions.load(db)
+    await warm_tree_snapshot()
+
+# How long /api/ready waits for Mongo to answer a ping
+READY_PING_TIMEOUT = 2.0
+
+# Opt-in group commit of donation and tree inserts (see write_buffer.py)
+WRITE_BUFFER_ENABLED = os.environ.get("WRITE_BUFFER", "").lower() in ("1", "true", "yes")
+WRITE_BUFFER_MAX_BATCH = int(os.environ.get("WRITE_BUFFER_MAX_BATCH", "100"))
+WRITE_BUFFER_MAX_DELAY_MS = float(os.environ.get("WRITE_BUFFER_MAX_DELAY_MS", "5"))
+WRITE_BUFFER_MAX_PENDING = int(os.environ.get("WRITE_BUFFER_MAX_PENDING", "5000"))
+
+def make_write_buffer(collection: str):
+    return GroupCommitBuffer(
+        lambda docs: db[collection].insert_many(docs, ordered=False),
+        max_batch=WRITE_BUFFER_MAX_BATCH,
+        max_delay=WRITE_BUFFER_MAX_DELAY_MS / 1000,
+        max_pending=WRITE_BUFFER_MAX_PENDING,
+    )
+
+write_buffers = {name: make_write_buffer(name) for name in ("donations", "trees")} if WRITE_BUFFER_ENABLED else {}
+
+# Cache hit counts and queue depths, copied into /api/metrics
+stats_sampler = StatsSampler(interval=float(os.environ.get("METRICS_SAMPLE_INTERVAL", "5")))
+stats_sampler.track_cache("donations", lambda: (donation_cache.hits, donation_cache.misses))
+for coalescer in (checkout_lookups, trees_reads, totals_reads):
+    stats_sampler.track_cache(
+        coalescer.name, lambda c=coalescer: (c.requests - c.executions, c.executions)
+    )
+stats_sampler.track_queue("webhooks", lambda: webhook_pipeline.backlog)
+for name, buffer in write_buffers.items():
+    stats_sampler.track_queue(f"{name} write buffer", lambda b=buffer: b.pending)
+
+# Cache-Control policies for the read endpoints
+TREES_CACHE_CONTROL = "public, no-cache"  # always revalidate; 304s are cheap
+TOTALS_CACHE_CONTROL = "public, max-age=5, stale-while-revalidate=30"
+DONATION_CACHE_CONTROL = "private, no-cache"  # contains the donor's email
+TREE_DETAIL_CACHE_CONTROL = "public, max-age=86400, immutable"  # trees never change once planted
 
 # --------------------------
 # Models
@@ -97,6 +319,21 @@ class TreeBase(BaseModel):
 class TreeCreate(TreeBase):
     pass
 
+class TreePlanting(BaseModel):
+    donor: str
+    message: str
+    type: Optional[str] = None  # defaults to the request's type
+
+class BulkTreeCreate(BaseModel):
+    donation_id: str
+    type: str
+    # Either N identical trees...
+    count: Optional[int] = Field(None, ge=1, le=BULK_TREE_LIMIT)
+    donor: Optional[str] = None
+    message: Optional[str] = None
+    # ...or one tree per donor/message pair
+    trees: Optional[List[TreePlanting]] = Field(None, min_length=1, max_length=BULK_TREE_LIMIT)
+
 class Tree(TreeBase):
     id: str
     x: float  # X coordinate on the map
@@ -111,25 +348,98 @@ class Tree(TreeBase):
 # Database functions
 # --------------------------
 
+# Create indexes and backfill derived data for databases that predate it. Every worker
+# runs this at startup; the lock makes them take turns, so one backfills and the rest
+# find the work done.
+async def bootstrap_database():
+    async with mongo_lock(db, "bootstrap"):
+        failed = await ensure_indexes(db)
+        if failed:
+            logger.warning("Serving without indexes: %s", ", ".join(failed))
+        await ensure_totals(db)
+        await ensure_tree_sequence(db)
+        await ensure_tree_locations()
+        await ensure_clusters(db)
+
+async def close_stripe_gateway(_remaining: float):
+    global stripe_gateway
+    await stripe_gateway.close()
+    stripe_gateway = None
+
+# Stripe line items for each subscription plan, built once per worker
+_plan_catalog: Dict[str, Dict[str, Any]] = {}
+
+def plan_catalog():
+    if not _plan_catalog:
+        for plan, amount in SUBSCRIPTION_PLANS.items():
+            _plan_catalog[plan] = {
+                "price_data": {
+                    "currency": "usd",
+                    "product_data": {
+                        "name": f"Magic Forest {plan.capitalize()} Plan",
+                        "description": f"Monthly donation to Magic Forest - {plan.capitalize()} tier",
+                    },
+                    "unit_amount": amount * 100,
+                    "recurring": {
+                        "interval": "month"
+                    }
+                },
+                "quantity": 1,
+            }
+    return _plan_catalog
+
+# Load the tree snapshot (placement grid, columnar forest, first page) into memory
+async def warm_tree_snapshot():
+    await placement.ensure_loaded(db)
+    await forest.ensure_loaded(db)
+    forest.encode()
+    await get_trees()
+
+# Build the subscription plan line items; the catalog lives in-process, so Stripe is not called
+async def warm_plan_catalog():
+    plan_catalog()
+
+# Run each warm-up task, recording how long it took; /api/ready reports the results
+async def warm_up():
+    for name, task in (("versions", lambda: versions.load(db)),
+                       ("tree_snapshot", warm_tree_snapshot), ("totals", get_donation_totals),
+                       ("plan_catalog", warm_plan_catalog)):
+        started = time.monotonic()
+        try:
+            await task()
+        except Exception as e:
+            logger.exception("Warm-up task %s failed", name)
+            warmup_status[name] = {"done": False, "error": str(e)}
+            continue
+        warmup_status[name] = {"done": True, "seconds": round(time.monotonic() - started, 3)}
+    global ready_at
+    ready_at = time.monotonic()
+    logger.info("Worker warm in %.2fs after import", ready_at - IMPORTED_AT)
+
+# Get the materialized donation totals (amount, count and breakdowns)
+async def get_donation_totals():
+    return await totals_reads.do(versions.current("donations"), lambda: read_totals(db))
+
 # Get total donations
 async def get_total_donations():
-    pipeline = [
-        {"$group": {"_id": None, "total": {"$sum": "$amount"}}}
-    ]
-    result = await db.donations.aggregate(pipeline).to_list(length=1)
-    return result[0]["total"] if result else 0
+    totals = await get_donation_totals()
+    return totals["total"]
 
-# Get donation by ID
+# Get donation by ID, through the read-through cache
 async def get_donation(donation_id: str):
-    donation = await db.donations.find_one({"id": donation_id})
+    hit, donation = donation_cache.lookup(donation_id)
+    if hit:
+        return donation
+    donation = await db.donations.find_one({"id": donation_id}, DONATION_PROJECTION)
+    donation_cache.set(donation_id, donation)
     return donation
 
-# Create a new donation
-async def create_donation(donation: DonationCreate):
+# Build the stored document for a new donation
+def build_donation_doc(donation: DonationCreate):
     donation_id = str(uuid.uuid4())
     # Convert timestamp to string to avoid serialization issues
     now = datetime.now().isoformat()
-    donation_doc = {
+    return {
         "id": donation_id,
         "type": donation.type,
         "amount": donation.amount,
@@ -140,17 +450,307 @@ async def create_donation(donation: DonationCreate):
         "payment_method": donation.payment_method,
         "timestamp": now
     }
-    await db.donations.insert_one(donation_doc)
+
+# Insert one document, group-committed with concurrent inserts when the write buffer is on
+async def insert_document(collection: str, doc):
+    buffer = write_buffers.get(collection)
+    if buffer is not None:
+        await buffer.insert(doc)
+    else:
+        await db[collection].insert_one(doc)
+
+# Create a new donation
+async def create_donation(donation: DonationCreate):
+    donation_doc = build_donation_doc(donation)
+    await insert_document("donations", donation_doc)
+    # Let other workers drop a cached miss for this id, then write through locally
+    donation_cache.invalidate(donation_doc["id"])
+    donation_cache.set(donation_doc["id"], public_doc(donation_doc, DONATION_PROJECTION))
+    await record_donation(db, donation_doc)
+    await versions.publish(db, "donations")
     return donation_doc
 
+# Insert one chunk of (row, doc) pairs unordered; returns how many were stored
+async def insert_donation_chunk(chunk, errors):
+    docs = [doc for _, doc in chunk]
+    try:
+        await db.donations.insert_many(docs, ordered=False)
+        stored = docs
+    except BulkWriteError as e:
+        # Unordered: every row except the failed ones was written
+        failed = {}
+        for error in e.details.get("writeErrors", []):
+            failed[error["index"]] = error
+        stored = []
+        for index, (row, doc) in enumerate(chunk):
+            if index in failed:
+                message = "A donation for this session already exists" if failed[index].get("code") == 11000 \
+                    else failed[index].get("errmsg", "Write failed")
+                errors.append({"row": row, "error": message})
+            else:
+                stored.append(doc)
+    await record_donations(db, stored)
+    return len(stored)
+
+# Validate and insert (row, payload) pairs in chunks; returns (inserted, errors)
+async def create_donations_bulk(rows, chunk_size: int = BULK_CHUNK_SIZE):
+    inserted, errors, chunk = 0, [], []
+    async for row, payload in rows:
+        if isinstance(payload, Exception):
+            errors.append({"row": row, "error": f"Invalid JSON: {payload}"})
+            continue
+        try:
+            donation = DonationCreate.model_validate(payload)
+        except ValidationError as e:
+            message = "; ".join(
+                f"{'.'.join(str(part) for part in error['loc']) or 'row'}: {error['msg']}" for error in e.errors()
+            )
+            errors.append({"row": row, "error": message})
+            continue
+        chunk.append((row, build_donation_doc(donation)))
+        if len(chunk) >= chunk_size:
+            inserted += await insert_donation_chunk(chunk, errors)
+            chunk = []
+    if chunk:
+        inserted += await insert_donation_chunk(chunk, errors)
+    if inserted:
+        await versions.publish(db, "donations")
+    errors.sort(key=lambda error: error["row"])
+    return inserted, errors
+
+# Checkout session status of a donation; older donations only recorded the payment status
+def checkout_status(donation):
+    status = donation.get("checkout_status")
+    if status is None and donation.get("payment_status") in PAID_STATUSES:
+        status = "complete"
+    return status
+
+# Get the donation recorded for a checkout session
+async def get_donation_by_session(session_id: str):
+    return await db.donations.find_one({"session_id": session_id}, DONATION_PROJECTION)
+
+# New donation document and current status fields for a Stripe checkout session.
+# Session donations are stored with counted=False and added to the totals once paid.
+def checkout_donation(session_id: str, session):
+    metadata = session.get("metadata") or {}
+    # Subscriptions carry no amount in their metadata; fall back to what was charged
+    amount = metadata.get("amount") or (session.get("amount_total") or 0) / 100
+    customer = session.get("customer_details")
+    donation_doc = build_donation_doc(DonationCreate(
+        type=metadata.get("donation_type", "one-time"),
+        amount=float(amount),
+        plan=metadata.get("plan"),
+        email=customer.get("email") if customer else None,
+        payment_status=session.get("payment_status"),
+        session_id=session_id,
+    ))
+    donation_doc["counted"] = False
+    status = {"payment_status": donation_doc.pop("payment_status"), "checkout_status": session.get("status")}
+    return donation_doc, status
+
+# Mark a paid donation (matched by session_id or invoice_id) as counted; returns it only
+# for the caller that marked it, so each donation reaches the totals once however many
+# events, or retries of one, report it paid.
+# Donations recorded before this flag existed have no "counted" field and are never matched.
+async def claim_paid_donation(query):
+    donation = await db.donations.find_one_and_update(
+        {**query, "counted": False, "payment_status": {"$in": list(PAID_STATUSES)}},
+        {"$set": {"counted": True}}, projection=DONATION_PROJECTION,
+    )
+    return donation
+
+# Upsert the donation for a checkout session; totals count it once it is paid.
+# With create=False (expired or failed sessions) only an existing donation is updated.
+async def record_checkout_session(session_id: str, session, create: bool = True):
+    donation_doc, status = checkout_donation(session_id, session)
+    update = {"$setOnInsert": donation_doc, "$set": status}
+    try:
+        previous = await db.donations.find_one_and_update(
+            {"session_id": session_id}, update, projection=DONATION_PROJECTION, upsert=create
+        )
+    except DuplicateKeyError:
+        # Lost an upsert race with another worker; the document exists now
+        previous = await db.donations.find_one_and_update(
+            {"session_id": session_id}, update, projection=DONATION_PROJECTION
+        )
+    donation_doc = public_doc(donation_doc, DONATION_PROJECTION)
+    if previous is None and not create:
+        # Nothing to update, and nothing stored for a session that was never paid
+        return {**donation_doc, **status}
+    paid = await claim_paid_donation({"session_id": session_id}) if status["payment_status"] in PAID_STATUSES else None
+    if paid is not None:
+        await record_donation(db, paid)
+    if previous is None:
+        donation = paid or {**donation_doc, **status}
+        await versions.publish(db, "donations")
+        donation_cache.set(donation["id"], donation)
+        return donation
+    donation = paid or {**previous, **status}
+    if previous.get("payment_status") != status["payment_status"] or previous.get("checkout_status") != status["checkout_status"]:
+        await versions.publish(db, "donations")
+        donation_cache.invalidate(donation["id"])
+    return donation
+
+# Donation for a checkout session; Stripe is only asked while the session can still change
+async def load_checkout_session(session_id: str):
+    donation = await get_donation_by_session(session_id)
+    if donation is not None and checkout_status(donation) in TERMINAL_CHECKOUT_STATUSES:
+        return donation
+    session = await stripe_gateway.retrieve_checkout_session(session_id)
+    return await record_checkout_session(session_id, session, create=session.get("status") != "expired")
+
+# Upsert the donations for many (session, create) pairs with one read and one bulk write.
+# Only paid sessions reach the totals, each once, whichever event reports the payment.
+async def record_checkout_sessions(sessions):
+    session_ids = [session["id"] for session, _ in sessions]
+    existing = {}
+    async for donation in db.donations.find({"session_id": {"$in": session_ids}}, DONATION_PROJECTION):
+        existing[donation["session_id"]] = donation
+    operations, donations, paid_ids = [], [], []
+    for session, create in sessions:
+        donation_doc, status = checkout_donation(session["id"], session)
+        update = {"$setOnInsert": donation_doc, "$set": status} if create else {"$set": status}
+        operations.append(UpdateOne({"session_id": session["id"]}, update, upsert=create))
+        donations.append(public_doc({**donation_doc, **status}, DONATION_PROJECTION))
+        if status["payment_status"] in PAID_STATUSES and session["id"] not in paid_ids:
+            paid_ids.append(session["id"])
+    # Ordered, so a later event for the same session updates the document the earlier one inserted
+    result = await db.donations.bulk_write(operations, ordered=True)
+    inserted = [donations[index] for index in result.upserted_ids]
+    # Claimed after the write, so a session first recorded unpaid is counted when it is paid
+    claims = [claim_paid_donation({"session_id": session_id}) for session_id in paid_ids]
+    paid = [donation for donation in await asyncio.gather(*claims) if donation]
+    await record_donations(db, paid)
+    for donation in existing.values():
+        donation_cache.invalidate(donation["id"])
+    for donation in inserted + paid:
+        donation_cache.set(donation["id"], donation)
+    await versions.publish(db, "donations")
+
+# Subscription details of an invoice; API versions since 2025-03-31 nest them under "parent"
+def subscription_details(invoice):
+    return (invoice.get("parent") or {}).get("subscription_details") or invoice.get("subscription_details") or {}
+
+# Record each subscription renewal charge as a recurring donation, once per invoice,
+# so a retried batch neither duplicates nor double-counts it
+async def record_renewals(invoices):
+    operations, donation_docs = [], []
+    for invoice in invoices:
+        details = subscription_details(invoice)
+        donation_doc = build_donation_doc(DonationCreate(
+            type="recurring",
+            amount=(invoice.get("amount_paid") or 0) / 100,
+            plan=(details.get("metadata") or {}).get("plan"),
+            email=invoice.get("customer_email"),
+            payment_status="paid",
+        ))
+        donation_doc["invoice_id"] = invoice["id"]
+        donation_doc["counted"] = False
+        operations.append(UpdateOne({"invoice_id": invoice["id"]}, {"$setOnInsert": donation_doc}, upsert=True))
+        donation_docs.append(donation_doc)
+    await db.donations.bulk_write(operations, ordered=False)
+    claims = [claim_paid_donation({"invoice_id": doc["invoice_id"]}) for doc in donation_docs]
+    await record_donations(db, [donation for donation in await asyncio.gather(*claims) if donation])
+    await versions.publish(db, "donations")
+
+# Whether a checkout or invoice event is about a payment this app started
+def from_this_app(event):
+    obj = event["data"]["object"]
+    if event["type"] == "invoice.paid":
+        metadata = subscription_details(obj).get("metadata")
+    else:
+        metadata = obj.get("metadata")
+    return (metadata or {}).get("application") == STRIPE_APPLICATION
+
+# Apply a batch of verified Stripe events; event ids already applied, and other apps'
+# events, are skipped
+async def apply_stripe_events(events):
+    events = await claim_events(db, [event for event in events if from_this_app(event)])
+    sessions = [
+        (event["data"]["object"], event["type"] not in UNPAID_CHECKOUT_EVENTS)
+        for event in events if event["type"] in CHECKOUT_EVENTS
+    ]
+    # The first invoice of a subscription is already recorded through its checkout session
+    invoices = [
+        event["data"]["object"] for event in events
+        if event["type"] == "invoice.paid" and event["data"]["object"].get("billing_reason") == "subscription_cycle"
+    ]
+    try:
+        if sessions:
+            await record_checkout_sessions(sessions)
+        if invoices:
+            await record_renewals(invoices)
+    except Exception:
+        await release_events(db, events)
+        raise
+
+# Apply a change from any worker, this one included, to this worker's in-memory state.
+# Every step is idempotent, so changes this worker already applied are harmless.
+async def apply_change(collection: str, change):
+    doc = change.get("fullDocument")
+    if collection == VERSIONS_COLLECTION:
+        # Writers publish a version after their write, so the data is applied first
+        if doc:
+            versions.observe(doc)
+    elif collection == "donations":
+        if doc and doc.get("id"):
+            donation_cache.invalidate(doc["id"], propagate=False)
+    elif collection == "trees":
+        if change["operationType"] != "insert" or not doc or not isinstance(doc.get("x"), (int, float)):
+            return
+        if placement.loaded:
+            placement.occupy(doc["x"], doc["y"], doc.get("size") or 1.0)
+        if forest.loaded and not forest.has(doc.get("seq")):
+            forest.append(doc)
+        tree_hub.publish(public_doc(doc, TREE_PROJECTION))
+
 # Get all trees
 async def get_trees():
-    trees = await db.trees.find().to_list(length=100)
-    return trees
+    def query():
+        return db.trees.find({}, TREE_PROJECTION).sort(SORT_KEY).limit(100).to_list(length=100)
+    return await trees_reads.do(versions.current("trees"), query)
 
-# Create a new tree
-async def create_tree(tree: TreeCreate):
-    # Generate random position on the map
+# Cursor over the whole forest in (timestamp, id) order, fetched in bounded batches
+def iter_trees():
+    return db.trees.find({}, TREE_PROJECTION).sort(SORT_KEY).batch_size(STREAM_BATCH_SIZE)
+
+# Get one tree by its sequence number
+async def get_tree_by_seq(seq: int):
+    return await db.trees.find_one({"seq": seq}, TREE_PROJECTION)
+
+# Get trees planted after the given sequence cursor
+async def get_trees_since(since: int, limit: int = TREE_DELTA_LIMIT):
+    batch = await db.trees.find({"seq": {"$gt": since}}, TREE_PROJECTION).sort("seq", 1).limit(limit).to_list(length=limit)
+    trees, cursor = contiguous_prefix(batch, since)
+    # Trees held back behind an in-flight write count as more to fetch
+    return trees, cursor, len(batch) == limit or len(trees) < len(batch)
+
+# Get one page of trees in (timestamp, id) order, after the given page cursor
+async def get_trees_page(after: Optional[str], limit: int = TREE_PAGE_SIZE):
+    # Fetch one extra document to learn whether another page exists
+    trees = await db.trees.find(after_filter(after), TREE_PROJECTION).sort(SORT_KEY).limit(limit + 1).to_list(length=limit + 1)
+    next_cursor = encode_cursor(trees[limit - 1]) if len(trees) > limit else None
+    return trees[:limit], next_cursor
+
+# Backfill the "loc" field the viewport query uses on trees that predate it
+async def ensure_tree_locations():
+    await db.trees.update_many(
+        {"loc": {"$exists": False}, "x": {"$type": "number"}, "y": {"$type": "number"}},
+        [{"$set": {"loc": ["$x", "$y"]}}],
+    )
+
+# Get trees whose location falls inside a viewport (bounding box)
+async def get_trees_in_view(xmin: float, xmax: float, ymin: float, ymax: float, limit: int = TREE_DELTA_LIMIT):
+    query = {"loc": {"$geoWithin": {"$box": [[xmin, ymin], [xmax, ymax]]}}}
+    trees = await db.trees.find(query, TREE_PROJECTION).limit(limit + 1).to_list(length=limit + 1)
+    return trees[:limit], len(trees) > limit
+
+# Get tree clusters (per-cell counts, centroid and dominant type) for a zoom level
+async def get_tree_clusters(zoom: int, viewport=None):
+    return await read_clusters(db, zoom, viewport)
+
+# Build the stored document for a new tree at a placed (x, y) with a reserved seq
+def build_tree_doc(tree: TreeCreate, x: float, y: float, seq: int):
     import random
     tree_id = str(uuid.uuid4())
     # Convert timestamp to string to avoid serialization issues
@@ -161,43 +761,347 @@ async def create_tree(tree: TreeCreate):
         "donor": tree.donor,
         "message": tree.message,
         "type": tree.type,
-        "x": random.uniform(50, 950),  # Random X position
-        "y": random.uniform(50, 550),  # Random Y position
+        "x": x,
+        "y": y,
         "size": random.uniform(0.7, 1.2),  # Random size between 0.7 and 1.2
-        "timestamp": now
+        "timestamp": now,
+        "seq": seq
     }
-    await db.trees.insert_one(tree_doc)
+    tree_doc["loc"] = [tree_doc["x"], tree_doc["y"]]  # 2d-indexed copy for viewport queries
+    return tree_doc
+
+# Update the derived views (clusters, columnar forest, live feed) for stored trees
+async def trees_planted(tree_docs):
+    if forest.loaded:
+        for tree_doc in tree_docs:
+            # The change feed may have appended it already
+            if not forest.has(tree_doc["seq"]):
+                forest.append(tree_doc)
+    # The trees are stored and count against their donation, so failures here are not the caller's
+    try:
+        await record_trees(db, tree_docs)
+    except PyMongoError:
+        logger.exception("Could not add %d trees to the map clusters; run `manage.py clusters rebuild`",
+                         len(tree_docs))
+    try:
+        await versions.publish(db, "trees")
+    except PyMongoError:
+        logger.exception("Could not publish the trees version")
+    for tree_doc in tree_docs:
+        tree_hub.publish(public_doc(tree_doc, TREE_PROJECTION))
+
+# Create a new tree
+async def create_tree(tree: TreeCreate):
+    # Pick a free spot on the map; the map grows when it is full
+    await placement.ensure_loaded(db)
+    x, y = placement.place()
+    tree_doc = build_tree_doc(tree, x, y, await next_sequence(db, "trees"))
+    await insert_document("trees", tree_doc)
+    await trees_planted([tree_doc])
     return tree_doc
 
+# How many trees a donation may plant in all: one per TREE_THRESHOLD, at least one if recurring
+def tree_limit(donation):
+    allowed = int(donation["amount"] // TREE_THRESHOLD)
+    if donation["type"] == "recurring":
+        allowed = max(allowed, 1)
+    return allowed
+
+# Start the trees_planted counter of a donation from before reservations at its planted trees
+async def init_trees_planted(donation):
+    if await db.donations.count_documents({"id": donation["id"], "trees_planted": {"$exists": False}}) == 0:
+        return False
+    planted = await db.trees.count_documents({"donation_id": donation["id"]})
+    result = await db.donations.update_one(
+        {"id": donation["id"], "trees_planted": {"$exists": False}}, {"$set": {"trees_planted": planted}}
+    )
+    return result.modified_count == 1
+
+# Atomically reserve `count` trees of a donation's allowance, so concurrent requests for one
+# donation cannot plant more than it allows between them; False if it does not have them left
+async def reserve_trees(donation, count: int):
+    query = {"id": donation["id"], "trees_planted": {"$lte": tree_limit(donation) - count}}
+    result = await db.donations.update_one(query, {"$inc": {"trees_planted": count}})
+    if result.modified_count == 0 and await init_trees_planted(donation):
+        result = await db.donations.update_one(query, {"$inc": {"trees_planted": count}})
+    if result.modified_count:
+        donation_cache.invalidate(donation["id"])
+    return result.modified_count == 1
+
+# Give back reserved trees that were not planted
+async def release_trees(donation, count: int):
+    if count:
+        await db.donations.update_one({"id": donation["id"]}, {"$inc": {"trees_planted": -count}})
+        donation_cache.invalidate(donation["id"])
+
+# How many more trees a donation may plant
+async def tree_allowance(donation):
+    await init_trees_planted(donation)
+    current = await db.donations.find_one({"id": donation["id"]}, {"_id": 0, "trees_planted": 1})
+    return max(tree_limit(donation) - (current or {}).get("trees_planted", 0), 0)
+
+# Plant many trees in batches: one placement pass, one seq reservation and one insert per batch.
+# Stops between batches once the time budget is spent; returns the stored docs.
+async def create_trees_bulk(trees: List[TreeCreate], budget: float = BULK_PLANT_BUDGET_SECONDS):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + budget
+    await placement.ensure_loaded(db)
+    planted = []
+    for start in range(0, len(trees), BULK_TREE_BATCH):
+        if planted and loop.time() >= deadline:
+            break
+        batch = trees[start:start + BULK_TREE_BATCH]
+        positions = [placement.place() for _ in batch]
+        tree_docs = []
+        try:
+            first_seq = await next_sequence(db, "trees", len(batch))
+            tree_docs = [
+                build_tree_doc(tree, x, y, first_seq + offset)
+                for offset, (tree, (x, y)) in enumerate(zip(batch, positions))
+            ]
+            await db.trees.insert_many(tree_docs, ordered=False)
+        except PyMongoError as e:
+            # Unordered, so trees without a write error of their own were stored all the same
+            if isinstance(e, BulkWriteError):
+                failed = {error["index"] for error in e.details.get("writeErrors", [])}
+                stored = [doc for index, doc in enumerate(tree_docs) if index not in failed]
+                if stored:
+                    planted.extend(stored)
+                    await trees_planted(stored)
+            if not planted:
+                raise
+            # Report what was planted; the caller sees the rest as remaining
+            logger.exception("Bulk planting stopped after %d trees", len(planted))
+            break
+        # Stored, so counted as planted whatever happens next
+        planted.extend(tree_docs)
+        await trees_planted(tree_docs)
+    return planted
+
+# --------------------------
+# Conditional responses
+# --------------------------
+
+def not_modified(request: Request, etag: str, cache_control: str) -> Optional[Response]:
+    # Answer a matching If-None-Match before touching the database
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control})
+    return None
+
+def cacheable_json(content, etag: str, cache_control: str) -> MongoJSONResponse:
+    return MongoJSONResponse(content=content, headers={"ETag": etag, "Cache-Control": cache_control})
+
+def parse_viewport(xmin, xmax, ymin, ymax):
+    # Either no bounding box or all four edges of a valid one
+    viewport = (xmin, xmax, ymin, ymax)
+    if all(v is None for v in viewport):
+        return None
+    if any(v is None for v in viewport):
+        raise HTTPException(status_code=400, detail="xmin, xmax, ymin and ymax must be given together")
+    if xmin > xmax or ymin > ymax:
+        raise HTTPException(status_code=400, detail="Viewport minimum must not exceed its maximum")
+    return viewport
+
 # --------------------------
 # API Routes
 # --------------------------
 
 @app.get("/api/health")
 async def health_check():
-    return {"status": "ok", "timestamp": datetime.now().isoformat()}
+    return {
+        "status": "ok",
+        "timestamp": datetime.now().isoformat(),
+        "caches": {"donations": donation_cache.stats()},
+        "webhooks": webhook_pipeline.stats(),
+        "change_feed": change_feed.stats() if change_feed is not None else None,
+        "coalescing": {coalescer.name: coalescer.stats() for coalescer in (trees_reads, totals_reads)},
+    }
+
+@app.get("/api/ready")
+async def readiness_check():
+    """503 until Mongo answers, every index exists and this worker's warm-up finished."""
+    checks: Dict[str, Any] = {}
+    try:
+        await asyncio.wait_for(db.command("ping"), READY_PING_TIMEOUT)
+        checks["mongo"] = {"ok": True}
+    except Exception as e:
+        checks["mongo"] = {"ok": False, "error": str(e) or type(e).__name__}
+    if checks["mongo"]["ok"]:
+        missing = await missing_indexes(db)
+        checks["indexes"] = {"ok": not missing, "missing": missing}
+    else:
+        checks["indexes"] = {"ok": False, "missing": None}
+    checks["warmup"] = {"ok": all(task["done"] for task in warmup_status.values()), **warmup_status}
+    if WORKER_COUNT > 1:
+        # Without the feed this worker would serve state that other workers' writes never reach
+        checks["change_feed"] = {"ok": change_feed is not None and change_feed.active, "workers": WORKER_COUNT}
+    ready = all(check["ok"] for check in checks.values())
+    body = {
+        "ready": ready,
+        "cold_start_seconds": round(ready_at - IMPORTED_AT, 3) if ready_at is not None else None,
+        "checks": checks,
+    }
+    return MongoJSONResponse(body, status_code=200 if ready else 503, headers={"Cache-Control": "no-store"})
+
+@app.get("/api/metrics")
+async def prometheus_metrics():
+    stats_sampler.sample()
+    return Response(render_metrics(), media_type=CONTENT_TYPE_LATEST, headers={"Cache-Control": "no-store"})
 
 @app.get("/api/total-donations")
-async def total_donations():
-    total = await get_total_donations()
-    return {"total": total}
+async def total_donations(request: Request):
+    etag = versions.etag("donations")
+    cached = not_modified(request, etag, TOTALS_CACHE_CONTROL)
+    if cached:
+        return cached
+    totals = await get_donation_totals()
+    return cacheable_json({"total": totals["total"], "count": totals["count"]}, etag, TOTALS_CACHE_CONTROL)
 
 @app.post("/api/donations", response_model=Dict[str, Any])
 async def create_donation_endpoint(donation: DonationCreate):
-    result = await create_donation(donation)
-    return mongo_to_json(result)
+    try:
+        result = await create_donation(donation)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="A donation for this session already exists")
+    return MongoJSONResponse(public_doc(result, DONATION_PROJECTION))
+
+@app.post("/api/donations/bulk")
+async def create_donations_bulk_endpoint(request: Request):
+    """Ingest a JSON array of donations, or NDJSON with ``Content-Type: application/x-ndjson``.
+
+    Rows are validated independently; bad or duplicate rows are reported in
+    ``errors`` by their 1-based row number and do not fail the rest.
+    """
+    inserted, errors = await create_donations_bulk(request_rows(request))
+    return {"inserted": inserted, "failed": len(errors), "errors": errors}
 
 @app.get("/api/donations/{donation_id}")
-async def get_donation_endpoint(donation_id: str):
+async def get_donation_endpoint(donation_id: str, request: Request):
+    etag = versions.etag("donations", donation_id)
+    cached = not_modified(request, etag, DONATION_CACHE_CONTROL)
+    if cached:
+        return cached
     donation = await get_donation(donation_id)
     if not donation:
         raise HTTPException(status_code=404, detail="Donation not found")
-    return mongo_to_json(donation)
+    return cacheable_json(donation, etag, DONATION_CACHE_CONTROL)
 
 @app.get("/api/trees")
-async def get_trees_endpoint():
+async def get_trees_endpoint(
+    request: Request,
+    since: Optional[int] = Query(None, ge=0),
+    after: Optional[str] = Query(None),
+    limit: Optional[int] = Query(None, ge=1, le=TREE_DELTA_LIMIT),
+    xmin: Optional[float] = Query(None),
+    xmax: Optional[float] = Query(None),
+    ymin: Optional[float] = Query(None),
+    ymax: Optional[float] = Query(None),
+    stream: Optional[str] = Query(None, pattern="^(json|ndjson)$"),
+):
+    viewport = parse_viewport(xmin, xmax, ymin, ymax)
+    etag = versions.etag("trees", f"since={since}&after={after}&limit={limit}&view={viewport}&stream={stream}")
+    cached = not_modified(request, etag, TREES_CACHE_CONTROL)
+    if cached:
+        return cached
+    if viewport:
+        # Viewport query: only trees inside the requested bounding box
+        trees, truncated = await get_trees_in_view(*viewport, limit or TREE_DELTA_LIMIT)
+        content = {"trees": trees, "truncated": truncated}
+        return cacheable_json(content, etag, TREES_CACHE_CONTROL)
+    if since is not None:
+        # Delta sync: only trees newer than the client's cursor
+        trees, cursor, has_more = await get_trees_since(since, limit or TREE_DELTA_LIMIT)
+        content = {"trees": trees, "cursor": cursor, "has_more": has_more}
+        if has_more:
+            # A partial page may change without a new write, so it must not be revalidated
+            return MongoJSONResponse(content=content, headers={"Cache-Control": "no-store"})
+        return cacheable_json(content, etag, TREES_CACHE_CONTROL)
+    if after is not None or limit is not None:
+        # Keyset pagination over the whole forest
+        try:
+            trees, next_cursor = await get_trees_page(after, limit or TREE_PAGE_SIZE)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        content = {"trees": trees, "next": next_cursor}
+        return cacheable_json(content, etag, TREES_CACHE_CONTROL)
+    if stream:
+        # Whole forest, encoded batch by batch without materializing the cursor
+        return StreamingResponse(
+            encode_cursor_chunks(iter_trees(), stream),
+            media_type=MEDIA_TYPES[stream],
+            headers={"ETag": etag, "Cache-Control": TREES_CACHE_CONTROL},
+        )
     trees = await get_trees()
-    return mongo_to_json(trees)
+    return cacheable_json(trees, etag, TREES_CACHE_CONTROL)
+
+@app.get("/api/trees/clusters")
+async def get_tree_clusters_endpoint(
+    request: Request,
+    zoom: int = Query(0, ge=0, le=MAX_CLUSTER_ZOOM),
+    xmin: Optional[float] = Query(None),
+    xmax: Optional[float] = Query(None),
+    ymin: Optional[float] = Query(None),
+    ymax: Optional[float] = Query(None),
+):
+    viewport = parse_viewport(xmin, xmax, ymin, ymax)
+    etag = versions.etag("trees", f"clusters&zoom={zoom}&view={viewport}")
+    cached = not_modified(request, etag, TREES_CACHE_CONTROL)
+    if cached:
+        return cached
+    clusters = await get_tree_clusters(zoom, viewport)
+    return cacheable_json({"zoom": zoom, "clusters": clusters}, etag, TREES_CACHE_CONTROL)
+
+@app.get("/api/trees/columnar")
+async def get_trees_columnar(request: Request):
+    # Packed typed arrays (see tree_codec); donor and message come from /api/trees/seq/{seq}
+    etag = versions.etag("trees", "columnar")
+    cached = not_modified(request, etag, TREES_CACHE_CONTROL)
+    if cached:
+        return cached
+    await forest.ensure_loaded(db)
+    return Response(
+        content=forest.encode(),
+        media_type="application/octet-stream",
+        headers={"ETag": etag, "Cache-Control": TREES_CACHE_CONTROL},
+    )
+
+@app.get("/api/trees/seq/{seq}")
+async def get_tree_by_seq_endpoint(seq: int):
+    tree = await get_tree_by_seq(seq)
+    if not tree:
+        raise HTTPException(status_code=404, detail="Tree not found")
+    return MongoJSONResponse(tree, headers={"Cache-Control": TREE_DETAIL_CACHE_CONTROL})
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {dumps(data).decode()}\n\n"
+
+@app.get("/api/trees/stream")
+async def stream_trees(snapshot: bool = True):
+    # Subscribe before taking the snapshot so no tree planted in between is lost
+    subscription = tree_hub.subscribe()
+
+    async def events():
+        try:
+            # Clients that load /api/trees/columnar first can skip the JSON snapshot
+            initial = await get_trees() if snapshot else []
+            seen = {tree["id"] for tree in initial}
+            if snapshot:
+                yield sse_event("snapshot", initial)
+            while not subscription.dropped:
+                tree = await subscription.get(timeout=STREAM_HEARTBEAT_SECONDS)
+                if tree is None:
+                    yield ": keep-alive\n\n"
+                elif tree["id"] not in seen:
+                    yield sse_event("tree", tree)
+            # Too slow to keep up; the browser reconnects and gets a new snapshot
+        finally:
+            subscription.close()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @app.post("/api/trees", response_model=Dict[str, Any])
 async def create_tree_endpoint(tree: TreeCreate):
@@ -207,19 +1111,91 @@ async def create_tree_endpoint(tree: TreeCreate):
         raise HTTPException(status_code=404, detail="Donation not found")
     
     # Check if donation amount meets threshold or is a recurring donation
-    if donation["type"] == "recurring" or donation["amount"] >= TREE_THRESHOLD:
-        result = await create_tree(tree)
-        return mongo_to_json(result)
-    else:
+    if tree_limit(donation) == 0:
         raise HTTPException(
             status_code=400, 
             detail=f"Donation amount must be at least ${TREE_THRESHOLD} to plant a tree"
         )
+    # Same allowance as /api/trees/bulk, reserved atomically
+    if not await reserve_trees(donation, 1):
+        raise HTTPException(
+            status_code=400,
+            detail=f"This donation has already planted its {tree_limit(donation)} tree(s) (one per ${TREE_THRESHOLD})"
+        )
+    try:
+        result = await create_tree(tree)
+    except Exception:
+        await release_trees(donation, 1)
+        raise
+    return MongoJSONResponse(public_doc(result, TREE_PROJECTION))
+
+@app.post("/api/trees/bulk", response_model=Dict[str, Any])
+async def create_trees_bulk_endpoint(request: BulkTreeCreate):
+    """Plant many trees for one donation.
+
+    Send either ``count`` with a shared ``donor``/``message``, or ``trees`` with
+    one donor/message pair per tree. If the time budget runs out part way,
+    the response reports ``remaining``; repeating the request plants only
+    what the donation still allows.
+    """
+    if request.trees is not None:
+        trees = [
+            TreeCreate(donation_id=request.donation_id, type=item.type or request.type,
+                       donor=item.donor, message=item.message)
+            for item in request.trees
+        ]
+    elif request.count is not None and request.donor is not None and request.message is not None:
+        tree = TreeCreate(donation_id=request.donation_id, type=request.type,
+                          donor=request.donor, message=request.message)
+        trees = [tree] * request.count
+    else:
+        raise HTTPException(status_code=400, detail="Send either trees, or count with donor and message")
+
+    # Reserve the whole request against the donation's allowance up front
+    donation = await get_donation(request.donation_id)
+    if not donation:
+        raise HTTPException(status_code=404, detail="Donation not found")
+    if not await reserve_trees(donation, len(trees)):
+        allowance = await tree_allowance(donation)
+        raise HTTPException(
+            status_code=400,
+            detail=f"This donation can plant {allowance} more tree(s) (one per ${TREE_THRESHOLD})"
+        )
+
+    planted = []
+    try:
+        planted = await create_trees_bulk(trees)
+    finally:
+        # Trees left over when the time budget ran out can be planted by a repeat request
+        await release_trees(donation, len(trees) - len(planted))
+    return {
+        "donation_id": request.donation_id,
+        "planted": len(planted),
+        "remaining": len(trees) - len(planted),
+        "first_seq": planted[0]["seq"] if planted else None,
+        "last_seq": planted[-1]["seq"] if planted else None,
+    }
 
 # --------------------------
 # Stripe payment endpoints
 # --------------------------
 
+@app.post("/api/stripe/webhook")
+async def stripe_webhook(request: Request):
+    if not STRIPE_WEBHOOK_SECRET:
+        raise HTTPException(status_code=503, detail="Webhooks are not configured")
+    payload = await request.body()
+    try:
+        event = stripe.Webhook.construct_event(
+            payload, request.headers.get("stripe-signature", ""), STRIPE_WEBHOOK_SECRET
+        )
+    except (ValueError, stripe.error.SignatureVerificationError):
+        raise HTTPException(status_code=400, detail="Invalid webhook signature")
+    # Acknowledge now; the worker pool applies the event
+    if not webhook_pipeline.submit(event):
+        return MongoJSONResponse({"received": False}, status_code=503, headers={"Retry-After": "5"})
+    return {"received": True}
+
 @app.post("/api/create-payment-intent")
 async def create_payment_intent(data: Dict[str, Any] = Body(...)):
     try:
@@ -236,7 +1212,7 @@ async def create_payment_intent(data: Dict[str, Any] = Body(...)):
         
         # Create a PaymentIntent with the order amount and currency
         try:
-            intent = stripe.PaymentIntent.create(
+            intent = await stripe_gateway.create_payment_intent(
                 amount=amount,
                 currency="usd",
                 metadata=metadata,
@@ -280,41 +1256,21 @@ async def create_subscription(data: Dict[str, Any] = Body(...)):
         email = data.get("email", "")
         
         # Set price based on plan
-        price_amount = 0
-        if plan == "seedling":
-            price_amount = 500  # $5.00
-            amount = 5
-        elif plan == "guardian":
-            price_amount = 1500  # $15.00
-            amount = 15
-        elif plan == "ranger":
-            price_amount = 3000  # $30.00
-            amount = 30
-        else:
+        if plan not in SUBSCRIPTION_PLANS:
             raise HTTPException(status_code=400, detail="Invalid plan")
+        amount = SUBSCRIPTION_PLANS[plan]
         
         # In test mode, use placeholder card information
         test_mode = STRIPE_MODE == "test"
         
         try:    
             # Create a checkout session
-            checkout_session = stripe.checkout.Session.create(
+            checkout_session = await stripe_gateway.create_checkout_session(
                 payment_method_types=["card", "apple_pay", "google_pay"],
-                line_items=[{
-                    "price_data": {
-                        "currency": "usd",
-                        "product_data": {
-                            "name": f"Magic Forest {plan.capitalize()} Plan",
-                            "description": f"Monthly donation to Magic Forest - {plan.capitalize()} tier",
-                        },
-                        "unit_amount": price_amount,
-                        "recurring": {
-                            "interval": "month"
-                        }
-                    },
-                    "quantity": 1,
-                }],
+                line_items=[plan_catalog()[plan]],
                 mode="subscription",
+                # Carried onto renewal invoices, which are recorded from webhooks
+                subscription_data={"metadata": {"plan": plan, "application": STRIPE_APPLICATION}},
                 success_url=f"{FRONTEND_URL}/confirmation?session_id={{CHECKOUT_SESSION_ID}}",
                 cancel_url=f"{FRONTEND_URL}/donate",
                 customer_email=email if email else None,
@@ -391,7 +1347,7 @@ async def create_checkout_session(data: Dict[str, Any] = Body(...)):
         test_mode = STRIPE_MODE == "test"
         
         try:
-            checkout_session = stripe.checkout.Session.create(
+            checkout_session = await stripe_gateway.create_checkout_session(
                 payment_method_types=["card", "apple_pay", "google_pay"],
                 line_items=[{
                     "price_data": {
@@ -472,29 +1428,17 @@ async def create_checkout_session(data: Dict[str, Any] = Body(...)):
 @app.get("/api/checkout-session/{session_id}")
 async def get_checkout_session(session_id: str):
     try:
-        session = stripe.checkout.Session.retrieve(session_id)
-        
-        # Create a donation record based on the successful checkout
-        donation_data = {
-            "type": session.metadata.get("donation_type", "one-time"),
-            "amount": float(session.metadata.get("amount", "0")),
-            "plan": session.metadata.get("plan"),
-            "email": session.customer_details.email if hasattr(session, "customer_details") else None,
-            "payment_status": session.payment_status,
-            "session_id": session_id
-        }
-        
-        # Create donation in our database
-        donation = await create_donation(DonationCreate(**donation_data))
-        
-        return {
-            "status": session.status,
-            "payment_status": session.payment_status,
-            "donation_id": donation["id"],
-            "customer_email": donation_data["email"],
-            "amount": donation_data["amount"],
-            "donation_type": donation_data["type"],
-            "plan": donation_data["plan"]
-        }
+        # Parallel refreshes of the confirmation page share one lookup
+        donation = await checkout_lookups.do(session_id, lambda: load_checkout_session(session_id))
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+
+    return {
+        "status": checkout_status(donation),
+        "payment_status": donation["payment_status"],
+        "donation_id": donation["id"],
+        "customer_email": donation.get("email"),
+        "amount": donation["amount"],
+        "donation_type": donation["type"],
+        "plan": donation.get("plan")
+    }
@@ -0,0 +1,70 @@
+"""Coalesce concurrent calls for the same key into one.
+
+While a call for a key is running, later callers for that key await its
+result instead of starting their own. With ``ttl`` > 0 a successful result
+is also reused for that many seconds after the call finishes; callers that
+must never see an older result should put a version in the key.
+
+``requests`` counts calls to :meth:`SingleFlight.do` and ``executions`` the
+underlying calls actually made; ``coalesce_ratio`` is the share of requests
+that were served without one.
+"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class SingleFlight:
+    def __init__(self, name: str = "", ttl: float = 0.0, enabled: bool = True,
+                 clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.ttl = ttl
+        self.enabled = enabled
+        self._clock = clock
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self._results: Dict[Hashable, Tuple[float, Any]] = {}
+        self.requests = 0
+        self.executions = 0
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    def _finished(self, key: Hashable, call: asyncio.Future):
+        self._calls.pop(key, None)
+        if self.ttl > 0 and not call.cancelled() and call.exception() is None:
+            now = self._clock()
+            for stale in [k for k, (expires, _) in self._results.items() if expires <= now]:
+                del self._results[stale]
+            self._results[key] = (now + self.ttl, call.result())
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Run ``fn()`` for ``key``, or share the result of a call for it."""
+        self.requests += 1
+        if not self.enabled:
+            self.executions += 1
+            return await fn()
+        if self.ttl > 0:
+            result = self._results.get(key)
+            if result is not None and result[0] > self._clock():
+                return result[1]
+        call = self._calls.get(key)
+        if call is None:
+            self.executions += 1
+            call = asyncio.ensure_future(fn())
+            self._calls[key] = call
+            call.add_done_callback(lambda done: self._finished(key, done))
+        # Shielded so one caller giving up does not cancel the call for the others
+        return await asyncio.shield(call)
+
+    def clear(self):
+        """Forget reusable results; calls in flight are unaffected."""
+        self._results.clear()
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "ttl_ms": self.ttl * 1000,
+            "requests": self.requests,
+            "executions": self.executions,
+            "coalesce_ratio": 1 - self.executions / self.requests if self.requests else 0.0,
+        }
@@ -0,0 +1,42 @@
+"""Incremental JSON / NDJSON encoding of Motor cursors.
+
+Documents are pulled from the cursor one server batch at a time and encoded
+into fixed-size chunks, so the memory a listing needs is bounded by the batch
+size and chunk size, not by the size of the collection.
+"""
+from typing import AsyncIterator
+
+from serialization import dumps
+
+STREAM_BATCH_SIZE = 500
+STREAM_CHUNK_BYTES = 64 * 1024
+
+MEDIA_TYPES = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+}
+
+
+async def encode_cursor_chunks(
+    cursor, fmt: str = "json", chunk_bytes: int = STREAM_CHUNK_BYTES
+) -> AsyncIterator[bytes]:
+    """Yield ``cursor`` as a JSON array (``json``) or one document per line (``ndjson``)."""
+    ndjson = fmt == "ndjson"
+    buffer = bytearray() if ndjson else bytearray(b"[")
+    first = True
+    async for doc in cursor:
+        if ndjson:
+            buffer += dumps(doc)
+            buffer += b"\n"
+        else:
+            if not first:
+                buffer += b","
+            buffer += dumps(doc)
+        first = False
+        if len(buffer) >= chunk_bytes:
+            yield bytes(buffer)
+            buffer.clear()
+    if not ndjson:
+        buffer += b"]"
+    if buffer:
+        yield bytes(buffer)
@@ -0,0 +1,88 @@
+"""Non-blocking access to the Stripe API from async route handlers.
+
+The default path uses stripe's native async methods over a pooled
+``httpx.AsyncClient``, so a slow Stripe round trip only suspends the request
+waiting for it. If httpx is not installed, calls fall back to the synchronous
+client running on a bounded thread pool, which still keeps the event loop
+free.
+
+Every call is timed and failures are counted by operation (see metrics.py).
+"""
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Optional
+
+import stripe
+
+from metrics import observe_stripe_call
+
+logger = logging.getLogger(__name__)
+
+STRIPE_TIMEOUT_SECONDS = 30
+STRIPE_FALLBACK_THREADS = 8
+
+
+class StripeGateway:
+    def __init__(
+        self,
+        api_key: str,
+        api_base: Optional[str] = None,
+        timeout: float = STRIPE_TIMEOUT_SECONDS,
+        max_threads: int = STRIPE_FALLBACK_THREADS,
+        max_network_retries: int = 1,
+    ):
+        base_addresses = {"api": api_base} if api_base else {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        try:
+            self._http_client = stripe.HTTPXClient(timeout=timeout)
+            self.mode = "async"
+        except ImportError:
+            logger.warning("httpx is not installed; running Stripe calls on a thread pool")
+            self._http_client = stripe.RequestsClient(timeout=timeout)
+            self._executor = ThreadPoolExecutor(max_workers=max_threads, thread_name_prefix="stripe")
+            self.mode = "threads"
+        self._client = stripe.StripeClient(
+            api_key,
+            base_addresses=base_addresses,
+            http_client=self._http_client,
+            max_network_retries=max_network_retries,
+        )
+
+    async def _call(self, operation: str, *args, **kwargs):
+        # operation names a client method, e.g. "checkout.sessions.create"
+        path, method = operation.rsplit(".", 1)
+        service = self._client
+        for name in path.split("."):
+            service = getattr(service, name)
+        started = time.perf_counter()
+        try:
+            if self._executor is None:
+                result = await getattr(service, f"{method}_async")(*args, **kwargs)
+            else:
+                loop = asyncio.get_running_loop()
+                result = await loop.run_in_executor(
+                    self._executor, lambda: getattr(service, method)(*args, **kwargs)
+                )
+        except Exception as e:
+            observe_stripe_call(operation, time.perf_counter() - started, e)
+            raise
+        observe_stripe_call(operation, time.perf_counter() - started)
+        return result
+
+    async def create_payment_intent(self, **params: Any):
+        return await self._call("payment_intents.create", params=params)
+
+    async def create_checkout_session(self, **params: Any):
+        return await self._call("checkout.sessions.create", params=params)
+
+    async def retrieve_checkout_session(self, session_id: str, **params: Any):
+        return await self._call("checkout.sessions.retrieve", session_id, params=params or None)
+
+    async def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._http_client.close()
+        else:
+            await self._http_client.close_async()
@@ -0,0 +1,163 @@
+"""Materialized donation totals.
+
+Instead of aggregating the whole ``donations`` collection on every read, each
+donation write ``$inc``s one of ``TOTALS_SHARDS`` counter documents in the
+``donation_totals`` collection. Reads sum the (few) shard documents. Spreading
+writes over several documents keeps a fundraising spike from serialising on a
+single hot document.
+"""
+import os
+import random
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+TOTALS_SHARDS = int(os.environ.get("TOTALS_SHARDS", "16"))
+TOTALS_COLLECTION = "donation_totals"
+META_ID = "meta"
+
+# Donation fields that get a per-value breakdown
+BREAKDOWN_FIELDS = ("type", "plan", "payment_method")
+
+
+def _key(value: Any) -> str:
+    # Mongo field names may not contain "." or start with "$"
+    if value is None or value == "":
+        return "none"
+    return str(value).replace(".", "_").replace("$", "_")
+
+
+def _empty_totals() -> Dict[str, Any]:
+    totals: Dict[str, Any] = {"total": 0, "count": 0}
+    for field in BREAKDOWN_FIELDS:
+        totals[f"by_{field}"] = {}
+    return totals
+
+
+def _inc_for(donation: Dict[str, Any], sign: int = 1) -> Dict[str, Any]:
+    amount = donation.get("amount") or 0
+    inc: Dict[str, Any] = {"total": sign * amount, "count": sign}
+    for field in BREAKDOWN_FIELDS:
+        key = _key(donation.get(field))
+        inc[f"by_{field}.{key}.amount"] = sign * amount
+        inc[f"by_{field}.{key}.count"] = sign
+    return inc
+
+
+def _shard_id(n: int) -> str:
+    return f"shard-{n}"
+
+
+async def record_donation(db, donation: Dict[str, Any], sign: int = 1):
+    """Apply one donation to a randomly chosen counter shard."""
+    shard = _shard_id(random.randrange(TOTALS_SHARDS))
+    await db[TOTALS_COLLECTION].update_one(
+        {"_id": shard}, {"$inc": _inc_for(donation, sign)}, upsert=True
+    )
+
+
+async def record_donations(db, donations: List[Dict[str, Any]]):
+    """Apply a batch of donations to one counter shard with a single ``$inc``."""
+    inc: Dict[str, Any] = {}
+    for donation in donations:
+        for field, value in _inc_for(donation).items():
+            inc[field] = inc.get(field, 0) + value
+    if not inc:
+        return
+    shard = _shard_id(random.randrange(TOTALS_SHARDS))
+    await db[TOTALS_COLLECTION].update_one({"_id": shard}, {"$inc": inc}, upsert=True)
+
+
+def _merge(into: Dict[str, Any], doc: Dict[str, Any]):
+    into["total"] += doc.get("total", 0)
+    into["count"] += doc.get("count", 0)
+    for field in BREAKDOWN_FIELDS:
+        name = f"by_{field}"
+        for key, bucket in (doc.get(name) or {}).items():
+            acc = into[name].setdefault(key, {"amount": 0, "count": 0})
+            acc["amount"] += bucket.get("amount", 0)
+            acc["count"] += bucket.get("count", 0)
+
+
+async def read_totals(db) -> Dict[str, Any]:
+    """Sum every counter shard into one totals dict."""
+    totals = _empty_totals()
+    async for doc in db[TOTALS_COLLECTION].find({"_id": {"$regex": "^shard-"}}):
+        _merge(totals, doc)
+    return totals
+
+
+async def compute_totals(db) -> Dict[str, Any]:
+    """Recompute totals from scratch with a single aggregation over donations."""
+    pipeline = [
+        # Checkout donations are counted once paid (see claim_paid_donation); legacy ones have no flag
+        {"$match": {"counted": {"$ne": False}}},
+        {"$group": {
+            "_id": {field: f"${field}" for field in BREAKDOWN_FIELDS},
+            "total": {"$sum": "$amount"},
+            "count": {"$sum": 1},
+        }}
+    ]
+    totals = _empty_totals()
+    async for group in db.donations.aggregate(pipeline):
+        amount, count = group["total"], group["count"]
+        totals["total"] += amount
+        totals["count"] += count
+        for field in BREAKDOWN_FIELDS:
+            acc = totals[f"by_{field}"].setdefault(
+                _key(group["_id"].get(field)), {"amount": 0, "count": 0}
+            )
+            acc["amount"] += amount
+            acc["count"] += count
+    return totals
+
+
+async def rebuild_totals(db) -> Dict[str, Any]:
+    """Replace the counter shards with freshly computed totals.
+
+    Donations written between the aggregation and the shard reset are not
+    counted; run ``verify`` afterwards if writes were not paused.
+    """
+    totals = await compute_totals(db)
+    collection = db[TOTALS_COLLECTION]
+    await collection.delete_many({"_id": {"$ne": META_ID}})
+    await collection.insert_one({"_id": _shard_id(0), **totals})
+    await collection.update_one(
+        {"_id": META_ID},
+        {"$set": {"rebuilt_at": datetime.now().isoformat(), "shards": TOTALS_SHARDS}},
+        upsert=True,
+    )
+    return totals
+
+
+async def ensure_totals(db) -> bool:
+    """Build the totals once for databases that predate materialized totals."""
+    if await db[TOTALS_COLLECTION].find_one({"_id": META_ID}) is None:
+        await rebuild_totals(db)
+        return True
+    return False
+
+
+def _close(a: float, b: float, tolerance: float) -> bool:
+    return abs(a - b) <= tolerance
+
+
+async def verify_totals(db, tolerance: float = 0.01) -> Optional[Dict[str, Any]]:
+    """Compare materialized totals with a fresh aggregation.
+
+    Returns ``None`` when they agree, otherwise a dict describing the drift.
+    """
+    expected = await compute_totals(db)
+    actual = await read_totals(db)
+    drift: Dict[str, Any] = {}
+    if not _close(expected["total"], actual["total"], tolerance):
+        drift["total"] = {"expected": expected["total"], "actual": actual["total"]}
+    if expected["count"] != actual["count"]:
+        drift["count"] = {"expected": expected["count"], "actual": actual["count"]}
+    for field in BREAKDOWN_FIELDS:
+        name = f"by_{field}"
+        for key in set(expected[name]) | set(actual[name]):
+            want = expected[name].get(key, {"amount": 0, "count": 0})
+            got = actual[name].get(key, {"amount": 0, "count": 0})
+            if want["count"] != got["count"] or not _close(want["amount"], got["amount"], tolerance):
+                drift.setdefault(name, {})[key] = {"expected": want, "actual": got}
+    return drift or None
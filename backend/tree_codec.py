@@ -0,0 +1,161 @@
+"""Compact columnar binary encoding of the forest for the map.
+
+The map only needs position, size and type to draw a tree, so this feed
+ships exactly that as packed little-endian typed arrays. Donor and message
+are fetched lazily per tree by ``seq``. Layout::
+
+    offset  size  field
+    0       4     magic b"MFT1"
+    4       4     uint32  tree count N
+    8       8     float64 base timestamp (epoch seconds of the first tree)
+    16      4     uint32  byte length L of the type table
+    20      4     reserved (0)
+    24      L     type table: UTF-8 JSON array of type names, padded to 4 bytes
+    ...     4N    uint32  seq
+    ...     4N    float32 x
+    ...     4N    float32 y
+    ...     4N    float32 size
+    ...     4N    int32   timestamp delta to the previous tree, in seconds
+    ...     N     uint8   index into the type table
+
+Every column starts on a 4-byte boundary so clients can wrap it in a typed
+array without copying. The arrays live in memory, are appended to on every
+planted tree, and are re-encoded only when they changed since the last read.
+"""
+import asyncio
+import json
+import struct
+import sys
+from array import array
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+
+MAGIC = b"MFT1"
+HEADER = struct.Struct("<4sIdII")
+MAX_TYPES = 255
+OTHER_TYPE = "other"
+
+
+def _epoch_seconds(timestamp: Any) -> Optional[float]:
+    if isinstance(timestamp, datetime):
+        return timestamp.timestamp()
+    try:
+        return datetime.fromisoformat(timestamp).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+class ColumnarForest:
+    def __init__(self):
+        self._lock = asyncio.Lock()
+        self.reset()
+
+    def reset(self):
+        self.seqs = array("I")
+        self.xs = array("f")
+        self.ys = array("f")
+        self.sizes = array("f")
+        self.deltas = array("i")
+        self.type_indexes = array("B")
+        self.types: List[str] = []
+        self._type_index: Dict[str, int] = {}
+        # Seqs already in the columns, for has(); trees can arrive out of seq order
+        self._seq_set: Set[int] = set()
+        self.base_ts: Optional[float] = None
+        self._last_ts: Optional[float] = None
+        self._encoded: Optional[bytes] = None
+        self.loaded = False
+
+    def __len__(self) -> int:
+        return len(self.seqs)
+
+    def _type_of(self, tree_type: Any) -> int:
+        name = str(tree_type or OTHER_TYPE)
+        index = self._type_index.get(name)
+        if index is None:
+            if len(self.types) >= MAX_TYPES:
+                name = OTHER_TYPE
+                index = self._type_index.get(name)
+            if index is None:
+                index = len(self.types)
+                self.types.append(name)
+                self._type_index[name] = index
+        return index
+
+    def has(self, seq: int) -> bool:
+        """Whether a tree with this ``seq`` is already in the columns."""
+        return bool(seq) and seq in self._seq_set
+
+    def append(self, tree: Dict[str, Any]):
+        seq = tree.get("seq") or 0
+        self._seq_set.add(seq)
+        ts = _epoch_seconds(tree.get("timestamp"))
+        if ts is None:
+            ts = self._last_ts if self._last_ts is not None else 0.0
+        if self.base_ts is None:
+            self.base_ts = self._last_ts = ts
+        delta = int(round(ts - self._last_ts))
+        self._last_ts += delta
+        self.seqs.append(seq)
+        self.xs.append(tree["x"])
+        self.ys.append(tree["y"])
+        self.sizes.append(tree.get("size") or 1.0)
+        self.deltas.append(delta)
+        self.type_indexes.append(self._type_of(tree.get("type")))
+        self._encoded = None
+
+    def encode(self) -> bytes:
+        if self._encoded is None:
+            types = json.dumps(self.types, separators=(",", ":")).encode()
+            padded = types + b" " * (-len(types) % 4)
+            header = HEADER.pack(MAGIC, len(self), self.base_ts or 0.0, len(types), 0)
+            columns = [self.seqs, self.xs, self.ys, self.sizes, self.deltas, self.type_indexes]
+            if sys.byteorder != "little":
+                columns = [array(column.typecode, column) for column in columns]
+                for column in columns:
+                    column.byteswap()
+            self._encoded = b"".join([header, padded] + [column.tobytes() for column in columns])
+        return self._encoded
+
+    async def ensure_loaded(self, db):
+        """Build the columns from the ``trees`` collection once per process."""
+        if self.loaded:
+            return
+        async with self._lock:
+            if self.loaded:
+                return
+            self.reset()
+            async for tree in db.trees.find(
+                {"x": {"$type": "number"}, "y": {"$type": "number"}},
+                {"_id": 0, "seq": 1, "x": 1, "y": 1, "size": 1, "type": 1, "timestamp": 1},
+            ).sort("seq", 1):
+                self.append(tree)
+            self.loaded = True
+
+
+def decode(buffer: bytes) -> List[Dict[str, Any]]:
+    """Inverse of :meth:`ColumnarForest.encode`, for tests and tooling."""
+    magic, count, base_ts, types_len, _ = HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC:
+        raise ValueError("Not a columnar forest buffer")
+    offset = HEADER.size
+    types = json.loads(buffer[offset:offset + types_len])
+    offset += types_len + (-types_len % 4)
+    columns = []
+    for code in ("I", "f", "f", "f", "i", "B"):
+        column = array(code)
+        width = column.itemsize * count
+        column.frombytes(buffer[offset:offset + width])
+        if sys.byteorder != "little":
+            column.byteswap()
+        columns.append(column)
+        offset += width
+    seqs, xs, ys, sizes, deltas, type_indexes = columns
+    trees, ts = [], base_ts
+    for i in range(count):
+        ts += deltas[i]
+        trees.append({
+            "seq": seqs[i], "x": xs[i], "y": ys[i], "size": sizes[i],
+            "type": types[type_indexes[i]], "timestamp": ts,
+        })
+    return trees
@@ -0,0 +1,75 @@
+"""In-process fan-out of newly planted trees to live subscribers.
+
+Every write path publishes once to the hub, and the hub copies the event into
+one bounded queue per subscriber. A subscriber that cannot keep up is dropped
+rather than allowed to grow its queue without limit; browsers reconnect and
+receive a fresh snapshot.
+"""
+import asyncio
+from collections import OrderedDict
+from typing import Any, Dict, Set
+
+SUBSCRIBER_QUEUE_SIZE = 256
+# Ids of recently published trees, so a tree seen twice (local write and change stream) goes out once
+RECENT_TREES = 4096
+
+
+class Subscription:
+    def __init__(self, hub: "TreeHub", maxsize: int):
+        self._hub = hub
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = False
+
+    async def get(self, timeout: float):
+        """Wait for the next tree, returning ``None`` on timeout."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self._hub.unsubscribe(self)
+
+
+class TreeHub:
+    def __init__(self, queue_size: int = SUBSCRIBER_QUEUE_SIZE):
+        self._queue_size = queue_size
+        self._subscribers: Set[Subscription] = set()
+        self._recent: "OrderedDict[Any, None]" = OrderedDict()
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self) -> Subscription:
+        subscription = Subscription(self, self._queue_size)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscribers.discard(subscription)
+
+    def close_all(self):
+        """Drop every subscriber and wake it, so its stream ends now."""
+        for subscription in list(self._subscribers):
+            subscription.dropped = True
+            self.unsubscribe(subscription)
+            try:
+                subscription.queue.put_nowait(None)
+            except asyncio.QueueFull:
+                pass
+
+    def publish(self, tree: Dict[str, Any]):
+        tree_id = tree.get("id")
+        if tree_id is not None:
+            if tree_id in self._recent:
+                return
+            self._recent[tree_id] = None
+            if len(self._recent) > RECENT_TREES:
+                self._recent.popitem(last=False)
+        for subscription in list(self._subscribers):
+            try:
+                subscription.queue.put_nowait(tree)
+            except asyncio.QueueFull:
+                subscription.dropped = True
+                self.unsubscribe(subscription)
@@ -0,0 +1,83 @@
+"""In-process LRU cache with per-entry TTL and negative caching.
+
+Entries expire ``ttl`` seconds after they are stored; misses can be cached
+too, for ``negative_ttl`` seconds, so repeated lookups of an unknown key do
+not all reach Mongo. The cache holds at most ``maxsize`` entries and evicts
+the least recently used one.
+
+Each process has its own cache. ``invalidate`` calls every function in
+``on_invalidate`` with ``(cache name, key)``, which lets a multi-worker
+deployment forward invalidations to its peers (e.g. over a pub/sub channel).
+A peer then applies them with ``invalidate(key, propagate=False)``.
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, List, Tuple
+
+InvalidationHook = Callable[[str, Hashable], None]
+
+_MISSING = object()
+
+
+class TTLCache:
+    def __init__(self, name: str, maxsize: int = 10_000, ttl: float = 300.0,
+                 negative_ttl: float = 5.0, clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._clock = clock
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self.on_invalidate: List[InvalidationHook] = []
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(self, key: Hashable) -> Tuple[bool, Any]:
+        """``(True, value)`` on a hit, where ``value`` is ``None`` for a cached miss."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires, value = entry
+            if expires > self._clock():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, None if value is _MISSING else value
+            del self._entries[key]
+        self.misses += 1
+        return False, None
+
+    def _store(self, key: Hashable, value: Any, ttl: float):
+        self._entries[key] = (self._clock() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def set(self, key: Hashable, value: Any):
+        if value is None:
+            self.set_missing(key)
+        else:
+            self._store(key, value, self.ttl)
+
+    def set_missing(self, key: Hashable):
+        if self.negative_ttl > 0:
+            self._store(key, _MISSING, self.negative_ttl)
+
+    def invalidate(self, key: Hashable, propagate: bool = True):
+        self._entries.pop(key, None)
+        if propagate:
+            for hook in self.on_invalidate:
+                hook(self.name, key)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,74 @@
+"""Write versions for cacheable resources and the ETags derived from them.
+
+Each write bumps the version of the resource it touches. Read endpoints build
+their ETag from the current version alone, so a matching ``If-None-Match`` is
+answered with 304 without querying Mongo.
+
+Versions are counters in the ``resource_versions`` collection, shared by every
+worker. A writer increments the counter after its write and adopts the new
+value at once. Other workers pick it up from the change feed (see
+change_feed.py). Each worker therefore issues the same ETag for the same data,
+and a client's ETag is honoured whichever worker answers it. Each counter
+carries an epoch chosen when it is created, so ETags from before the
+collection was dropped never match again.
+"""
+import hashlib
+import uuid
+from typing import Any, Dict, Optional, Tuple
+
+from pymongo import ReturnDocument
+
+VERSIONS_COLLECTION = "resource_versions"
+
+
+class ResourceVersions:
+    def __init__(self):
+        # Used until a counter is loaded or published, e.g. when Mongo is not reachable
+        self.epoch = uuid.uuid4().hex[:8]
+        self._versions: Dict[str, Tuple[str, int]] = {}
+
+    def current(self, resource: str) -> int:
+        return self._versions.get(resource, (self.epoch, 0))[1]
+
+    def observe(self, doc: Dict[str, Any]):
+        """Adopt a counter document, unless this worker already has a later version."""
+        epoch, version = self._versions.get(doc["_id"], (None, 0))
+        if epoch != doc["epoch"] or doc["version"] > version:
+            self._versions[doc["_id"]] = (doc["epoch"], doc["version"])
+
+    async def load(self, db):
+        async for doc in db[VERSIONS_COLLECTION].find():
+            self.observe(doc)
+
+    async def publish(self, db, resource: str) -> int:
+        """Bump the shared version of ``resource`` after a write; returns the new version."""
+        doc = await db[VERSIONS_COLLECTION].find_one_and_update(
+            {"_id": resource},
+            {"$inc": {"version": 1}, "$setOnInsert": {"epoch": uuid.uuid4().hex[:8]}},
+            upsert=True, return_document=ReturnDocument.AFTER,
+        )
+        self.observe(doc)
+        return self.current(resource)
+
+    def etag(self, resource: str, variant: Optional[str] = None) -> str:
+        """Strong ETag for ``resource``; ``variant`` distinguishes representations."""
+        epoch, version = self._versions.get(resource, (self.epoch, 0))
+        tag = f"{resource}-{epoch}-{version}"
+        if variant:
+            tag += "-" + hashlib.sha1(variant.encode()).hexdigest()[:12]
+        return f'"{tag}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an ``If-None-Match`` header against ``etag`` (RFC 9110)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
@@ -0,0 +1,299 @@
+"""Stripe webhook ingestion: acknowledge fast, apply in batches off the request path.
+
+The endpoint only verifies the signature and calls :meth:`WebhookPipeline.submit`,
+which puts the event on a bounded queue. A small pool of worker tasks pulls
+events off the queue in batches and hands each batch to ``apply_batch``.
+When the queue is full, ``submit`` refuses the event and the endpoint answers
+503, so Stripe retries it later rather than the process buffering without
+limit.
+
+Each worker owns a queue, and ``partition_key`` picks it, so events for one
+checkout session are applied in the order they arrived. A batch that fails
+was already acknowledged, so Stripe will not resend it. The worker retries
+it with exponential backoff, up to ``max_attempts`` times, before taking
+anything else from its queue. If it still fails, its events are applied one
+at a time, and each event that fails on its own is handed to ``dead_letter``
+(``record_failed_event`` keeps it in ``stripe_events`` with status
+``failed``, where ``manage.py webhooks retry`` picks it up). One bad event
+therefore holds up its queue for a bounded time rather than for good. If
+the dead letter cannot be written either, Mongo itself is down and the
+event is retried until it can. Only at shutdown, once the close timeout
+runs out, is a failing event dropped and logged.
+
+Events are deduplicated twice. Ids seen recently are dropped in memory
+before they reach the queue. ``claim_events`` then inserts each id into the
+``stripe_events`` collection, so an event redelivered after a restart, or to
+another worker, is applied at most once.
+"""
+import asyncio
+import logging
+import zlib
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, List, Optional
+
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+EVENTS_COLLECTION = "stripe_events"
+# Stripe retries for up to three days; keep claims well past that
+EVENT_RETENTION_SECONDS = 30 * 24 * 3600
+
+EVENT_INDEXES = [
+    IndexModel([("received_at", ASCENDING)], name="received_at_ttl", expireAfterSeconds=EVENT_RETENTION_SECONDS),
+]
+
+ApplyBatch = Callable[[List[Any]], Awaitable[None]]
+DeadLetter = Callable[[Any, BaseException], Awaitable[None]]
+PartitionKey = Callable[[Any], Any]
+
+
+async def claim_events(db, events: List[Any]) -> List[Any]:
+    """Record event ids; returns only the events that had not been claimed before."""
+    if not events:
+        return []
+    now = datetime.now(timezone.utc)
+    docs = [{"_id": event["id"], "type": event["type"], "received_at": now} for event in events]
+    try:
+        await db[EVENTS_COLLECTION].insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        duplicates = {error["index"] for error in e.details.get("writeErrors", []) if error.get("code") == 11000}
+        if len(duplicates) != len(e.details.get("writeErrors", [])):
+            raise
+        return [event for index, event in enumerate(events) if index not in duplicates]
+    return list(events)
+
+
+async def release_events(db, events: List[Any]):
+    """Forget claims for events that failed to apply, so Stripe's retry is accepted."""
+    if events:
+        await db[EVENTS_COLLECTION].delete_many({"_id": {"$in": [event["id"] for event in events]}})
+
+
+async def record_failed_event(db, event: Any, error: BaseException):
+    """Keep an event that could not be applied, with the error, for ``manage.py webhooks``."""
+    await db[EVENTS_COLLECTION].update_one(
+        {"_id": event["id"]},
+        {"$set": {
+            "type": event["type"], "received_at": datetime.now(timezone.utc),
+            "status": "failed", "error": f"{type(error).__name__}: {error}", "event": event,
+        }},
+        upsert=True,
+    )
+
+
+async def failed_events(db) -> List[Any]:
+    """Events recorded by :func:`record_failed_event`, oldest first."""
+    return await db[EVENTS_COLLECTION].find({"status": "failed"}).sort("received_at", ASCENDING).to_list(length=None)
+
+
+class WebhookPipeline:
+    def __init__(self, apply_batch: ApplyBatch, workers: int = 4, queue_size: int = 10_000,
+                 batch_size: int = 100, batch_wait: float = 0.01, recent_ids: int = 100_000,
+                 partition_key: PartitionKey = lambda event: event["id"],
+                 retry_delay: float = 0.5, max_retry_delay: float = 30.0, max_attempts: int = 5,
+                 dead_letter: Optional[DeadLetter] = None):
+        self._apply_batch = apply_batch
+        self.workers = workers
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.max_attempts = max_attempts
+        self._dead_letter = dead_letter
+        self._partition_key = partition_key
+        self._recent_limit = recent_ids
+        self._recent: "OrderedDict[str, None]" = OrderedDict()
+        self._queues: List[asyncio.Queue] = []
+        self._tasks: List[asyncio.Task] = []
+        self._closing: Optional[asyncio.Event] = None
+        self._deadline: Optional[float] = None
+        self._in_flight = 0
+        self.received = 0
+        self.duplicates = 0
+        self.rejected = 0
+        self.applied = 0
+        self.retries = 0
+        self.dead_lettered = 0
+        self.failed = 0
+
+    @property
+    def backlog(self) -> int:
+        """Events queued, being applied or waiting to be retried."""
+        return sum(queue.qsize() for queue in self._queues) + self._in_flight
+
+    def start(self):
+        if self._tasks:
+            return
+        self._closing = asyncio.Event()
+        self._deadline = None
+        # Split the bound between the workers; each owns one queue
+        self._queues = [asyncio.Queue(maxsize=max(self.queue_size // self.workers, 1)) for _ in range(self.workers)]
+        self._tasks = [asyncio.create_task(self._work(queue)) for queue in self._queues]
+
+    def submit(self, event: Any) -> bool:
+        """Queue ``event``; ``False`` means the queue is full and the sender should retry."""
+        self.received += 1
+        event_id = event["id"]
+        if event_id in self._recent:
+            self.duplicates += 1
+            return True
+        if not self._queues:
+            self.start()
+        # Events with the same key go to the same worker, which applies them in order
+        queue = self._queues[zlib.crc32(str(self._partition_key(event)).encode()) % len(self._queues)]
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return False
+        self._recent[event_id] = None
+        if len(self._recent) > self._recent_limit:
+            self._recent.popitem(last=False)
+        return True
+
+    async def _next_batch(self, queue: asyncio.Queue) -> List[Any]:
+        # Events count as in flight from the moment they leave the queue
+        batch = [await queue.get()]
+        self._in_flight += 1
+        deadline = asyncio.get_running_loop().time() + self.batch_wait
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(queue.get_nowait())
+                self._in_flight += 1
+            except asyncio.QueueEmpty:
+                remaining = deadline - asyncio.get_running_loop().time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), remaining))
+                    self._in_flight += 1
+                except asyncio.TimeoutError:
+                    break
+        return batch
+
+    async def _backoff(self, attempt: int) -> bool:
+        """Wait before another attempt; ``False`` once shutdown leaves no time for one."""
+        if self._deadline is None:
+            delay = min(self.retry_delay * 2 ** (attempt - 1), self.max_retry_delay)
+            try:
+                # close() cuts the wait short so the retry runs while there is time left
+                await asyncio.wait_for(self._closing.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+            return True
+        remaining = self._deadline - asyncio.get_running_loop().time()
+        if remaining <= 0:
+            return False
+        await asyncio.sleep(min(self.retry_delay, remaining))
+        return True
+
+    def _drop(self, events: List[Any]):
+        logger.error("Dropping %d webhook events at shutdown: %s",
+                     len(events), ", ".join(event["id"] for event in events))
+        self.failed += len(events)
+        # Forgotten, so a manual resend from Stripe is accepted
+        for event in events:
+            self._recent.pop(event["id"], None)
+
+    async def _apply(self, batch: List[Any]):
+        # Stripe was already answered 200 and will not resend, so a failed batch is
+        # retried here, before this worker takes later events for the same keys
+        attempt = 0
+        while True:
+            try:
+                await self._apply_batch(batch)
+                self.applied += len(batch)
+                return
+            except Exception as e:
+                attempt += 1
+                error = e
+                logger.exception("Failed to apply %d webhook events (attempt %d)", len(batch), attempt)
+            if attempt >= self.max_attempts:
+                break
+            if not await self._backoff(attempt):
+                self._drop(batch)
+                return
+            self.retries += 1
+        # Find the events at fault; the others are applied, still in order
+        for index, event in enumerate(batch):
+            if len(batch) > 1:
+                try:
+                    await self._apply_batch([event])
+                    self.applied += 1
+                    continue
+                except Exception as e:
+                    error = e
+                    logger.exception("Failed to apply webhook event %s", event["id"])
+            if not await self._give_up(event, error):
+                self._drop(batch[index:])
+                return
+
+    async def _give_up(self, event: Any, error: BaseException) -> bool:
+        """Dead-letter ``event``; ``False`` if that was still impossible at shutdown."""
+        if self._dead_letter is None:
+            logger.error("Giving up on webhook event %s: %s", event["id"], error)
+            self.failed += 1
+            self._recent.pop(event["id"], None)
+            return True
+        attempt = 0
+        while True:
+            try:
+                await self._dead_letter(event, error)
+                self.dead_lettered += 1
+                logger.error("Recorded webhook event %s as failed: %s", event["id"], error)
+                return True
+            except Exception:
+                attempt += 1
+                logger.exception("Failed to record webhook event %s as failed", event["id"])
+            # Mongo is unreachable, so the event may well be fine: keep trying both
+            if not await self._backoff(attempt):
+                return False
+            self.retries += 1
+            try:
+                await self._apply_batch([event])
+                self.applied += 1
+                return True
+            except Exception as e:
+                error = e
+
+    async def _work(self, queue: asyncio.Queue):
+        while True:
+            batch = await self._next_batch(queue)
+            try:
+                await self._apply(batch)
+            finally:
+                self._in_flight -= len(batch)
+                for _ in batch:
+                    queue.task_done()
+
+    async def close(self, timeout: float = 10.0):
+        """Apply what is queued (up to ``timeout`` seconds), then stop the workers."""
+        if not self._tasks:
+            return
+        self._deadline = asyncio.get_running_loop().time() + timeout
+        self._closing.set()
+        try:
+            await asyncio.wait_for(asyncio.gather(*(queue.join() for queue in self._queues)), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Stopping with %d webhook events unapplied", self.backlog)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queues = []
+
+    def stats(self):
+        return {
+            "received": self.received,
+            "duplicates": self.duplicates,
+            "rejected": self.rejected,
+            "applied": self.applied,
+            "retries": self.retries,
+            "dead_lettered": self.dead_lettered,
+            "failed": self.failed,
+            "backlog": self.backlog,
+        }
@@ -0,0 +1,96 @@
+"""Group commit for single-document inserts.
+
+Under load every ``insert_one`` is its own round trip and its own
+write-concern wait. A ``GroupCommitBuffer`` collects the documents inserted
+within ``max_delay`` seconds, or until ``max_batch`` are waiting, and writes
+them with one unordered ``insert_many``. Each caller still awaits its own
+document and is released only once the batch holding it is acknowledged;
+a document that fails (e.g. a duplicate key) raises in its own caller only.
+
+At most ``max_pending`` documents may be queued or in flight. When Mongo
+falls behind, further ``insert`` calls wait for room instead of piling up
+memory.
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from pymongo.errors import BulkWriteError, DuplicateKeyError, WriteError
+
+logger = logging.getLogger(__name__)
+
+InsertMany = Callable[[List[Dict[str, Any]]], Awaitable[Any]]
+
+
+class GroupCommitBuffer:
+    def __init__(self, insert_many: InsertMany, max_batch: int = 100,
+                 max_delay: float = 0.005, max_pending: int = 5000):
+        self._insert_many = insert_many
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self._pending: List[Tuple[Dict[str, Any], asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flushes: Set[asyncio.Task] = set()
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.batches = 0
+        self.documents = 0
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    async def insert(self, doc: Dict[str, Any]):
+        """Queue ``doc`` and wait until the batch holding it is written."""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_pending)
+        await self._slots.acquire()
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((doc, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_delay, self._flush)
+        await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        task = asyncio.get_running_loop().create_task(self._write(batch))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _write(self, batch: List[Tuple[Dict[str, Any], asyncio.Future]]):
+        failures: Dict[int, BaseException] = {}
+        try:
+            await self._insert_many([doc for doc, _ in batch])
+        except BulkWriteError as e:
+            # Unordered: only the listed documents were not written
+            for error in e.details.get("writeErrors", []):
+                exc = DuplicateKeyError if error.get("code") == 11000 else WriteError
+                failures[error["index"]] = exc(error.get("errmsg"), error.get("code"), error)
+        except Exception as e:
+            logger.warning("Group commit of %d documents failed: %s", len(batch), e)
+            failures = {index: e for index in range(len(batch))}
+        finally:
+            for _ in batch:
+                self._slots.release()
+        self.batches += 1
+        self.documents += len(batch)
+        for index, (_, future) in enumerate(batch):
+            if future.done():
+                continue
+            if index in failures:
+                future.set_exception(failures[index])
+            else:
+                future.set_result(None)
+
+    async def close(self):
+        """Write whatever is queued and wait for in-flight batches."""
+        self._flush()
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
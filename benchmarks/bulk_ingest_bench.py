@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+"""Donation ingest throughput: one insert per donation vs the bulk path.
+
+Inserts the same generated donations twice into an empty database:
+  * one ``create_donation`` per row, as ``POST /api/donations`` does, and
+  * ``create_donations_bulk``, as ``POST /api/donations/bulk`` does, which
+    validates the rows and writes chunks with unordered ``insert_many`` and
+    one totals ``$inc`` per chunk.
+Prints rows per second for each and checks that the materialized totals
+match the donations collection afterwards.
+
+Usage:
+    MONGO_URL=mongodb://localhost:27017 python benchmarks/bulk_ingest_bench.py \\
+        --rows 20000 --chunk-size 1000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+
+import server  # noqa: E402
+from indexes import ensure_indexes  # noqa: E402
+from totals import TOTALS_COLLECTION, compute_totals, read_totals  # noqa: E402
+
+
+def _row(i: int):
+    return {
+        "type": "recurring" if i % 3 == 0 else "one-time",
+        "amount": float(5 + i % 50),
+        "plan": "seedling" if i % 3 == 0 else None,
+        "payment_method": "card",
+        "session_id": f"bench-session-{i:08d}",
+    }
+
+
+async def _rows(count: int):
+    for i in range(count):
+        yield i + 1, _row(i)
+
+
+async def _reset(db):
+    await db.donations.drop()
+    await db[TOTALS_COLLECTION].drop()
+    await ensure_indexes(db)
+
+
+async def single(count: int):
+    for i in range(count):
+        await server.create_donation(server.DonationCreate(**_row(i)))
+
+
+async def bulk(count: int, chunk_size: int):
+    inserted, errors = await server.create_donations_bulk(_rows(count), chunk_size=chunk_size)
+    assert inserted == count and not errors, errors
+
+
+async def main(args):
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    db = client[args.db]
+    server.db = db
+
+    results = {}
+    for label, run in (("single", lambda: single(args.rows)), ("bulk", lambda: bulk(args.rows, args.chunk_size))):
+        await _reset(db)
+        started = time.perf_counter()
+        await run()
+        elapsed = time.perf_counter() - started
+        results[label] = args.rows / elapsed
+        stored, computed = await read_totals(db), await compute_totals(db)
+        consistent = stored["count"] == computed["count"] and abs(stored["total"] - computed["total"]) < 1e-6
+        print(f"{label:>8}: {args.rows} rows in {elapsed:.2f}s = {results[label]:,.0f} rows/s, totals consistent: {consistent}")
+
+    print(f"speedup: {results['bulk'] / results['single']:.1f}x")
+    await _reset(db)
+    client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--db", default="magic_forest_bench")
+    asyncio.run(main(parser.parse_args()))
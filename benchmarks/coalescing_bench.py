@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+"""Mongo operations per polling wave, with and without read coalescing.
+
+Simulates map clients polling in lockstep: for each client count, every
+client requests ``GET /api/trees`` and ``GET /api/total-donations`` at the
+same moment, ``--waves`` times, in-process through the ASGI app. A pymongo
+command listener counts the ``find`` commands that reach Mongo. With
+coalescing on, the count stays flat as clients grow; with it off, it grows
+with the number of clients.
+
+Usage:
+    MONGO_URL=mongodb://localhost:27017 python benchmarks/coalescing_bench.py \\
+        --clients 10 100 1000 --waves 5
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import httpx
+from pymongo import monitoring
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+
+import server  # noqa: E402
+
+
+class FindCounter(monitoring.CommandListener):
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        if event.command_name == "find":
+            self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+async def _waves(http, clients: int, waves: int, interval: float):
+    for _ in range(waves):
+        requests = [http.get("/api/trees") for _ in range(clients)]
+        requests += [http.get("/api/total-donations") for _ in range(clients)]
+        responses = await asyncio.gather(*requests)
+        assert all(response.status_code == 200 for response in responses)
+        await asyncio.sleep(interval)
+
+
+async def main(args):
+    counter = FindCounter()
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"),
+                                event_listeners=[counter])
+    server.db = client[args.db]
+    await server.db.trees.drop()
+    await server.db.trees.insert_many([
+        {"id": f"bench-{i}", "donation_id": "bench", "donor": "Donor", "message": "Hi", "type": "oak",
+         "x": float(i), "y": float(i), "size": 1.0, "timestamp": f"2024-01-01T00:00:{i % 60:02d}", "seq": i + 1}
+        for i in range(100)
+    ])
+
+    transport = httpx.ASGITransport(app=server.app)
+    print(f"{'clients':>8} {'coalescing':>10} {'requests':>9} {'mongo finds':>12} {'coalesce ratio':>15} {'seconds':>8}")
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+        for clients in args.clients:
+            for enabled in (False, True):
+                coalescers = (server.trees_reads, server.totals_reads)
+                for coalescer in coalescers:
+                    coalescer.enabled = enabled
+                    coalescer.requests = coalescer.executions = 0
+                counter.count = 0
+                started = time.perf_counter()
+                await _waves(http, clients, args.waves, args.interval)
+                elapsed = time.perf_counter() - started
+                requests = sum(c.requests for c in coalescers)
+                ratio = 1 - sum(c.executions for c in coalescers) / requests
+                print(f"{clients:>8} {'on' if enabled else 'off':>10} {requests:>9} {counter.count:>12} "
+                      f"{ratio:>15.3f} {elapsed:>8.2f}")
+
+    await server.db.trees.drop()
+    client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--waves", type=int, default=5)
+    parser.add_argument("--interval", type=float, default=0.3, help="seconds between polling waves")
+    parser.add_argument("--db", default="magic_forest_bench")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+"""Cold-start time: from launching the backend until /api/ready answers 200.
+
+Starts ``backend/serve.py`` against MONGO_URL ``--runs`` times and, for
+each run, measures the wall time until ``/api/ready`` first succeeds. It
+also reports the worker's own ``cold_start_seconds`` (import to warm) and
+the duration of each warm-up task. Compare with the fixed 30-second sleep
+the entrypoint used before.
+
+Usage:
+    MONGO_URL=mongodb://localhost:27017 python benchmarks/cold_start_bench.py --runs 5 --workers 2
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def cold_start(workers: int, timeout: float):
+    port = _free_port()
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "serve.py", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=BACKEND,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                response = httpx.get(f"http://127.0.0.1:{port}/api/ready", timeout=2)
+                if response.status_code == 200:
+                    return time.perf_counter() - started, response.json()
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.05)
+        raise RuntimeError(f"not ready after {timeout}s")
+    finally:
+        proc.terminate()
+        proc.wait(timeout=60)
+
+
+def main(args):
+    wall = []
+    for run in range(args.runs):
+        elapsed, body = cold_start(args.workers, args.timeout)
+        wall.append(elapsed)
+        warmup = {name: task.get("seconds") for name, task in body["checks"]["warmup"].items() if name != "ok"}
+        print(f"run {run + 1}: ready after {elapsed:.2f}s (worker import->warm {body['cold_start_seconds']:.2f}s) {warmup}")
+    print(f"median {statistics.median(wall):.2f}s, max {max(wall):.2f}s (previously a fixed 30s sleep)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--timeout", type=float, default=120)
+    main(parser.parse_args())
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+"""Cost of metrics collection per request and per Mongo command.
+
+Calls a trivial FastAPI route directly through ASGI, with and without
+``MetricsMiddleware``, and reports the added microseconds per request. It
+also times the pymongo command listener on synthetic events. Those are the
+two paths that run on every request. Everything else is sampled.
+
+With ``--multiproc``, metrics are written to a temporary
+``PROMETHEUS_MULTIPROC_DIR`` as they are under serve.py.
+
+Usage:
+    python benchmarks/metrics_overhead_bench.py --requests 20000 [--multiproc]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+
+def build_app():
+    from fastapi import FastAPI
+
+    app = FastAPI()
+
+    @app.get("/api/items/{item_id}")
+    async def item(item_id: str):
+        return {"id": item_id}
+
+    return app
+
+
+async def _call(app, path: str):
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"",
+        "headers": [(b"host", b"bench")], "client": ("127.0.0.1", 1234), "server": ("bench", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    await app(scope, receive, send)
+
+
+async def per_request(app, requests: int) -> float:
+    for i in range(min(requests, 1000)):
+        await _call(app, f"/api/items/{i}")
+    started = time.perf_counter()
+    for i in range(requests):
+        await _call(app, f"/api/items/{i}")
+    return (time.perf_counter() - started) / requests
+
+
+def per_command(listener, commands: int) -> float:
+    started = time.perf_counter()
+    for i in range(commands):
+        listener.started(SimpleNamespace(
+            command={"find": "trees", "filter": {}}, command_name="find", connection_id=("db", 27017), request_id=i,
+        ))
+        listener.succeeded(SimpleNamespace(
+            command_name="find", connection_id=("db", 27017), request_id=i, duration_micros=800,
+        ))
+    return (time.perf_counter() - started) / commands
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--multiproc", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.multiproc:
+        # Must be set before prometheus_client is imported
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="metrics-bench-")
+    from metrics import MetricsMiddleware, MongoCommandMetrics
+
+    app = build_app()
+    instrumented = MetricsMiddleware(app)
+    bare_times, instrumented_times = [], []
+    for _ in range(args.repeat):
+        bare_times.append(asyncio.run(per_request(app, args.requests)))
+        instrumented_times.append(asyncio.run(per_request(instrumented, args.requests)))
+    bare, with_metrics = min(bare_times), min(instrumented_times)
+    command = per_command(MongoCommandMetrics(), args.requests)
+
+    mode = "multiprocess" if args.multiproc else "single process"
+    print(f"metrics storage: {mode}, {args.requests} requests, best of {args.repeat}")
+    print(f"{'request, no metrics':>24}: {bare * 1e6:8.1f} us")
+    print(f"{'request, with metrics':>24}: {with_metrics * 1e6:8.1f} us")
+    print(f"{'added per request':>24}: {(with_metrics - bare) * 1e6:8.1f} us "
+          f"({(with_metrics - bare) / bare:.1%})")
+    print(f"{'added per Mongo command':>24}: {command * 1e6:8.1f} us")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
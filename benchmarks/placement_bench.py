@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+"""Throughput of the tree placement engine, with an overlap check.
+
+Places N trees (default 100,000) with ``PlacementEngine.place`` and reports
+placements per second, both overall and for the last 10% (to show the cost
+does not grow as the forest fills). Every placed tree's footprint is then
+checked against its neighbours for overlap.
+
+Usage:
+    python benchmarks/placement_bench.py --count 100000
+"""
+import argparse
+import os
+import sys
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from placement import MAX_TREE_SCALE, TREE_FOOTPRINT, PlacementEngine  # noqa: E402
+
+
+def _overlaps(positions) -> int:
+    w, h = TREE_FOOTPRINT[0] * MAX_TREE_SCALE, TREE_FOOTPRINT[1] * MAX_TREE_SCALE
+    buckets = defaultdict(list)
+    for x, y in positions:
+        buckets[(int(x // w), int(y // h))].append((x, y))
+    overlaps = 0
+    for (bx, by), members in buckets.items():
+        for x, y in members:
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    for ox, oy in buckets.get((bx + dx, by + dy), ()):
+                        if (ox, oy) < (x, y) and abs(ox - x) < w and abs(oy - y) < h:
+                            overlaps += 1
+    return overlaps
+
+
+def main(args):
+    engine = PlacementEngine(seed=args.seed)
+    positions = []
+    tail_start = int(args.count * 0.9)
+    started = time.perf_counter()
+    tail_started = started
+    for i in range(args.count):
+        if i == tail_start:
+            tail_started = time.perf_counter()
+        positions.append(engine.place())
+    finished = time.perf_counter()
+
+    total = finished - started
+    tail = finished - tail_started
+    print(f"placed:          {args.count}")
+    print(f"regions opened:  {engine.regions_opened}")
+    print(f"total time:      {total * 1000:.1f} ms")
+    print(f"placements/s:    {args.count / total:,.0f}")
+    print(f"last 10% /s:     {(args.count - tail_start) / tail:,.0f}")
+    print(f"mean per tree:   {total / args.count * 1e6:.2f} us")
+    xs = [x for x, _ in positions]
+    ys = [y for _, y in positions]
+    print(f"map extent:      x {min(xs):.0f}..{max(xs):.0f}, y {min(ys):.0f}..{max(ys):.0f}")
+    if not args.skip_check:
+        overlaps = _overlaps(positions)
+        print(f"overlaps:        {overlaps}")
+        return 1 if overlaps else 0
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--skip-check", action="store_true", help="Skip the O(n) overlap verification")
+    sys.exit(main(parser.parse_args()))
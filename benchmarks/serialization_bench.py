@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+"""Serialization cost of a /api/trees response body.
+
+Compares the previous path (recursive ``mongo_to_json`` copy, FastAPI's
+``jsonable_encoder`` and ``json.dumps`` via ``JSONResponse``) with the
+current single pass (projected documents rendered by ``MongoJSONResponse``)
+on N synthetic tree documents.
+
+Usage:
+    python benchmarks/serialization_bench.py --count 10000
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from bson import ObjectId  # noqa: E402
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+
+from serialization import TREE_PROJECTION, MongoJSONResponse, public_doc  # noqa: E402
+
+
+def mongo_to_json(doc):
+    # The recursive walk server.py used before the single-pass encoder
+    if doc is None:
+        return None
+    if isinstance(doc, list):
+        return [mongo_to_json(item) for item in doc]
+    if isinstance(doc, dict):
+        return {k: mongo_to_json(v) for k, v in doc.items()}
+    if isinstance(doc, ObjectId):
+        return str(doc)
+    if isinstance(doc, datetime):
+        return doc.isoformat()
+    return doc
+
+
+def make_trees(count: int):
+    trees = []
+    for i in range(count):
+        x, y = 50 + (i * 37) % 900, 50 + (i * 53) % 500
+        trees.append({
+            "_id": ObjectId(),
+            "id": str(uuid.uuid4()),
+            "donation_id": str(uuid.uuid4()),
+            "donor": f"Donor {i}",
+            "message": "Planting for a better future.",
+            "type": ["pine", "oak", "birch", "sequoia", "maple"][i % 5],
+            "x": float(x), "y": float(y), "loc": [float(x), float(y)],
+            "size": 0.7 + (i % 50) / 100,
+            "timestamp": datetime.now().isoformat(),
+            "seq": i + 1,
+        })
+    return trees
+
+
+def legacy_path(trees):
+    return JSONResponse(content=jsonable_encoder(mongo_to_json(trees))).body
+
+
+def projected(trees):
+    # What Mongo returns for the same documents with TREE_PROJECTION applied
+    return [public_doc(tree, TREE_PROJECTION) for tree in trees]
+
+
+def current_path(trees):
+    return MongoJSONResponse(content=trees).body
+
+
+def measure(fn, trees, repeat: int):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = fn(trees)
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples), len(body)
+
+
+def main(args):
+    trees = make_trees(args.count)
+    legacy_ms, legacy_bytes = measure(legacy_path, trees, args.repeat)
+    current_ms, current_bytes = measure(current_path, projected(trees), args.repeat)
+    print(f"trees:          {args.count}")
+    print(f"legacy path:    {legacy_ms:8.2f} ms  {legacy_bytes:>10,} bytes")
+    print(f"single pass:    {current_ms:8.2f} ms  {current_bytes:>10,} bytes")
+    print(f"speed-up:       {legacy_ms / current_ms:8.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    main(parser.parse_args())
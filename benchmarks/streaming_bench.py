@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+"""Peak memory of listing the whole forest: to_list vs streaming.
+
+For each forest size, measures the Python heap peak (tracemalloc) of
+  * materializing every tree with ``to_list`` and encoding one body, and
+  * draining ``encode_cursor_chunks`` over ``iter_trees()`` as the
+    ``/api/trees?stream=`` endpoint does.
+The streaming peak should stay flat while the to_list peak grows with the
+forest.
+
+Usage:
+    MONGO_URL=mongodb://localhost:27017 python benchmarks/streaming_bench.py \\
+        --sizes 10000 50000 200000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+
+import server  # noqa: E402
+from indexes import ensure_indexes  # noqa: E402
+from serialization import TREE_PROJECTION, dumps  # noqa: E402
+from streaming import encode_cursor_chunks  # noqa: E402
+
+
+async def _fill(db, start: int, stop: int):
+    batch = []
+    for i in range(start, stop):
+        batch.append({
+            "id": f"bench-{i:08d}", "donation_id": "bench", "donor": f"Donor {i}",
+            "message": "Planting for a better future.", "type": "oak",
+            "x": float(i % 900), "y": float(i % 500), "size": 1.0,
+            "timestamp": f"2024-01-01T00:00:00.{i:06d}", "seq": i + 1,
+        })
+        if len(batch) == 5000:
+            await db.trees.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        await db.trees.insert_many(batch, ordered=False)
+
+
+async def _peak(coro_factory):
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    size = await coro_factory()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak, size
+
+
+async def materialized(db):
+    trees = await db.trees.find({}, TREE_PROJECTION).sort(server.SORT_KEY).to_list(length=None)
+    return len(dumps(trees))
+
+
+async def streamed():
+    total = 0
+    async for chunk in encode_cursor_chunks(server.iter_trees(), "json"):
+        total += len(chunk)
+    return total
+
+
+async def main(args):
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    db = client[args.db]
+    await db.trees.drop()
+    await ensure_indexes(db)
+    server.db = db
+
+    print(f"{'trees':>10} {'body MB':>8} {'to_list peak MB':>16} {'stream peak MB':>15}")
+    filled = 0
+    for size in sorted(args.sizes):
+        # Grow the forest to the next size
+        await _fill(db, filled, size)
+        filled = size
+        list_peak, body = await _peak(lambda: materialized(db))
+        stream_peak, _ = await _peak(streamed)
+        print(f"{size:>10} {body / 1e6:>8.1f} {list_peak / 1e6:>16.1f} {stream_peak / 1e6:>15.1f}")
+
+    await db.trees.drop()
+    client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 50_000, 200_000])
+    parser.add_argument("--db", default="magic_forest_bench")
+    asyncio.run(main(parser.parse_args()))
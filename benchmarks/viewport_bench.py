@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+"""Viewport query latency as the forest grows.
+
+Fills a scratch database with trees at a constant density (the map grows with
+the forest, as it does in production) and times a fixed-size viewport query
+through ``get_trees_in_view`` at each forest size. With the 2d index the
+latency should stay flat; ``--compare-scan`` also times the same box as a
+plain x/y range filter without an index.
+
+Usage:
+    MONGO_URL=mongodb://localhost:27017 python benchmarks/viewport_bench.py \\
+        --sizes 10000 50000 100000 300000
+"""
+import argparse
+import asyncio
+import math
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+
+import server  # noqa: E402
+from indexes import ensure_indexes  # noqa: E402
+
+# Trees per 900x500 map area, i.e. roughly one visible map's worth
+DENSITY = 1000
+VIEW_WIDTH, VIEW_HEIGHT = 900, 500
+
+
+def _tree(i: int, side_x: float, side_y: float):
+    x, y = random.uniform(0, side_x), random.uniform(0, side_y)
+    return {
+        "id": f"bench-{i}", "donation_id": "bench", "donor": "bench", "message": "",
+        "type": random.choice(["pine", "oak", "birch", "sequoia", "maple"]),
+        "x": x, "y": y, "loc": [x, y], "size": 1.0,
+        "timestamp": f"2024-01-01T00:00:00.{i:06d}", "seq": i + 1,
+    }
+
+
+async def _grow(db, start: int, stop: int, side_x: float, side_y: float):
+    batch = []
+    for i in range(start, stop):
+        batch.append(_tree(i, side_x, side_y))
+        if len(batch) == 5000:
+            await db.trees.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        await db.trees.insert_many(batch, ordered=False)
+
+
+async def _time(query, repeat: int):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await query()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+async def main(args):
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    db = client[args.db]
+    await db.trees.drop()
+    await ensure_indexes(db)
+    server.db = db
+
+    print(f"{'trees':>10} {'returned':>9} {'p50 ms':>8} {'p95 ms':>8}" + (f" {'scan p50':>9}" if args.compare_scan else ""))
+    grown = 0
+    for size in sorted(args.sizes):
+        scale = math.sqrt(size / DENSITY)
+        side_x, side_y = VIEW_WIDTH * scale, VIEW_HEIGHT * scale
+        # Regrow from scratch so density stays uniform across the whole area
+        await db.trees.delete_many({})
+        await _grow(db, 0, size, side_x, side_y)
+        grown = size
+
+        cx, cy = side_x / 2, side_y / 2
+        box = (cx - VIEW_WIDTH / 2, cx + VIEW_WIDTH / 2, cy - VIEW_HEIGHT / 2, cy + VIEW_HEIGHT / 2)
+        trees, _ = await server.get_trees_in_view(*box, limit=server.TREE_DELTA_LIMIT)
+        p50, p95 = await _time(lambda: server.get_trees_in_view(*box), args.repeat)
+        line = f"{grown:>10} {len(trees):>9} {p50:>8.2f} {p95:>8.2f}"
+        if args.compare_scan:
+            scan = {"x": {"$gte": box[0], "$lte": box[1]}, "y": {"$gte": box[2], "$lte": box[3]}}
+            scan_p50, _ = await _time(lambda: db.trees.find(scan).to_list(length=None), max(args.repeat // 10, 3))
+            line += f" {scan_p50:>9.2f}"
+        print(line)
+
+    await db.trees.drop()
+    client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 50_000, 100_000, 300_000])
+    parser.add_argument("--repeat", type=int, default=100)
+    parser.add_argument("--db", default="magic_forest_bench")
+    parser.add_argument("--compare-scan", action="store_true")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+"""Fake Stripe webhook generator for load testing /api/stripe/webhook.
+
+Builds checkout.session.completed events (plus a share of renewal
+invoice.paid events and redelivered duplicates), signs them with the
+webhook secret exactly as Stripe does, and posts them at ``--rate`` events
+per second. Reports acknowledgement throughput and latency, then waits for
+the worker pool's backlog (from /api/health) to drain.
+
+Without ``--url`` the app runs in-process against MONGO_URL; with it, the
+events go to a running server that shares ``--secret`` as
+STRIPE_WEBHOOK_SECRET.
+
+Usage:
+    MONGO_URL=mongodb://localhost:27017 python benchmarks/webhook_load.py \\
+        --events 20000 --rate 5000 --duplicates 0.05
+    python benchmarks/webhook_load.py --url http://localhost:8001 --secret whsec_... --rate 2000
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+
+def signature(secret: str, payload: bytes, timestamp: int) -> str:
+    digest = hmac.new(secret.encode(), f"{timestamp}.".encode() + payload, hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={digest}"
+
+
+def fake_event(n: int, renewal_share: float):
+    if random.random() < renewal_share:
+        plan, amount = random.choice([("seedling", 500), ("guardian", 1500), ("ranger", 3000)])
+        obj = {
+            "id": f"in_load_{uuid.uuid4().hex}", "object": "invoice",
+            "billing_reason": "subscription_cycle", "amount_paid": amount,
+            "customer_email": f"donor{n}@example.com",
+            "subscription_details": {"metadata": {"plan": plan}},
+        }
+        event_type = "invoice.paid"
+    else:
+        amount = random.choice([5, 10, 25, 50, 100])
+        obj = {
+            "id": f"cs_load_{uuid.uuid4().hex}", "object": "checkout.session",
+            "status": "complete", "payment_status": "paid", "amount_total": amount * 100,
+            "customer_details": {"email": f"donor{n}@example.com"},
+            "metadata": {"donation_type": "one-time", "amount": str(amount), "application": "magic_forest"},
+        }
+        event_type = "checkout.session.completed"
+    return {
+        "id": f"evt_load_{uuid.uuid4().hex}", "object": "event", "type": event_type,
+        "created": int(time.time()), "data": {"object": obj},
+    }
+
+
+def event_stream(count: int, duplicates: float, renewal_share: float):
+    sent = []
+    for n in range(count):
+        if sent and random.random() < duplicates:
+            yield random.choice(sent)
+        else:
+            event = fake_event(n, renewal_share)
+            sent.append(event)
+            yield event
+
+
+async def _post(http, secret: str, event, latencies, statuses):
+    payload = json.dumps(event).encode()
+    headers = {"stripe-signature": signature(secret, payload, int(time.time())), "content-type": "application/json"}
+    started = time.perf_counter()
+    response = await http.post("/api/stripe/webhook", content=payload, headers=headers)
+    latencies.append(time.perf_counter() - started)
+    statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+
+async def _drain(http, timeout: float):
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        webhooks = (await http.get("/api/health")).json().get("webhooks", {})
+        if not webhooks.get("backlog"):
+            return time.perf_counter() - started, webhooks
+        await asyncio.sleep(0.05)
+    return None, webhooks
+
+
+async def run(http, args):
+    latencies, statuses, pending = [], {}, set()
+    interval = 1 / args.rate
+    started = time.perf_counter()
+    for n, event in enumerate(event_stream(args.events, args.duplicates, args.renewals)):
+        # Open-loop: keep the send schedule regardless of how fast acks come back
+        delay = started + n * interval - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        task = asyncio.create_task(_post(http, args.secret, event, latencies, statuses))
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+    await asyncio.gather(*pending)
+    elapsed = time.perf_counter() - started
+    drained, webhooks = await _drain(http, args.drain_timeout)
+
+    latencies.sort()
+    print(f"sent {args.events} events in {elapsed:.2f}s = {args.events / elapsed:,.0f} events/s, statuses {statuses}")
+    print(f"ack latency p50 {statistics.median(latencies) * 1000:.1f} ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f} ms")
+    print(f"backlog drained {'in %.2fs' % drained if drained is not None else 'NOT within timeout'}: {webhooks}")
+
+
+async def main(args):
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, timeout=30) as http:
+            await run(http, args)
+        return
+
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    import server
+    from indexes import ensure_indexes
+
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    server.db = client[args.db]
+    for name in ("donations", "donation_totals", "stripe_events"):
+        await server.db[name].drop()
+    await ensure_indexes(server.db)
+    server.STRIPE_WEBHOOK_SECRET = args.secret
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://bench") as http:
+        await run(http, args)
+    await server.webhook_pipeline.close()
+    print(f"donations stored: {await server.db.donations.count_documents({})}")
+    client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="base URL of a running API; in-process when omitted")
+    parser.add_argument("--secret", default=os.environ.get("STRIPE_WEBHOOK_SECRET", "whsec_load_test"))
+    parser.add_argument("--events", type=int, default=20_000)
+    parser.add_argument("--rate", type=float, default=5000, help="events per second")
+    parser.add_argument("--duplicates", type=float, default=0.05, help="share of redelivered events")
+    parser.add_argument("--renewals", type=float, default=0.2, help="share of renewal invoice events")
+    parser.add_argument("--drain-timeout", type=float, default=60)
+    parser.add_argument("--db", default="magic_forest_bench")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+"""Requests per second on the read endpoints as the worker count grows.
+
+For each worker count, starts ``backend/serve.py --workers N`` on a free
+port against MONGO_URL, waits for it to answer, then drives
+``GET /api/trees`` and ``GET /api/total-donations`` from ``--load-procs``
+load-generator processes (so the client is not the bottleneck) for
+``--duration`` seconds, and prints throughput and latency.
+
+Read coalescing is turned off for the run so every request does its own
+Mongo read, which isolates the effect of extra workers. MONGO_URL must point
+at a replica set; against a standalone mongod serve.py runs one worker.
+
+Usage:
+    MONGO_URL=mongodb://localhost:27017 python benchmarks/workers_bench.py \\
+        --workers 1 2 4 8 --duration 10 --connections 64
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+PATHS = ("/api/trees", "/api/total-donations")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_ready(base: str, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{base}/api/health", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"server at {base} did not come up")
+
+
+async def _load(base: str, connections: int, duration: float):
+    latencies = []
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+    async with httpx.AsyncClient(base_url=base, limits=limits, timeout=30) as http:
+        deadline = time.perf_counter() + duration
+
+        async def client(n: int):
+            i = n
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                response = await http.get(PATHS[i % len(PATHS)])
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - started)
+                i += 1
+
+        await asyncio.gather(*(client(n) for n in range(connections)))
+    return latencies
+
+
+def _load_proc(args):
+    base, connections, duration = args
+    return asyncio.run(_load(base, connections, duration))
+
+
+def run(workers: int, args):
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    env = {**os.environ, "COALESCE_TREES": "0", "COALESCE_TOTALS": "0", "CHANGE_FEED": "0"}
+    proc = subprocess.Popen(
+        [sys.executable, "serve.py", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=BACKEND, env=env,
+    )
+    try:
+        _wait_ready(base)
+        per_proc = max(args.connections // args.load_procs, 1)
+        with multiprocessing.get_context("spawn").Pool(args.load_procs) as pool:
+            results = pool.map(_load_proc, [(base, per_proc, args.duration)] * args.load_procs)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=60)
+    latencies = sorted(latency for result in results for latency in result)
+    return len(latencies) / args.duration, latencies
+
+
+def main(args):
+    print(f"{'workers':>8} {'req/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'scaling':>8}")
+    baseline = None
+    for workers in args.workers:
+        rps, latencies = run(workers, args)
+        baseline = baseline or rps
+        print(f"{workers:>8} {rps:>10,.0f} {statistics.median(latencies) * 1000:>8.1f} "
+              f"{latencies[int(len(latencies) * 0.99) - 1] * 1000:>8.1f} {rps / baseline:>7.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    cpus = multiprocessing.cpu_count()
+    parser.add_argument("--workers", type=int, nargs="+",
+                        default=sorted({1, 2, max(cpus // 2, 1), cpus}))
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--connections", type=int, default=64)
+    parser.add_argument("--load-procs", type=int, default=max(cpus // 2, 1))
+    main(parser.parse_args())
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+"""Insert throughput under concurrent load: insert_one vs group commit.
+
+Runs ``--workers`` concurrent tasks that each insert ``--per-worker``
+donation documents, once with a plain ``insert_one`` per document and once
+through ``GroupCommitBuffer`` (what ``WRITE_BUFFER=1`` enables in the API).
+Prints inserts per second, p50/p99 per-insert latency, and the mean batch
+size the buffer achieved.
+
+Usage:
+    MONGO_URL=mongodb://localhost:27017 python benchmarks/write_buffer_bench.py \\
+        --workers 200 --per-worker 50 --max-batch 100 --max-delay-ms 5
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+
+from indexes import ensure_indexes  # noqa: E402
+from write_buffer import GroupCommitBuffer  # noqa: E402
+
+
+def _doc(i: int):
+    return {
+        "id": str(uuid.uuid4()), "type": "one-time", "amount": 25.0, "plan": None,
+        "email": None, "payment_status": "completed", "session_id": None,
+        "payment_method": "card", "timestamp": f"2024-01-01T00:00:00.{i % 1_000_000:06d}",
+    }
+
+
+async def _load(insert, workers: int, per_worker: int):
+    latencies = []
+
+    async def worker(w: int):
+        for n in range(per_worker):
+            started = time.perf_counter()
+            await insert(_doc(w * per_worker + n))
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(w) for w in range(workers)))
+    return time.perf_counter() - started, sorted(latencies)
+
+
+def _report(label: str, elapsed: float, latencies, extra: str = ""):
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(f"{label:>12}: {len(latencies) / elapsed:>9,.0f} inserts/s  "
+          f"p50 {statistics.median(latencies) * 1000:6.1f} ms  p99 {p99 * 1000:6.1f} ms{extra}")
+
+
+async def main(args):
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    db = client[args.db]
+
+    await db.donations.drop()
+    await ensure_indexes(db)
+    elapsed, latencies = await _load(db.donations.insert_one, args.workers, args.per_worker)
+    _report("insert_one", elapsed, latencies)
+
+    await db.donations.drop()
+    await ensure_indexes(db)
+    buffer = GroupCommitBuffer(
+        lambda docs: db.donations.insert_many(docs, ordered=False),
+        max_batch=args.max_batch, max_delay=args.max_delay_ms / 1000, max_pending=args.max_pending,
+    )
+    elapsed, latencies = await _load(buffer.insert, args.workers, args.per_worker)
+    await buffer.close()
+    _report("group commit", elapsed, latencies, f"  mean batch {buffer.documents / max(buffer.batches, 1):.1f}")
+
+    await db.donations.drop()
+    client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=200)
+    parser.add_argument("--per-worker", type=int, default=50)
+    parser.add_argument("--max-batch", type=int, default=100)
+    parser.add_argument("--max-delay-ms", type=float, default=5)
+    parser.add_argument("--max-pending", type=int, default=5000)
+    parser.add_argument("--db", default="magic_forest_bench")
+    asyncio.run(main(parser.parse_args()))
@@ -5,24 +5,37 @@ set -e
 cd /backend || { echo "Backend directory not found"; exit 1; }
 
 echo "Starting FastAPI backend"
-# Start Uvicorn with proper host binding
-uvicorn server:app --host 0.0.0.0 --port 8001 &
+# One uvicorn worker per CPU unless WEB_CONCURRENCY says otherwise, and only one when
+# Mongo is standalone and workers could not share state (see backend/serve.py)
+python3 serve.py --host 0.0.0.0 --port 8001 &
 BACKEND_PID=$!
 
-echo "Waiting for backend to start..."
-sleep 30
-
-if ! kill -0 $BACKEND_PID 2>/dev/null; then
-    echo "Backend failed to start at initialization, exiting"
-    exit 1
-fi
+# Gate on /api/ready (Mongo reachable, indexes present, caches warm) instead of a fixed sleep
+READY_TIMEOUT=${READY_TIMEOUT:-120}
+STARTED_AT=$(date +%s)
+echo "Waiting for backend to become ready (up to ${READY_TIMEOUT}s)..."
+until wget -q -T 2 -O /dev/null http://127.0.0.1:8001/api/ready 2>/dev/null; do
+    if ! kill -0 $BACKEND_PID 2>/dev/null; then
+        echo "Backend failed to start at initialization, exiting"
+        exit 1
+    fi
+    if [ $(( $(date +%s) - STARTED_AT )) -ge "$READY_TIMEOUT" ]; then
+        echo "Backend not ready after ${READY_TIMEOUT}s, exiting"
+        kill $BACKEND_PID
+        exit 1
+    fi
+    sleep 1
+done
+echo "Backend ready after $(( $(date +%s) - STARTED_AT ))s (cold start)"
 
 # Start Nginx
 nginx -g 'daemon off;' &
 NGINX_PID=$!
 
-# Handle termination signals
-trap 'kill $BACKEND_PID $NGINX_PID; exit 0' SIGTERM SIGINT
+# Handle termination signals: both finish in-flight requests before exiting
+# (nginx on SIGQUIT, the backend on SIGTERM within SHUTDOWN_DEADLINE). The container
+# stop timeout must exceed SHUTDOWN_DEADLINE plus 5s (see the Dockerfile).
+trap 'kill -QUIT $NGINX_PID; kill -TERM $BACKEND_PID; wait $BACKEND_PID $NGINX_PID; exit 0' SIGTERM SIGINT
 
 # Check if processes are still running
 while kill -0 $BACKEND_PID 2>/dev/null && kill -0 $NGINX_PID 2>/dev/null; do
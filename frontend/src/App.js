@@ -532,6 +532,41 @@ const DonationPage = () => {
   );
 };
 
+// Decode the packed typed-array feed served by /api/trees/columnar (layout in backend/tree_codec.py)
+const decodeColumnarTrees = (buffer) => {
+  const view = new DataView(buffer);
+  const count = view.getUint32(4, true);
+  let timestamp = view.getFloat64(8, true);
+  const typesLength = view.getUint32(16, true);
+  const types = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 24, typesLength)));
+  let offset = 24 + Math.ceil(typesLength / 4) * 4;
+  const column = (ArrayType) => {
+    const values = new ArrayType(buffer, offset, count);
+    offset += values.byteLength;
+    return values;
+  };
+  const seqs = column(Uint32Array);
+  const xs = column(Float32Array);
+  const ys = column(Float32Array);
+  const sizes = column(Float32Array);
+  const deltas = column(Int32Array);
+  const typeIndexes = column(Uint8Array);
+  
+  const trees = new Array(count);
+  for (let i = 0; i < count; i++) {
+    timestamp += deltas[i];
+    trees[i] = {
+      seq: seqs[i],
+      x: xs[i],
+      y: ys[i],
+      size: sizes[i],
+      type: types[typeIndexes[i]],
+      timestamp: timestamp * 1000
+    };
+  }
+  return trees;
+};
+
 const ForestMap = () => {
   const [trees, setTrees] = useState([]);
   const [selectedTree, setSelectedTree] = useState(null);
@@ -544,13 +579,8 @@ const ForestMap = () => {
     try {
       setLoading(true);
       console.log('Fetching trees from API...');
-      const response = await fetch(`${process.env.REACT_APP_BACKEND_URL}/api/trees?nocache=${Date.now()}`, {
-        headers: {
-          'Cache-Control': 'no-cache, no-store, must-revalidate',
-          'Pragma': 'no-cache',
-          'Expires': '0'
-        }
-      });
+      // The API revalidates with ETags, so the browser cache turns unchanged polls into 304s
+      const response = await fetch(`${process.env.REACT_APP_BACKEND_URL}/api/trees`);
       if (response.ok) {
         const data = await response.json();
         console.log('Trees from API:', data);
@@ -577,18 +607,90 @@ const ForestMap = () => {
     }
   };
   
-  // Fetch trees when the component mounts
+  // Normalize trees coming from the API
+  const withSize = (tree) => ({
+    ...tree,
+    size: tree.size || Math.random() * 0.5 + 0.7 // Add default size if missing
+  });
+  
+  // Subscribe to the live tree stream when the component mounts
   useEffect(() => {
-    fetchTrees();
-    
-    // Also fetch trees every few seconds to ensure we have the latest data
-    const intervalId = setInterval(() => {
+    // Fall back to polling in browsers without Server-Sent Events
+    if (typeof window.EventSource === 'undefined') {
       fetchTrees();
-    }, 2000); // Refresh every 2 seconds for better responsiveness
+      const intervalId = setInterval(() => {
+        fetchTrees();
+      }, 2000);
+      return () => clearInterval(intervalId); // Clean up on unmount
+    }
+    
+    // Merge trees by sequence number, keeping details (donor, message) already fetched
+    const mergeTrees = (incoming) => {
+      setTrees(current => {
+        const bySeq = new Map();
+        current
+          .filter(tree => !String(tree.id).startsWith('tree-')) // Drop mock trees
+          .forEach(tree => bySeq.set(tree.seq ?? tree.id, tree));
+        incoming.forEach(tree => {
+          const key = tree.seq ?? tree.id;
+          bySeq.set(key, { ...bySeq.get(key), ...tree });
+        });
+        return Array.from(bySeq.values());
+      });
+    };
     
-    return () => clearInterval(intervalId); // Clean up on unmount
+    // Load the whole forest as compact typed arrays; details are fetched per tree on click
+    const loadForest = async () => {
+      try {
+        const response = await fetch(`${process.env.REACT_APP_BACKEND_URL}/api/trees/columnar`);
+        if (!response.ok) throw new Error(`Status ${response.status}`);
+        const forest = decodeColumnarTrees(await response.arrayBuffer());
+        if (forest.length > 0) {
+          mergeTrees(forest);
+        } else {
+          setTrees(current => (current.length > 0 ? current : getMockTrees()));
+        }
+      } catch (error) {
+        console.error('Exception loading forest:', error);
+        setTrees(current => (current.length > 0 ? current : getMockTrees()));
+      } finally {
+        setLoading(false);
+      }
+    };
+    
+    // Only newly planted trees come over the stream; reload the forest on every (re)connect
+    const source = new EventSource(`${process.env.REACT_APP_BACKEND_URL}/api/trees/stream?snapshot=false`);
+    source.onopen = () => loadForest();
+    
+    source.addEventListener('tree', (event) => {
+      mergeTrees([withSize(JSON.parse(event.data))]);
+    });
+    
+    source.onerror = () => {
+      // EventSource reconnects on its own; show mock data until it does
+      setTrees(current => (current.length > 0 ? current : getMockTrees()));
+      setLoading(false);
+    };
+    
+    return () => source.close(); // Clean up on unmount
   }, []);
   
+  // Show a tree, fetching its donor and message first if only the map data is loaded
+  const selectTree = async (tree) => {
+    setSelectedTree(tree);
+    if (tree.donor !== undefined || tree.seq === undefined) return;
+    try {
+      const response = await fetch(`${process.env.REACT_APP_BACKEND_URL}/api/trees/seq/${tree.seq}`);
+      if (response.ok) {
+        const details = await response.json();
+        setSelectedTree(current => (current && current.seq === tree.seq ? { ...tree, ...details } : current));
+        setTrees(current => current.map(t => (t.seq === tree.seq ? { ...t, ...details } : t)));
+      }
+    } catch (error) {
+      console.error('Exception fetching tree details:', error);
+    }
+  };
+  
   // Mock data for initial development
   const getMockTrees = () => {
     return Array.from({ length: 25 }, (_, i) => ({
@@ -602,6 +704,15 @@ const ForestMap = () => {
     }));
   };
   
+  // The server grows the forest beyond the original map once it fills up
+  const extent = trees.reduce(
+    (acc, tree) => ({
+      width: Math.max(acc.width, tree.x + 60),
+      height: Math.max(acc.height, tree.y + 80)
+    }),
+    { width: mapWidth, height: mapHeight }
+  );
+  
   const getTreeColor = (type) => {
     switch (type) {
       case 'pine': return '#2D6A4F';
@@ -634,7 +745,7 @@ const ForestMap = () => {
           </div>
         ) : (
           <>
-            <svg width="100%" height={mapHeight} viewBox={`0 0 ${mapWidth} ${mapHeight}`} className="mx-auto">
+            <svg width="100%" height={mapHeight} viewBox={`0 0 ${extent.width} ${extent.height}`} className="mx-auto">
               {/* Background grid */}
               {Array.from({ length: 10 }).map((_, i) => (
                 <line 
@@ -661,10 +772,10 @@ const ForestMap = () => {
               
               {trees.map((tree) => (
                 <g 
-                  key={tree.id} 
+                  key={tree.id || `seq-${tree.seq}`} 
                   transform={`translate(${tree.x}, ${tree.y}) scale(${tree.size})`}
                   className="cursor-pointer transition-transform hover:scale-110"
-                  onClick={() => setSelectedTree(tree)}
+                  onClick={() => selectTree(tree)}
                 >
                   {/* Tree trunk */}
                   <rect 
@@ -707,8 +818,8 @@ const ForestMap = () => {
                 >
                   ✕
                 </button>
-                <h3 className="font-semibold text-lg">{selectedTree.donor}&apos;s {selectedTree.type.charAt(0).toUpperCase() + selectedTree.type.slice(1)}</h3>
-                <p className="text-gray-300 mt-2">{selectedTree.message}</p>
+                <h3 className="font-semibold text-lg">{selectedTree.donor ?? 'A donor'}&apos;s {selectedTree.type.charAt(0).toUpperCase() + selectedTree.type.slice(1)}</h3>
+                <p className="text-gray-300 mt-2">{selectedTree.message ?? 'Loading...'}</p>
                 <div className="mt-3 pt-3 border-t border-night-600 text-sm text-gray-400">
                   Planted on {new Date().toLocaleDateString()}
                 </div>
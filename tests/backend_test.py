@@ -160,6 +160,21 @@ class MagicForestAPITester:
         
         return success, response
 
+    def test_total_donations(self):
+        """Test the materialized donation totals"""
+        success, response = self.run_test(
+            "Total Donations",
+            "GET",
+            "total-donations",
+            200
+        )
+        
+        if success:
+            print(f"Total: {response.get('total', 'Not found')}")
+            print(f"Count: {response.get('count', 'Not found')}")
+        
+        return success, response
+
 def main():
     tester = MagicForestAPITester()
     test_email = f"test_{datetime.now().strftime('%H%M%S')}@example.com"
@@ -167,6 +182,9 @@ def main():
     # Run tests
     print(f"Testing Magic Forest API at: {tester.base_url}")
     
+    # Test donation totals before and after creating a donation
+    totals_before_success, totals_before = tester.test_total_donations()
+    
     # Test payment intent
     payment_intent_success, payment_intent_data = tester.test_create_payment_intent(
         amount=25,
@@ -201,6 +219,13 @@ def main():
         email=test_email
     )
     
+    # Totals are maintained incrementally, so the new donations must be visible immediately
+    totals_after_success, totals_after = tester.test_total_donations()
+    if totals_before_success and totals_after_success and donation_success:
+        if totals_after.get("count", 0) < totals_before.get("count", 0) + 1:
+            print("❌ Failed - Donation count did not increase")
+            tester.tests_passed -= 1
+    
     # Print results
     print(f"\n📊 Tests passed: {tester.tests_passed}/{tester.tests_run}")
     return 0 if tester.tests_passed == tester.tests_run else 1
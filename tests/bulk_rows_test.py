@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+"""Row parsing for bulk ingestion: NDJSON streamed in chunks, JSON arrays, per-row errors.
+
+Uses a stand-in for the request that yields the body in the given chunks.
+
+Run with: python -m pytest tests/bulk_rows_test.py
+"""
+import asyncio
+import os
+import sys
+
+import orjson
+import pytest
+from fastapi import HTTPException
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from bulk import request_rows  # noqa: E402
+
+
+class FakeRequest:
+    def __init__(self, chunks, content_type="application/x-ndjson; charset=utf-8"):
+        self.chunks = chunks
+        self.headers = {"content-type": content_type}
+
+    async def stream(self):
+        for chunk in self.chunks:
+            yield chunk
+
+    async def body(self):
+        return b"".join(self.chunks)
+
+
+def rows(chunks, content_type="application/x-ndjson; charset=utf-8"):
+    async def run():
+        return [(row, payload) async for row, payload in request_rows(FakeRequest(chunks, content_type))]
+
+    return asyncio.run(run())
+
+
+def test_ndjson_rows_are_numbered_and_blank_lines_skipped():
+    body = b'{"amount": 10}\n\n{"amount": 20}\r\n   \n{"amount": 30}\n'
+    assert rows([body]) == [(1, {"amount": 10}), (2, {"amount": 20}), (3, {"amount": 30})]
+
+
+def test_last_line_without_newline_is_a_row():
+    assert rows([b'{"amount": 10}\n{"amount": 20}']) == [(1, {"amount": 10}), (2, {"amount": 20})]
+    assert rows([b'{"amount": 10}\n\n  ']) == [(1, {"amount": 10})]
+
+
+def test_line_split_across_chunks_is_joined():
+    body = b'{"amount": 10, "email": "a@example.com"}\n{"amount": 20}\n'
+    for cut in range(1, len(body)):
+        assert rows([body[:cut], b"", body[cut:]]) == [
+            (1, {"amount": 10, "email": "a@example.com"}), (2, {"amount": 20}),
+        ]
+
+
+def test_invalid_json_is_reported_for_its_row_only():
+    parsed = rows([b'{"amount": 10}\n{"amount": \n{"amount": 30}\n'])
+    assert [row for row, _ in parsed] == [1, 2, 3]
+    assert parsed[0][1] == {"amount": 10}
+    assert isinstance(parsed[1][1], orjson.JSONDecodeError)
+    assert parsed[2][1] == {"amount": 30}
+
+
+def test_json_array_rows():
+    assert rows([b'[{"amount": 10},', b' {"amount": 20}]'], "application/json") == [
+        (1, {"amount": 10}), (2, {"amount": 20}),
+    ]
+    for body, detail in ((b'[{"amount": ', "Invalid JSON"), (b'{"amount": 10}', "Expected a JSON array")):
+        with pytest.raises(HTTPException) as raised:
+            rows([body], "application/json")
+        assert raised.value.status_code == 400
+        assert raised.value.detail.startswith(detail)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+"""Refreshing the checkout confirmation must not duplicate donations.
+
+Runs the API in-process against a stub Stripe server and a scratch Mongo
+database. Fires 50 parallel lookups of one completed checkout session and
+checks that they produce exactly one donation and one Stripe call, and
+that later refreshes are answered without Stripe.
+
+Needs a MongoDB at MONGO_URL (default mongodb://localhost:27017); skipped
+otherwise.
+
+Run with: python -m pytest tests/checkout_session_test.py
+"""
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+from motor.motor_asyncio import AsyncIOMotorClient
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+import server  # noqa: E402
+from indexes import ensure_indexes  # noqa: E402
+from stripe_gateway import StripeGateway  # noqa: E402
+
+SESSION_ID = "cs_test_refresh"
+STRIPE_DELAY_SECONDS = 0.3
+PARALLEL_REFRESHES = 50
+
+
+class CheckoutStripeHandler(BaseHTTPRequestHandler):
+    calls = 0
+
+    def do_GET(self):
+        CheckoutStripeHandler.calls += 1
+        time.sleep(STRIPE_DELAY_SECONDS)
+        body = json.dumps({
+            "id": SESSION_ID,
+            "object": "checkout.session",
+            "status": "complete",
+            "payment_status": "paid",
+            "customer_details": {"email": "donor@example.com"},
+            "metadata": {"donation_type": "one-time", "amount": "25"},
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+async def refresh_confirmation_page(base: str):
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"),
+                                serverSelectionTimeoutMS=1000)
+    try:
+        await client.admin.command("ping")
+    except Exception:
+        pytest.skip("MongoDB is not reachable")
+    db = client.magic_forest_checkout_test
+    await db.donations.drop()
+    await ensure_indexes(db)
+    server.db = db
+    server.stripe_gateway = StripeGateway("sk_test_stub", api_base=base)
+    server.donation_cache.clear()
+
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+        path = f"/api/checkout-session/{SESSION_ID}"
+        responses = await asyncio.gather(*(http.get(path) for _ in range(PARALLEL_REFRESHES)))
+        later = await http.get(path)
+    donations = await db.donations.count_documents({"session_id": SESSION_ID})
+
+    await server.stripe_gateway.close()
+    await db.donations.drop()
+    client.close()
+    return responses, later, donations
+
+
+def test_parallel_refreshes_record_one_donation():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), CheckoutStripeHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    try:
+        responses, later, donations = asyncio.run(
+            refresh_confirmation_page(f"http://127.0.0.1:{httpd.server_address[1]}")
+        )
+    finally:
+        httpd.shutdown()
+
+    assert {response.status_code for response in responses} == {200}
+    assert len({response.json()["donation_id"] for response in responses}) == 1
+    assert donations == 1
+    # The session is complete, so the later refresh was answered from Mongo
+    assert CheckoutStripeHandler.calls == 1
+    assert later.json() == responses[0].json()
+    assert later.json()["status"] == "complete"
+    assert later.json()["amount"] == 25
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+"""/api/metrics collectors: per-route request timing and cache counters.
+
+Run with: python -m pytest tests/metrics_test.py
+"""
+import asyncio
+import os
+import sys
+
+import httpx
+import pytest
+from fastapi import FastAPI, HTTPException
+from prometheus_client import REGISTRY
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from metrics import MetricsMiddleware, StatsSampler  # noqa: E402
+
+
+def request_count(route: str, status: str) -> float:
+    labels = {"method": "GET", "route": route, "status": status}
+    return REGISTRY.get_sample_value("http_request_duration_seconds_count", labels) or 0.0
+
+
+def test_requests_are_labelled_by_route_template():
+    app = FastAPI()
+
+    @app.get("/api/things/{thing_id}")
+    async def thing(thing_id: str):
+        if thing_id == "missing":
+            raise HTTPException(status_code=404)
+        return {"id": thing_id}
+
+    async def run():
+        transport = httpx.ASGITransport(app=MetricsMiddleware(app))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            for path in ("/api/things/a", "/api/things/b", "/api/things/missing", "/elsewhere"):
+                await client.get(path)
+
+    before = {key: request_count(*key) for key in
+              [("/api/things/{thing_id}", "200"), ("/api/things/{thing_id}", "404"), ("unmatched", "404")]}
+    asyncio.run(run())
+    assert request_count("/api/things/{thing_id}", "200") - before[("/api/things/{thing_id}", "200")] == 2
+    assert request_count("/api/things/{thing_id}", "404") - before[("/api/things/{thing_id}", "404")] == 1
+    assert request_count("unmatched", "404") - before[("unmatched", "404")] == 1
+    assert REGISTRY.get_sample_value("http_requests_in_flight") == 0
+
+
+def test_sampler_adds_only_new_cache_lookups():
+    counts = {"hits": 3, "misses": 1}
+    sampler = StatsSampler()
+    sampler.track_cache("sampler-test", lambda: (counts["hits"], counts["misses"]))
+
+    def total(result):
+        return REGISTRY.get_sample_value("cache_requests_total", {"cache": "sampler-test", "result": result})
+
+    sampler.sample()
+    sampler.sample()
+    assert (total("hit"), total("miss")) == (3, 1)
+    assert REGISTRY.get_sample_value("cache_hit_ratio", {"cache": "sampler-test"}) == 0.75
+    # Stats reset to zero and counted up again
+    counts.update(hits=2, misses=0)
+    sampler.sample()
+    assert (total("hit"), total("miss")) == (5, 1)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+"""Tree feed cursors: contiguous_prefix never moves past a write still in flight.
+
+Run with: python -m pytest tests/sequences_test.py
+"""
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from sequences import SEQ_GAP_GRACE, contiguous_prefix  # noqa: E402
+
+NOW = datetime(2024, 5, 1, 12, 0, 0)
+
+
+def tree(seq: int, age: timedelta = timedelta(0)):
+    return {"seq": seq, "timestamp": (NOW - age).isoformat()}
+
+
+def test_contiguous_docs_advance_the_cursor():
+    docs = [tree(4), tree(5), tree(6)]
+    assert contiguous_prefix(docs, 3, now=NOW) == (docs, 6)
+    assert contiguous_prefix([], 3, now=NOW) == ([], 3)
+
+
+def test_young_gap_stops_before_it():
+    docs = [tree(4), tree(6, age=SEQ_GAP_GRACE / 2), tree(7)]
+    assert contiguous_prefix(docs, 3, now=NOW) == (docs[:1], 4)
+
+
+def test_old_gap_is_skipped_as_a_failed_insert():
+    docs = [tree(4), tree(6, age=SEQ_GAP_GRACE * 2), tree(7)]
+    assert contiguous_prefix(docs, 3, now=NOW) == (docs, 7)
+
+
+def test_gap_after_undatable_doc_counts_as_young():
+    docs = [{"seq": 5}, {"seq": 6, "timestamp": "not a date"}]
+    assert contiguous_prefix(docs, 3, now=NOW) == ([], 3)
+    assert contiguous_prefix(docs[1:], 4, now=NOW) == ([], 4)
+
+
+def test_insert_landing_out_of_seq_order_is_not_lost():
+    # seq 11 committed before seq 10: the first read must not move past 9
+    assert contiguous_prefix([tree(11)], 9, now=NOW) == ([], 9)
+    docs = [tree(10), tree(11)]
+    assert contiguous_prefix(docs, 9, now=NOW) == (docs, 11)
+    # Unsorted input stops at the first mismatch rather than skipping ahead
+    assert contiguous_prefix([tree(11), tree(10)], 9, now=NOW) == ([], 9)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
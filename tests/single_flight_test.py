@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+"""Request coalescing behind checkout lookups and hot reads: sharing, reuse, errors, cancellation.
+
+Run with: python -m pytest tests/single_flight_test.py
+"""
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from single_flight import SingleFlight  # noqa: E402
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class Call:
+    """Counts executions; each one waits for ``release`` and returns its number."""
+
+    def __init__(self):
+        self.count = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.count += 1
+        await self.release.wait()
+        return self.count
+
+
+def test_concurrent_callers_share_one_execution():
+    async def run():
+        flight, call = SingleFlight("t"), Call()
+        callers = [asyncio.ensure_future(flight.do("k", call)) for _ in range(5)]
+        other = asyncio.ensure_future(flight.do("other", call))
+        await asyncio.sleep(0)
+        in_flight = len(flight)
+        call.release.set()
+        return await asyncio.gather(*callers), await other, in_flight, len(flight), flight.stats()
+
+    results, other, in_flight, after, stats = asyncio.run(run())
+    assert results == [1] * 5
+    assert other == 2
+    assert (in_flight, after) == (2, 0)
+    assert (stats["requests"], stats["executions"]) == (6, 2)
+
+
+def test_results_are_reused_until_the_ttl_runs_out():
+    async def run():
+        clock, call = Clock(), Call()
+        call.release.set()
+        flight = SingleFlight("t", ttl=0.25, clock=clock)
+        first = await flight.do("k", call)
+        clock.now = 0.2
+        reused = await flight.do("k", call)
+        clock.now = 0.25
+        expired = await flight.do("k", call)
+        flight.clear()
+        cleared = await flight.do("k", call)
+        return first, reused, expired, cleared
+
+    assert asyncio.run(run()) == (1, 1, 2, 3)
+
+
+def test_exceptions_are_shared_but_not_kept():
+    async def run():
+        flight = SingleFlight("t", ttl=10, clock=Clock())
+        calls = 0
+
+        async def failing():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0)
+            raise RuntimeError("stripe unavailable")
+
+        results = await asyncio.gather(flight.do("k", failing), flight.do("k", failing), return_exceptions=True)
+        with pytest.raises(RuntimeError):
+            await flight.do("k", failing)
+        return results, calls
+
+    results, calls = asyncio.run(run())
+    assert [type(result) for result in results] == [RuntimeError, RuntimeError]
+    assert calls == 2
+
+
+def test_cancelled_caller_does_not_cancel_the_shared_call():
+    async def run():
+        flight, call = SingleFlight("t"), Call()
+        leaving = asyncio.ensure_future(flight.do("k", call))
+        staying = asyncio.ensure_future(flight.do("k", call))
+        await asyncio.sleep(0)
+        leaving.cancel()
+        await asyncio.sleep(0)
+        call.release.set()
+        return await staying, leaving.cancelled(), call.count
+
+    assert asyncio.run(run()) == (1, True, 1)
+
+
+def test_disabled_runs_every_call():
+    async def run():
+        call = Call()
+        call.release.set()
+        flight = SingleFlight("t", ttl=10, enabled=False, clock=Clock())
+        results = await asyncio.gather(*(flight.do("k", call) for _ in range(3)))
+        return results, call.count, flight.stats()
+
+    results, executed, stats = asyncio.run(run())
+    assert (sorted(results), executed) == ([1, 2, 3], 3)
+    assert (stats["requests"], stats["executions"], stats["coalesce_ratio"]) == (3, 3, 0.0)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+"""Stripe calls must not block the event loop.
+
+Runs the API in-process against a local stub Stripe server whose checkout
+endpoint answers slowly, and checks that other requests are served while a
+checkout session is being created.
+
+Run with: python -m pytest tests/stripe_async_test.py
+"""
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import stripe
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+import server  # noqa: E402
+from stripe_gateway import StripeGateway  # noqa: E402
+
+STRIPE_DELAY_SECONDS = 1.0
+
+
+class SlowStripeHandler(BaseHTTPRequestHandler):
+    calls = 0
+
+    def _reply(self):
+        SlowStripeHandler.calls += 1
+        length = int(self.headers.get("Content-Length") or 0)
+        self.rfile.read(length)
+        time.sleep(STRIPE_DELAY_SECONDS)
+        body = json.dumps({
+            "id": "cs_test_stub",
+            "object": "checkout.session",
+            "url": "https://checkout.stripe.test/cs_test_stub",
+            "status": "open",
+            "payment_status": "unpaid",
+            "metadata": {},
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = _reply
+    do_POST = _reply
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub_stripe():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), SlowStripeHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd, f"http://127.0.0.1:{httpd.server_address[1]}"
+
+
+async def checkout_while_polling_health(gateway):
+    server.stripe_gateway = gateway
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        started = time.perf_counter()
+        checkout = asyncio.create_task(
+            client.post("/api/create-checkout-session", json={"amount": 25, "email": "test@example.com"})
+        )
+        await asyncio.sleep(0.1)
+
+        health_latencies = []
+        for _ in range(5):
+            t0 = time.perf_counter()
+            response = await client.get("/api/health")
+            assert response.status_code == 200
+            health_latencies.append(time.perf_counter() - t0)
+        checkout_pending = not checkout.done()
+
+        response = await checkout
+        elapsed = time.perf_counter() - started
+    await gateway.close()
+    return response, elapsed, health_latencies, checkout_pending
+
+
+def run_scenario(gateway):
+    SlowStripeHandler.calls = 0
+    return asyncio.run(checkout_while_polling_health(gateway))
+
+
+def test_requests_proceed_while_stripe_is_slow():
+    httpd, base = start_stub_stripe()
+    try:
+        response, elapsed, latencies, pending = run_scenario(StripeGateway("sk_test_stub", api_base=base))
+    finally:
+        httpd.shutdown()
+
+    assert response.status_code == 200
+    assert response.json()["sessionId"] == "cs_test_stub"
+    assert SlowStripeHandler.calls == 1
+    assert elapsed >= STRIPE_DELAY_SECONDS
+    # Health checks were answered while the Stripe call was still in flight
+    assert pending
+    assert max(latencies) < STRIPE_DELAY_SECONDS / 2
+
+
+def test_thread_pool_fallback_does_not_block(monkeypatch):
+    def no_httpx(*args, **kwargs):
+        raise ImportError("httpx missing")
+
+    monkeypatch.setattr(stripe, "HTTPXClient", no_httpx)
+    httpd, base = start_stub_stripe()
+    try:
+        gateway = StripeGateway("sk_test_stub", api_base=base)
+        assert gateway.mode == "threads"
+        response, elapsed, latencies, pending = run_scenario(gateway)
+    finally:
+        httpd.shutdown()
+
+    assert response.status_code == 200
+    assert pending
+    assert max(latencies) < STRIPE_DELAY_SECONDS / 2
+
+
+if __name__ == "__main__":
+    import pytest
+
+    sys.exit(pytest.main([__file__, "-q"]))
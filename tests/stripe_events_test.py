@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+"""Applying Stripe events: donations are counted once paid, once, and only for this app.
+
+Calls ``apply_stripe_events`` directly against a scratch Mongo database, the
+way the webhook pipeline does, and checks the donations and the
+materialized totals it leaves behind.
+
+Needs a MongoDB at MONGO_URL (default mongodb://localhost:27017); skipped
+otherwise.
+
+Run with: python -m pytest tests/stripe_events_test.py
+"""
+import asyncio
+import os
+import sys
+
+import pytest
+from motor.motor_asyncio import AsyncIOMotorClient
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+import server  # noqa: E402
+from indexes import ensure_indexes  # noqa: E402
+from totals import TOTALS_COLLECTION, read_totals, verify_totals  # noqa: E402
+from versioning import VERSIONS_COLLECTION  # noqa: E402
+from webhooks import EVENTS_COLLECTION, WebhookPipeline, failed_events, record_failed_event  # noqa: E402
+
+COLLECTIONS = ("donations", EVENTS_COLLECTION, TOTALS_COLLECTION, VERSIONS_COLLECTION)
+
+
+def checkout(event_id, session_id, kind="checkout.session.completed", payment_status="paid",
+             amount="25", application="magic_forest"):
+    return {"id": event_id, "type": kind, "data": {"object": {
+        "id": session_id, "object": "checkout.session", "status": "complete", "payment_status": payment_status,
+        "customer_details": {"email": "donor@example.com"},
+        "metadata": {"donation_type": "one-time", "amount": amount, "application": application},
+    }}}
+
+
+def renewal(event_id, invoice_id, billing_reason="subscription_cycle", application="magic_forest"):
+    metadata = {"plan": "monthly", "application": application}
+    return {"id": event_id, "type": "invoice.paid", "data": {"object": {
+        "id": invoice_id, "object": "invoice", "amount_paid": 1500, "billing_reason": billing_reason,
+        "customer_email": "donor@example.com", "parent": {"subscription_details": {"metadata": metadata}},
+    }}}
+
+
+def with_scratch_db(scenario):
+    async def run():
+        client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"),
+                                    serverSelectionTimeoutMS=1000)
+        try:
+            await client.admin.command("ping")
+        except Exception:
+            pytest.skip("MongoDB is not reachable")
+        db = client.magic_forest_stripe_events_test
+        for name in COLLECTIONS:
+            await db[name].drop()
+        await ensure_indexes(db)
+        server.db = db
+        server.donation_cache.clear()
+        try:
+            return await scenario(db)
+        finally:
+            for name in COLLECTIONS:
+                await db[name].drop()
+            server.db = None
+            client.close()
+
+    return asyncio.run(run())
+
+
+def test_checkout_donations_are_counted_once_when_paid():
+    async def scenario(db):
+        apply = server.apply_stripe_events
+        # Async payment: recorded unpaid, counted when it succeeds, whichever event says so
+        await apply([checkout("evt_1", "cs_async", payment_status="unpaid")])
+        before_payment = await read_totals(db)
+        await apply([checkout("evt_2", "cs_async", kind="checkout.session.async_payment_succeeded")])
+        await apply([checkout("evt_2", "cs_async", kind="checkout.session.async_payment_succeeded"),
+                     checkout("evt_3", "cs_async")])
+        # Never paid: recorded, never counted; an expired session with no donation creates none
+        await apply([checkout("evt_4", "cs_failed", payment_status="unpaid"),
+                     checkout("evt_5", "cs_failed", kind="checkout.session.async_payment_failed",
+                              payment_status="unpaid")])
+        await apply([checkout("evt_6", "cs_expired", kind="checkout.session.expired", payment_status="unpaid")])
+        # Another app on the same Stripe account
+        await apply([checkout("evt_7", "cs_other", application="other_app")])
+        donations = {doc["session_id"]: doc async for doc in db.donations.find({}, {"_id": 0})}
+        return before_payment, donations, await read_totals(db), await verify_totals(db)
+
+    before_payment, donations, totals, drift = with_scratch_db(scenario)
+    assert (before_payment["total"], before_payment["count"]) == (0, 0)
+    assert sorted(donations) == ["cs_async", "cs_failed"]
+    assert donations["cs_async"]["counted"] is True
+    assert donations["cs_failed"]["counted"] is False
+    assert donations["cs_failed"]["payment_status"] == "unpaid"
+    assert (totals["total"], totals["count"]) == (25, 1)
+    assert drift is None
+
+
+def test_renewals_are_counted_once_per_invoice():
+    async def scenario(db):
+        await server.apply_stripe_events([renewal("evt_1", "in_1"), renewal("evt_2", "in_1")])
+        await server.apply_stripe_events([renewal("evt_3", "in_1")])
+        # The first invoice comes with the checkout session; other apps' invoices are not ours
+        await server.apply_stripe_events([renewal("evt_4", "in_2", billing_reason="subscription_create"),
+                                          renewal("evt_5", "in_3", application="other_app")])
+        donations = await db.donations.find({}, {"_id": 0}).to_list(length=None)
+        return donations, await read_totals(db)
+
+    donations, totals = with_scratch_db(scenario)
+    assert [(d["invoice_id"], d["type"], d["plan"], d["counted"]) for d in donations] == [
+        ("in_1", "recurring", "monthly", True)
+    ]
+    assert (totals["total"], totals["count"]) == (15, 1)
+
+
+def test_event_that_cannot_be_applied_is_dead_lettered():
+    async def scenario(db):
+        pipeline = WebhookPipeline(
+            server.apply_stripe_events, workers=1, batch_wait=0.05, retry_delay=0.01, max_attempts=2,
+            dead_letter=lambda event, error: record_failed_event(db, event, error),
+        )
+        for queued in (checkout("evt_1", "cs_1"), checkout("evt_bad", "cs_bad", amount="ten"),
+                       checkout("evt_2", "cs_2")):
+            pipeline.submit(queued)
+        await pipeline.close()
+        sessions = sorted([doc["session_id"] async for doc in db.donations.find({}, {"session_id": 1})])
+        return sessions, await failed_events(db), pipeline.stats()
+
+    sessions, failed, stats = with_scratch_db(scenario)
+    assert sessions == ["cs_1", "cs_2"]
+    assert [(doc["_id"], doc["status"], doc["event"]["id"]) for doc in failed] == [("evt_bad", "failed", "evt_bad")]
+    assert failed[0]["error"].startswith("ValueError")
+    assert (stats["applied"], stats["dead_lettered"]) == (2, 1)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
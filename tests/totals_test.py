@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+"""Recomputed donation totals follow the same rule as the incremental path.
+
+Checkout donations are stored with ``counted: False`` until they are paid;
+donations from before that flag have no ``counted`` field and always count.
+
+Needs a MongoDB at MONGO_URL (default mongodb://localhost:27017); skipped
+otherwise.
+
+Run with: python -m pytest tests/totals_test.py
+"""
+import asyncio
+import os
+import sys
+
+import pytest
+from motor.motor_asyncio import AsyncIOMotorClient
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from totals import TOTALS_COLLECTION, compute_totals, record_donation, rebuild_totals, verify_totals  # noqa: E402
+
+DONATIONS = [
+    {"id": "legacy", "amount": 10, "type": "one-time", "plan": None, "payment_method": "card"},
+    {"id": "paid", "amount": 25, "type": "one-time", "plan": None, "payment_method": "card", "counted": True},
+    {"id": "open", "amount": 40, "type": "one-time", "plan": None, "payment_method": "card", "counted": False},
+    {"id": "failed", "amount": 100, "type": "monthly", "plan": "monthly", "payment_method": "card",
+     "counted": False},
+]
+
+
+async def scratch_db():
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"),
+                                serverSelectionTimeoutMS=1000)
+    try:
+        await client.admin.command("ping")
+    except Exception:
+        pytest.skip("MongoDB is not reachable")
+    db = client.magic_forest_totals_test
+    await db.donations.drop()
+    await db[TOTALS_COLLECTION].drop()
+    return client, db
+
+
+def test_unpaid_checkout_donations_are_left_out_until_claimed():
+    async def run():
+        client, db = await scratch_db()
+        try:
+            await db.donations.insert_many([dict(doc) for doc in DONATIONS])
+            computed = await compute_totals(db)
+            await rebuild_totals(db)
+            after_rebuild = await verify_totals(db)
+            # The open session is paid later: claimed and $inc'd exactly once
+            claimed = await db.donations.find_one_and_update(
+                {"id": "open", "counted": False}, {"$set": {"counted": True}}, projection={"_id": 0}
+            )
+            await record_donation(db, claimed)
+            after_claim = await verify_totals(db)
+            recomputed = await compute_totals(db)
+        finally:
+            await db.donations.drop()
+            await db[TOTALS_COLLECTION].drop()
+            client.close()
+        return computed, after_rebuild, after_claim, recomputed
+
+    computed, after_rebuild, after_claim, recomputed = asyncio.run(run())
+    assert (computed["total"], computed["count"]) == (35, 2)
+    assert "monthly" not in computed["by_type"]
+    assert after_rebuild is None
+    assert after_claim is None
+    assert (recomputed["total"], recomputed["count"]) == (75, 3)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
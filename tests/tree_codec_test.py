@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+"""Columnar forest encoding for the map: round trip, type table, timestamps, lookups.
+
+Run with: python -m pytest tests/tree_codec_test.py
+"""
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from tree_codec import HEADER, MAX_TYPES, OTHER_TYPE, ColumnarForest, decode  # noqa: E402
+
+BASE = datetime(2024, 5, 1, 12, 0, 0, tzinfo=timezone.utc)
+
+
+def forest_of(trees):
+    forest = ColumnarForest()
+    for tree in trees:
+        forest.append(tree)
+    return forest
+
+
+def test_round_trip_keeps_every_column():
+    trees = [
+        {"seq": 1, "x": 10.5, "y": -3.25, "size": 1.5, "type": "oak", "timestamp": BASE.isoformat()},
+        {"seq": 2, "x": 0.0, "y": 7.0, "type": "pine", "timestamp": (BASE + timedelta(seconds=90)).isoformat()},
+        {"seq": 3, "x": -1.75, "y": 2.5, "size": 2.0, "type": "oak", "timestamp": BASE + timedelta(seconds=30)},
+        {"seq": 4, "x": 4.0, "y": 4.0, "size": 0.5, "timestamp": "not a date"},
+    ]
+    decoded = decode(forest_of(trees).encode())
+    assert [t["seq"] for t in decoded] == [1, 2, 3, 4]
+    assert [(t["x"], t["y"], t["size"]) for t in decoded] == [
+        (10.5, -3.25, 1.5), (0.0, 7.0, 1.0), (-1.75, 2.5, 2.0), (4.0, 4.0, 0.5),
+    ]
+    assert [t["type"] for t in decoded] == ["oak", "pine", "oak", OTHER_TYPE]
+    # The third tree is older than the second (a negative delta); an undatable one keeps the last time
+    base = BASE.timestamp()
+    assert [t["timestamp"] for t in decoded] == [base, base + 90, base + 30, base + 30]
+
+
+def test_columns_start_on_four_byte_boundaries():
+    forest = forest_of([{"seq": 1, "x": 1.0, "y": 1.0, "type": name} for name in ("a", "bb", "ccc")])
+    buffer = forest.encode()
+    _, count, _, types_len, _ = HEADER.unpack_from(buffer, 0)
+    assert (HEADER.size + types_len + (-types_len % 4)) % 4 == 0
+    assert len(buffer) == HEADER.size + types_len + (-types_len % 4) + 4 * 5 * count + count
+    assert [t["type"] for t in decode(buffer)] == ["a", "bb", "ccc"]
+
+
+def test_type_table_overflow_folds_into_other():
+    trees = [{"seq": i + 1, "x": 0.0, "y": 0.0, "type": f"type-{i}"} for i in range(MAX_TYPES + 5)]
+    forest = forest_of(trees)
+    # uint8 indexes: MAX_TYPES named types, then "other" for the rest
+    assert len(forest.types) == MAX_TYPES + 1 and forest.types[-1] == OTHER_TYPE
+    decoded = decode(forest.encode())
+    assert decoded[MAX_TYPES - 1]["type"] == f"type-{MAX_TYPES - 1}"
+    assert {t["type"] for t in decoded[MAX_TYPES:]} == {OTHER_TYPE}
+
+
+def test_encoding_is_cached_until_the_next_append():
+    forest = forest_of([{"seq": 1, "x": 0.0, "y": 0.0}])
+    first = forest.encode()
+    assert forest.encode() is first
+    forest.append({"seq": 2, "x": 1.0, "y": 1.0})
+    assert len(decode(forest.encode())) == 2
+
+
+def test_has_finds_seqs_appended_out_of_order():
+    forest = forest_of([{"seq": seq, "x": 0.0, "y": 0.0} for seq in (1, 2, 5, 3)])
+    assert [forest.has(seq) for seq in (1, 2, 3, 4, 5, 6, 0)] == [True, True, True, False, True, False, False]
+    forest.reset()
+    assert not forest.has(1)
+
+
+def test_decode_rejects_other_buffers():
+    with pytest.raises(ValueError):
+        decode(HEADER.pack(b"NOPE", 0, 0.0, 0, 0))
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+"""LRU + TTL cache behind get_donation: expiry, negative caching, eviction, hooks.
+
+Run with: python -m pytest tests/ttl_cache_test.py
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from ttl_cache import TTLCache  # noqa: E402
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_entries_and_misses_expire():
+    clock = Clock()
+    cache = TTLCache("t", ttl=10, negative_ttl=1, clock=clock)
+    cache.set("a", {"id": "a"})
+    cache.set_missing("b")
+    assert cache.lookup("a") == (True, {"id": "a"})
+    assert cache.lookup("b") == (True, None)
+    clock.now = 2
+    assert cache.lookup("b") == (False, None)
+    clock.now = 11
+    assert cache.lookup("a") == (False, None)
+    assert (cache.hits, cache.misses) == (2, 2)
+
+
+def test_least_recently_used_is_evicted():
+    cache = TTLCache("t", maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.lookup("a")
+    cache.set("c", 3)
+    assert cache.lookup("b") == (False, None)
+    assert cache.lookup("a") == (True, 1)
+
+
+def test_invalidation_hooks_see_local_invalidations_only():
+    seen = []
+    cache = TTLCache("donations")
+    cache.on_invalidate.append(lambda name, key: seen.append((name, key)))
+    cache.set("a", 1)
+    cache.invalidate("a")
+    cache.invalidate("b", propagate=False)
+    assert seen == [("donations", "a")]
+    assert cache.lookup("a") == (False, None)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
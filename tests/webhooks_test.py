@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+"""Stripe webhook ingestion: signatures, dedupe, backpressure, retries, dead letters and ordering.
+
+Drives ``WebhookPipeline`` with an in-memory ``apply_batch`` so it runs
+without Mongo. The endpoint tests post to the app in-process and never
+reach the database.
+
+Run with: python -m pytest tests/webhooks_test.py
+"""
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import random
+import sys
+import time
+
+import httpx
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+import server  # noqa: E402
+from webhooks import WebhookPipeline  # noqa: E402
+
+SECRET = "whsec_test"
+
+
+def event(event_id: str, session: str = "cs_1", kind: str = "checkout.session.completed"):
+    return {"id": event_id, "object": "event", "type": kind, "data": {"object": {"id": session}}}
+
+
+class Recorder:
+    """In-memory ``apply_batch`` that can fail its first calls or stall."""
+
+    def __init__(self, failures: int = 0, delay: float = 0.0):
+        self.failures = failures
+        self.delay = delay
+        self.calls = 0
+        self.applied = []
+
+    async def __call__(self, batch):
+        self.calls += 1
+        await asyncio.sleep(self.delay() if callable(self.delay) else self.delay)
+        if self.calls <= self.failures:
+            raise RuntimeError("mongo unavailable")
+        self.applied.extend(batch)
+
+
+def test_duplicate_deliveries_are_applied_once():
+    async def run():
+        recorder = Recorder()
+        pipeline = WebhookPipeline(recorder, workers=2)
+        for event_id in ("evt_1", "evt_2", "evt_1", "evt_2", "evt_1"):
+            assert pipeline.submit(event(event_id))
+        await pipeline.close()
+        return recorder, pipeline.stats()
+
+    recorder, stats = asyncio.run(run())
+    assert sorted(e["id"] for e in recorder.applied) == ["evt_1", "evt_2"]
+    assert (stats["received"], stats["duplicates"], stats["applied"]) == (5, 3, 2)
+
+
+def test_full_queue_refuses_events():
+    async def run():
+        gate = asyncio.Event()
+
+        async def blocked(batch):
+            await gate.wait()
+
+        pipeline = WebhookPipeline(blocked, workers=1, queue_size=1, batch_size=1, batch_wait=0)
+        assert pipeline.submit(event("evt_1"))
+        await asyncio.sleep(0.01)  # the worker takes evt_1 and blocks
+        assert pipeline.submit(event("evt_2"))
+        assert not pipeline.submit(event("evt_3"))
+        rejected = pipeline.stats()["rejected"]
+        gate.set()
+        await pipeline.close()
+        # A refused event is not remembered, so Stripe's retry is accepted
+        assert "evt_3" not in pipeline._recent
+        return rejected
+
+    assert asyncio.run(run()) == 1
+
+
+def test_failed_batches_are_retried_until_applied():
+    async def run():
+        recorder = Recorder(failures=2)
+        pipeline = WebhookPipeline(recorder, workers=1, retry_delay=0.01)
+        for i in range(3):
+            pipeline.submit(event(f"evt_{i}"))
+        await pipeline.close()
+        return recorder, pipeline.stats()
+
+    recorder, stats = asyncio.run(run())
+    assert sorted(e["id"] for e in recorder.applied) == ["evt_0", "evt_1", "evt_2"]
+    assert (stats["retries"], stats["failed"], stats["backlog"]) == (2, 0, 0)
+
+
+def test_batches_still_failing_at_shutdown_are_released():
+    async def run():
+        recorder = Recorder(failures=1000)
+        pipeline = WebhookPipeline(recorder, workers=1, retry_delay=0.01, max_retry_delay=0.01)
+        pipeline.submit(event("evt_1"))
+        await asyncio.sleep(0.05)
+        await pipeline.close(timeout=0.1)
+        stats = pipeline.stats()
+        # Forgotten, so a manual resend from Stripe is accepted
+        pipeline.submit(event("evt_1"))
+        await pipeline.close(timeout=0)
+        return stats, pipeline.stats()
+
+    at_close, after = asyncio.run(run())
+    assert (at_close["applied"], at_close["failed"], at_close["backlog"]) == (0, 1, 0)
+    assert after["duplicates"] == 0
+
+
+def test_bad_event_is_dead_lettered_without_blocking_its_queue():
+    async def run():
+        applied, dead = [], []
+
+        async def apply(batch):
+            if any(e["id"] == "evt_bad" for e in batch):
+                raise ValueError("could not convert string to float: 'ten'")
+            applied.extend(e["id"] for e in batch)
+
+        async def dead_letter(e, error):
+            dead.append((e["id"], type(error).__name__))
+
+        pipeline = WebhookPipeline(apply, workers=1, batch_wait=0.05, retry_delay=0.01,
+                                   max_attempts=3, dead_letter=dead_letter)
+        for event_id in ("evt_1", "evt_bad", "evt_2"):
+            pipeline.submit(event(event_id))
+        await asyncio.sleep(0.2)
+        pipeline.submit(event("evt_3"))
+        await pipeline.close()
+        return applied, dead, pipeline.stats()
+
+    applied, dead, stats = asyncio.run(run())
+    assert applied == ["evt_1", "evt_2", "evt_3"]
+    assert dead == [("evt_bad", "ValueError")]
+    assert (stats["retries"], stats["dead_lettered"], stats["failed"], stats["backlog"]) == (2, 1, 0, 0)
+
+
+def test_event_is_retried_while_its_dead_letter_cannot_be_written():
+    async def run():
+        recorder = Recorder(failures=3)
+        dead = []
+
+        async def dead_letter(e, error):
+            if recorder.calls <= recorder.failures:
+                raise RuntimeError("mongo unavailable")
+            dead.append(e["id"])
+
+        pipeline = WebhookPipeline(recorder, workers=1, retry_delay=0.01, max_attempts=1, dead_letter=dead_letter)
+        pipeline.submit(event("evt_1"))
+        await pipeline.close()
+        return recorder, dead
+
+    recorder, dead = asyncio.run(run())
+    # Mongo came back before the event was given up on, so it was applied after all
+    assert [e["id"] for e in recorder.applied] == ["evt_1"]
+    assert dead == []
+
+
+def test_events_for_one_session_apply_in_order():
+    async def run():
+        recorder = Recorder(delay=lambda: random.uniform(0, 0.003))
+        pipeline = WebhookPipeline(
+            recorder, workers=4, batch_size=3, partition_key=lambda e: e["data"]["object"]["id"]
+        )
+        for step in range(20):
+            for session in range(8):
+                pipeline.submit(event(f"evt_{session}_{step}", session=f"cs_{session}"))
+        await pipeline.close()
+        return recorder.applied
+
+    applied = asyncio.run(run())
+    assert len(applied) == 160
+    for session in range(8):
+        steps = [int(e["id"].rsplit("_", 1)[1]) for e in applied if e["data"]["object"]["id"] == f"cs_{session}"]
+        assert steps == list(range(20))
+
+
+def signed(payload: bytes, secret: str = SECRET):
+    timestamp = int(time.time())
+    signature = hmac.new(secret.encode(), f"{timestamp}.".encode() + payload, hashlib.sha256).hexdigest()
+    return {"stripe-signature": f"t={timestamp},v1={signature}"}
+
+
+def post_webhooks(monkeypatch, pipeline, requests, backlog=()):
+    monkeypatch.setattr(server, "STRIPE_WEBHOOK_SECRET", SECRET)
+    monkeypatch.setattr(server, "webhook_pipeline", pipeline)
+
+    async def run():
+        for queued in backlog:
+            pipeline.submit(queued)
+            await asyncio.sleep(0.01)
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            responses = [await client.post("/api/stripe/webhook", content=body, headers=headers)
+                         for body, headers in requests]
+        await pipeline.close(timeout=0)
+        return [response.status_code for response in responses]
+
+    return asyncio.run(run())
+
+
+def test_endpoint_rejects_bad_signatures(monkeypatch):
+    recorder = Recorder()
+    body = json.dumps(event("evt_1")).encode()
+    statuses = post_webhooks(monkeypatch, WebhookPipeline(recorder), [
+        (body, signed(body, secret="whsec_other")),
+        (body, {}),
+        (body, signed(body)),
+    ])
+    assert statuses == [400, 400, 200]
+
+
+def test_endpoint_answers_503_when_the_queue_is_full(monkeypatch):
+    async def blocked(batch):
+        await asyncio.sleep(3600)
+
+    pipeline = WebhookPipeline(blocked, workers=1, queue_size=1, batch_size=1, batch_wait=0)
+    body = json.dumps(event("evt_3")).encode()
+    # One event being applied and one queued fill the pipeline
+    statuses = post_webhooks(monkeypatch, pipeline, [(body, signed(body))], backlog=[event("evt_1"), event("evt_2")])
+    assert statuses == [503]
+    assert pipeline.stats()["rejected"] == 1
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+"""Group commit of inserts: batching, per-caller errors and backpressure.
+
+Drives ``GroupCommitBuffer`` with an in-memory ``insert_many`` so it runs
+without Mongo.
+
+Run with: python -m pytest tests/write_buffer_test.py
+"""
+import asyncio
+import os
+import sys
+
+import pytest
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from write_buffer import GroupCommitBuffer  # noqa: E402
+
+
+class FakeCollection:
+    def __init__(self, delay: float = 0.0, duplicate: str = None):
+        self.delay = delay
+        self.duplicate = duplicate
+        self.batches = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def insert_many(self, docs):
+        self.in_flight += len(docs)
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(self.delay)
+        self.in_flight -= len(docs)
+        self.batches.append([doc["id"] for doc in docs])
+        errors = [
+            {"index": i, "code": 11000, "errmsg": "E11000 duplicate key"}
+            for i, doc in enumerate(docs) if doc["id"] == self.duplicate
+        ]
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "nInserted": len(docs) - len(errors)})
+
+
+def test_concurrent_inserts_share_batches():
+    async def run():
+        collection = FakeCollection()
+        buffer = GroupCommitBuffer(collection.insert_many, max_batch=100, max_delay=0.01)
+        await asyncio.gather(*(buffer.insert({"id": i}) for i in range(250)))
+        return collection.batches
+
+    batches = asyncio.run(run())
+    assert [len(batch) for batch in batches] == [100, 100, 50]
+    assert sorted(i for batch in batches for i in batch) == list(range(250))
+
+
+def test_failed_document_raises_only_in_its_caller():
+    async def run():
+        collection = FakeCollection(duplicate=3)
+        buffer = GroupCommitBuffer(collection.insert_many, max_batch=10, max_delay=0.01)
+        return await asyncio.gather(*(buffer.insert({"id": i}) for i in range(5)), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert isinstance(results[3], DuplicateKeyError)
+    assert [r for i, r in enumerate(results) if i != 3] == [None] * 4
+
+
+def test_callers_wait_when_mongo_lags():
+    async def run():
+        collection = FakeCollection(delay=0.02)
+        buffer = GroupCommitBuffer(collection.insert_many, max_batch=5, max_delay=0.001, max_pending=10)
+        await asyncio.gather(*(buffer.insert({"id": i}) for i in range(100)))
+        await buffer.close()
+        return collection
+
+    collection = asyncio.run(run())
+    assert collection.max_in_flight <= 10
+    assert sum(len(batch) for batch in collection.batches) == 100
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))